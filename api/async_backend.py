@@ -0,0 +1,349 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""asyncio variant of the HPC back-end, requires Python 3.5+"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import asyncio
+import functools
+import threading
+
+from time import time
+from subprocess import DEVNULL, PIPE
+
+from api.logger import getLogger
+from api.experiment_config import ExperimentConfig
+from api.hpc_backend import HPCBackend
+from api.qstat_poller import QstatPoller
+from api.poll_strategy import AdaptivePolling, parse_walltime
+from api.ssh_channel import SSH_CONNECTION_ERROR
+from api.job_cleanup import SignalExit
+
+
+# per event loop, keyed by (loop, ...), dropped when the loop's last
+# experiment finished
+_pollers = {}
+_limits = {}
+_running = {}
+_registry_lock = threading.Lock()
+
+
+class AsyncCommandError(Exception):
+    """A remote command failed, like sh's ErrorReturnCode."""
+
+    def __init__(self, full_cmd, exit_code, stdout, stderr):
+        Exception.__init__(self, "Command '{}' exited with {}:\n{}".format(
+            full_cmd, exit_code, stderr))
+        self.full_cmd = full_cmd
+        self.exit_code = exit_code
+        self.stdout = stdout
+        self.stderr = stderr
+
+
+def _in_executor(func, *args, **kwargs):
+    """Run a blocking call in the loop's default thread pool."""
+    return asyncio.get_event_loop().run_in_executor(
+        None, functools.partial(func, *args, **kwargs))
+
+
+class AsyncChannel(object):
+    """
+    Runs remote commands of a channel as asyncio subprocesses, through
+    the same multiplexed SSH master connection (ControlPath).
+    """
+
+    def __init__(self, channel):
+        """Initialize the channel, wrapping an SSHChannel or LocalChannel."""
+        self.logger = getLogger(__name__)
+        self.channel = channel
+
+
+    async def __call__(self, *args, ok_codes=(0,), retry=True):
+        """Execute a remote command, returns its stdout, see SSHChannel."""
+        # health check of the master connection, at most every 30 seconds
+        await _in_executor(self.channel.ensure_connected)
+        argv, cwd, env = self.channel.get_process_args(*args)
+        for attempt in (1, 2):
+            self.channel.count_command()
+            process = await asyncio.create_subprocess_exec(
+                *argv, stdin=DEVNULL, stdout=PIPE, stderr=PIPE, cwd=cwd, env=env)
+            stdout, stderr = await process.communicate()
+            stdout = stdout.decode('utf-8', 'replace')
+            if process.returncode in ok_codes:
+                return stdout
+            if (not retry or process.returncode != SSH_CONNECTION_ERROR or
+                    attempt == 2 or await _in_executor(self.channel.is_connected)):
+                raise AsyncCommandError(' '.join(argv), process.returncode,
+                                        stdout, stderr.decode('utf-8', 'replace'))
+            # connection broke, retry once with a fresh master
+            self.logger.debug("SSH command failed with code '%s', retrying.",
+                              process.returncode)
+            await _in_executor(self.channel.ensure_connected, force_check=True)
+
+
+class AsyncPoller(QstatPoller):
+    """
+    QstatPoller for coroutines, the batch status query runs as a
+    subprocess and only one query is in flight at a time.
+    """
+
+    def __init__(self, scheduler, async_channel, max_age):
+        """Initialize the poller."""
+        QstatPoller.__init__(self, scheduler, max_age)
+        self.async_channel = async_channel
+        self._poll_lock = asyncio.Lock()
+
+
+    async def get_record_async(self, job_id):
+        """Get the cached job record, polls if the cache is outdated."""
+        async with self._poll_lock:
+            if (job_id not in self._polled_ids or
+                    time() - self._last_poll >= self.max_age):
+                await self._poll_async()
+            return self.records.get(job_id)
+
+
+    async def _poll_async(self):
+        with self._lock:
+            job_ids = sorted(self.tracked)
+        if not job_ids:
+            return
+        self.logger.debug('Polling state of {} job(s)'.format(len(job_ids)))
+        commands = self.scheduler.get_status_commands(job_ids)
+        if commands is None:
+            # e.g. local jobs, queried without a remote command
+            records = await _in_executor(
+                lambda: list(self.scheduler.batch_status(job_ids)))
+        else:
+            records = []
+            for command in commands:
+                output = await self.async_channel(
+                    *command, ok_codes=self.scheduler.status_ok_codes)
+                records.extend(
+                    self.scheduler.parse_status_output(output.splitlines()))
+            for command in self.scheduler.get_unseen_status_commands(
+                    self.scheduler.get_unseen_ids(job_ids, records)):
+                output = await self.async_channel(
+                    *command, ok_codes=self.scheduler.unseen_ok_codes)
+                records.extend(
+                    self.scheduler.parse_unseen_status_output(output.splitlines()))
+        with self._lock:
+            self._apply(job_ids, records)
+
+
+class AsyncHostLimits(object):
+    """HostLimits for coroutines."""
+
+    def __init__(self, max_transfers, max_jobs):
+        self.transfers = asyncio.Semaphore(int(max_transfers))
+        self.jobs = asyncio.Semaphore(int(max_jobs))
+
+
+def _get_loop_key(*key):
+    return (id(asyncio.get_event_loop()),) + key
+
+
+def _enter_loop():
+    """Count an experiment running in the current event loop."""
+    loop_id = id(asyncio.get_event_loop())
+    with _registry_lock:
+        _running[loop_id] = _running.get(loop_id, 0) + 1
+
+
+def _leave_loop():
+    """Drop the loop's pollers and limits after its last experiment."""
+    loop_id = id(asyncio.get_event_loop())
+    with _registry_lock:
+        _running[loop_id] -= 1
+        if _running[loop_id]:
+            return
+        del _running[loop_id]
+        for registry in (_pollers, _limits):
+            for key in [key for key in registry if key[0] == loop_id]:
+                del registry[key]
+
+
+def get_async_poller(scheduler, async_channel, max_age):
+    """Get the poller of the scheduler, one per event loop."""
+    key = _get_loop_key(*scheduler.get_poll_key())
+    with _registry_lock:
+        if key not in _pollers:
+            _pollers[key] = AsyncPoller(scheduler, async_channel, max_age)
+        return _pollers[key]
+
+
+def get_async_limits(hpcConfig):
+    """Get the limits of the config's submission host, one per event loop."""
+    key = _get_loop_key(hpcConfig.get_value('host'))
+    with _registry_lock:
+        if key not in _limits:
+            _limits[key] = AsyncHostLimits(hpcConfig.max_concurrent_transfers,
+                                           hpcConfig.max_jobs_in_flight)
+        return _limits[key]
+
+
+class AsyncHPCBackend(HPCBackend):
+    """
+    HPCBackend driven by an asyncio event loop, thus one thread can
+    supervise thousands of jobs.
+
+    Submission and polling are non-blocking subprocesses, waiting is an
+    asyncio sleep. Stage-in and result collection keep using rsync and the
+    collector of the synchronous back-end, in the loop's thread pool.
+    Must be run within the event loop it was created in.
+    """
+
+    def __init__(self, hpcCfg, channel=None):
+        """Initialize the back-end."""
+        HPCBackend.__init__(self, hpcCfg, channel)
+        self.async_channel = AsyncChannel(self.ssh_conn)
+
+
+    async def _get_job_state_async(self, experiment):
+        try:
+            job_record = await self.poller.get_record_async(
+                self._get_poll_id(experiment))
+        except AsyncCommandError as e:
+            self.logger.error('\nError checking job state:\n{}'.format(e.stderr))
+            raise e
+        return self._apply_job_record(experiment, job_record)
+
+
+    async def _submit_job_async(self, experiment):
+        """Submit the job to the batch system, sets the job_id."""
+        self.logger.info('Submitting experiment to HPC system.')
+        if experiment.get_alternatives() and experiment.get_plan() is None:
+            await _in_executor(self.planner.plan, experiment)
+        experiment.set_start_time(int(time()) * 1000)
+        command = self.scheduler.get_submit_command(experiment)
+        if command is None:
+            job_id = await _in_executor(self.scheduler.submit, experiment)
+        else:
+            try:
+                # qsub may have queued the job before the connection broke
+                ssh_output = await self.async_channel(*command, retry=False)
+            except AsyncCommandError as e:
+                self.logger.error(
+                    "Job failed. Error code '{}' for SSH cmd:\n {}\n{}".format(
+                        e.exit_code, e.full_cmd, e.stderr))
+                raise e
+            job_id = self.scheduler.parse_submit_output(experiment, ssh_output)
+        self._track_job(experiment, job_id)
+
+
+    async def _wait_for_job_async(self, experiment):
+        """Wait for the job to finish, without blocking the loop."""
+        self.logger.info("Job '{}' submitted, waiting for completion.".format(
+            experiment.get_job_id()))
+        polling = AdaptivePolling(
+            self.hpcConfig, parse_walltime(experiment.get_qsub_args()))
+        job_state = None
+        job_running = True
+        while job_running:
+            await asyncio.sleep(polling.next_interval(job_state))
+            last_state = job_state
+            job_state = await self._get_job_state_async(experiment)
+            # cancels overdue or held jobs, a remote command
+            job_running = await _in_executor(
+                self._check_job_state, experiment, job_state)
+            if self.journal and job_state != last_state:
+                await _in_executor(self.journal.record_state,
+                                   self._get_journal_key(experiment), job_state)
+        await _in_executor(self._finish_job, experiment)
+        self.logger.info("Job '{}' finished.".format(experiment.get_job_id()))
+
+
+    async def run_experiment_async(self, experimentCfg):
+        """Coroutine equivalent of run_experiment."""
+        _enter_loop()
+        try:
+            # replaces the threaded poller, same interface plus get_record_async
+            self.poller = get_async_poller(self.scheduler, self.async_channel,
+                                           self.hpcConfig.poll_time_min)
+            await self._run_experiment_async(experimentCfg)
+        finally:
+            try:
+                await _in_executor(self._end_run, experimentCfg)
+            finally:
+                _leave_loop()
+
+
+    async def _run_experiment_async(self, experimentCfg):
+        if await _in_executor(self._start_run, experimentCfg):
+            return
+        limits = get_async_limits(self.hpcConfig)
+        timer = experimentCfg.get_phase_timer()
+        reattached = await _in_executor(self._reattach, experimentCfg)
+        if not reattached:
+            async with limits.transfers:
+                await _in_executor(self._stage_in, experimentCfg)
+        async with limits.jobs:
+            if not reattached:
+                with timer.phase('submit'):
+                    await self._submit_job_async(experimentCfg)
+                await _in_executor(self._record_submit, experimentCfg)
+            with timer.phase('wait'):
+                await self._wait_for_job_async(experimentCfg)
+        self._exit_if_cancelled(experimentCfg)
+        await _in_executor(self._complete_run, experimentCfg)
+
+
+async def run_experiment_async(experimentCfg):
+    """Run one experiment, returns its result or None if it failed."""
+    try:
+        hpcBackend = AsyncHPCBackend(experimentCfg.getHPCConfig())
+        await hpcBackend.run_experiment_async(experimentCfg)
+        return hpcBackend.get_result(experimentCfg)
+    except SignalExit:
+        # the jobs are cancelled, the event loop ends
+        raise
+    except (Exception, SystemExit) as e:
+        # sys.exit() only ends this workload
+        getLogger(__name__).error("Workload '{}' failed: {}".format(
+            experimentCfg.get_name(), e))
+        return None
+
+
+def _notify_failed(workloadDef):
+    # downwards compatibility, thus try/catch if not implemented
+    try:
+        workloadDef.failed()
+    except Exception:
+        pass
+
+
+async def run_async(workloadDef):
+    """Run one workload as scotty defines it, returns its result or None."""
+    result = await run_experiment_async(ExperimentConfig(workloadDef))
+    if result is None:
+        _notify_failed(workloadDef)
+    return result
+
+
+async def run_workloads_async(workloadDefs):
+    """Run the workloads concurrently, one result (or None) per workload."""
+    experiments = [ExperimentConfig(workloadDef) for workloadDef in workloadDefs]
+    results = await asyncio.gather(*[run_experiment_async(experimentCfg)
+                                     for experimentCfg in experiments])
+    for workloadDef, result in zip(workloadDefs, results):
+        if result is None:
+            _notify_failed(workloadDef)
+    return results
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Workloads with dependencies, submitted as one job DAG"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import sys
+
+from time import sleep
+from sh import ErrorReturnCode
+
+from api.logger import getLogger
+from api.hpc_backend import HPCBackend
+from api.host_limits import get_host_limits
+from api.poll_strategy import AdaptivePolling
+from api.job_cleanup import SignalExit
+
+
+def has_dependencies(experiments):
+    return any(experiment.get_depends_on() for experiment in experiments)
+
+
+def sort_experiments(experiments):
+    """
+    Experiments in an order that has each one after its dependencies,
+    exits on unknown dependencies and cycles.
+    """
+    logger = getLogger(__name__)
+    by_name = {}
+    for experiment in experiments:
+        if experiment.get_name() in by_name:
+            logger.error("Workload name '{}' is not unique.".format(
+                experiment.get_name()))
+            sys.exit(1)
+        by_name[experiment.get_name()] = experiment
+    for experiment in experiments:
+        for name in experiment.get_depends_on():
+            if name not in by_name:
+                logger.error("Workload '{}' depends on unknown workload '{}'.".format(
+                    experiment.get_name(), name))
+                sys.exit(1)
+
+    ordered = []
+    # 1: in progress, 2: done
+    marks = {}
+    for experiment in experiments:
+        if experiment.get_name() in marks:
+            continue
+        marks[experiment.get_name()] = 1
+        stack = [(experiment, iter(experiment.get_depends_on()))]
+        while stack:
+            current, dependencies = stack[-1]
+            name = next(dependencies, None)
+            if name is None:
+                stack.pop()
+                marks[current.get_name()] = 2
+                ordered.append(current)
+            elif marks.get(name) == 1:
+                logger.error("Workload dependencies form a cycle: {}.".format(
+                    ' -> '.join([entry[0].get_name() for entry in stack] + [name])))
+                sys.exit(1)
+            elif name not in marks:
+                marks[name] = 1
+                stack.append((by_name[name], iter(by_name[name].get_depends_on())))
+    return ordered
+
+
+class DAGExecutor(object):
+    """
+    Submits all workloads up front, each with a scheduler-side dependency
+    (e.g. Torque's '-W depend=afterok') on the jobs of the workloads it
+    depends on. All jobs are then tracked by the shared, batched poller of
+    a single thread. Dependent jobs of a failed job are cancelled.
+
+    Each submitted job holds a slot of its host's 'max_jobs_in_flight'
+    until it finished, if all are taken the jobs are polled until one
+    is freed.
+    """
+
+    def __init__(self):
+        """Initialize the executor."""
+        self.logger = getLogger(__name__)
+
+
+    def run(self, experiments):
+        """Run all experiments, returns one result (or None) per experiment."""
+        backends = {}
+        failed = set()
+        pending = []
+        self._polling = None
+        self._job_state = None
+        try:
+            for experiment in sort_experiments(experiments):
+                name = experiment.get_name()
+                try:
+                    backend = self._submit(experiment, backends, experiments,
+                                           pending, failed)
+                except SignalExit:
+                    raise
+                except (Exception, SystemExit) as e:
+                    self.logger.error("Workload '{}' failed: {}".format(name, e))
+                    failed.add(name)
+                    continue
+                if backend is None:
+                    self.logger.error("Workload '{}' skipped, a dependency failed.".format(name))
+                    failed.add(name)
+                    continue
+                backends[name] = backend
+                pending.append(experiment)
+
+            self._wait(pending, backends, failed)
+        finally:
+            # not finished, e.g. interrupted
+            for experiment in pending:
+                self._release_slot(backends[experiment.get_name()])
+
+        results = []
+        for experiment in experiments:
+            if experiment.get_name() in failed:
+                results.append(None)
+            else:
+                results.append(
+                    backends[experiment.get_name()].get_result(experiment))
+        self.logger.info('{} of {} workload(s) succeeded.'.format(
+            len(experiments) - len(failed), len(experiments)))
+        return results
+
+
+    def _submit(self, experiment, backends, experiments, pending, failed):
+        """
+        Stage in and submit, depending on the jobs submitted before,
+        returns the back-end or None if a dependency failed meanwhile.
+        """
+        if failed.intersection(experiment.get_depends_on()):
+            return None
+        by_name = dict((entry.get_name(), entry) for entry in experiments)
+        depends_on = [by_name[name].get_job_id()
+                      for name in experiment.get_depends_on()]
+        if experiment.get_depends_on():
+            # dependencies are resolved by one batch system only
+            experiment.set_hpc_target(
+                by_name[experiment.get_depends_on()[0]].getHPCConfig())
+        backend = HPCBackend(experiment.getHPCConfig())
+        limits = get_host_limits(backend.hpcConfig)
+        timer = experiment.get_phase_timer()
+        with limits.transfers, timer.phase('stage_in'):
+            backend._stage_in_data(experiment)
+        while not limits.jobs.acquire(False):
+            # freed by a job of this or another thread
+            self._poll(pending, backends, failed, backend.hpcConfig)
+        if failed.intersection(experiment.get_depends_on()):
+            limits.jobs.release()
+            return None
+        try:
+            with timer.phase('submit'):
+                backend._submit_job(experiment, depends_on)
+        except BaseException:
+            limits.jobs.release()
+            raise
+        timer.start('wait')
+        self.logger.info("Workload '{}' submitted as job '{}'{}.".format(
+            experiment.get_name(), experiment.get_job_id(),
+            ', after {}'.format(', '.join(depends_on)) if depends_on else ''))
+        return backend
+
+
+    def _release_slot(self, backend):
+        get_host_limits(backend.hpcConfig).jobs.release()
+
+
+    def _wait(self, pending, backends, failed):
+        """Poll all jobs until they finished, collect each one's results."""
+        while pending:
+            self._poll(pending, backends, failed, pending[0].getHPCConfig())
+
+
+    def _poll(self, pending, backends, failed, hpcConfig):
+        """One poll of all pending jobs, finishes the ones that ended."""
+        if self._polling is None:
+            self._polling = AdaptivePolling(hpcConfig, None)
+        sleep(self._polling.next_interval(self._job_state))
+        states = set()
+        for experiment in list(pending):
+            if experiment not in pending:
+                # cancelled in this round
+                continue
+            name = experiment.get_name()
+            backend = backends[name]
+            job_state = backend._get_job_state(experiment)
+            states.add(job_state)
+            waiting = [dependency for dependency in experiment.get_depends_on()
+                       if dependency not in failed
+                       and any(entry.get_name() == dependency for entry in pending)]
+            if job_state == 'H' and waiting:
+                # held by the batch system until the dependencies finished
+                continue
+            if backend._is_job_running(experiment, job_state):
+                continue
+            pending.remove(experiment)
+            self._release_slot(backend)
+            self._finish(experiment, backend, failed)
+            if name in failed:
+                self._cancel_dependents(name, pending, backends, failed)
+        # poll at the pace of the most active job
+        self._job_state = 'R' if 'R' in states else 'Q'
+
+
+    def _finish(self, experiment, backend, failed):
+        timer = experiment.get_phase_timer()
+        timer.stop('wait')
+        backend._finish_job(experiment)
+        exit_status = experiment.get_exit_status()
+        try:
+            with timer.phase('collect'):
+                backend._collect_output(experiment)
+        except ErrorReturnCode:
+            failed.add(experiment.get_name())
+        if experiment.get_cancel_reason() is not None:
+            failed.add(experiment.get_name())
+        elif exit_status not in (0, None) or any(
+                record.exit_status not in (0, None)
+                for record in experiment.get_array_records().values()):
+            self.logger.error("Workload '{}' failed with exit status {}.".format(
+                experiment.get_name(), exit_status))
+            failed.add(experiment.get_name())
+        self.logger.info("Workload '{}' finished.".format(experiment.get_name()))
+
+
+    def _cancel_dependents(self, name, pending, backends, failed):
+        """Cancel the jobs of all (transitive) dependents of a failed workload."""
+        dependents = [experiment for experiment in pending
+                      if name in experiment.get_depends_on()]
+        for experiment in dependents:
+            pending.remove(experiment)
+            failed.add(experiment.get_name())
+            backend = backends[experiment.get_name()]
+            self._release_slot(backend)
+            backend._cancel_job(experiment, "dependency '{}' failed".format(name))
+            backend.poller.untrack(backend._get_poll_id(experiment))
+            self._cancel_dependents(experiment.get_name(), pending, backends, failed)
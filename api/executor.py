@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Concurrent execution of many workloads"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import threading
+
+from api.logger import getLogger
+from api.experiment_config import ExperimentConfig
+from api.hpc_backend import HPCBackend
+
+
+class WorkloadExecutor(object):
+    """
+    Runs many workloads concurrently, one thread per running workload.
+
+    Stage-in, submission, waiting and collection of all workloads overlap,
+    the per host limits of transfers and in-flight jobs are enforced by
+    HPCBackend.run_experiment. Experiments are consumed lazily, at most
+    'max_workers' of them are held and run at once.
+    """
+
+    def __init__(self, max_workers=100):
+        """Initialize the executor."""
+        self.logger = getLogger(__name__)
+        self.max_workers = max_workers
+
+
+    def run(self, workloadDefs):
+        """Run all workloads, returns one result (or None) per workload."""
+        # parse configs upfront, in order
+        experiments = [ExperimentConfig(workloadDef)
+                       for workloadDef in workloadDefs]
+        return self.run_experiments(experiments)
+
+
+    def run_experiments(self, experiments):
+        """Run the experiments of any iterable, e.g. a lazy sweep."""
+        results = []
+        threads = []
+        workers = threading.BoundedSemaphore(self.max_workers)
+        for index, experimentCfg in enumerate(experiments):
+            workers.acquire()
+            results.append(None)
+            thread = threading.Thread(
+                target=self._run_workload,
+                args=(index, experimentCfg, results, workers),
+                name='workload-{}'.format(experimentCfg.get_name()))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        self.logger.info('{} workload(s) started.'.format(len(threads)))
+        for thread in threads:
+            thread.join()
+        self.logger.info('{} of {} workload(s) succeeded.'.format(
+            len([result for result in results if result is not None]),
+            len(results)))
+        return results
+
+
+    def _run_workload(self, index, experimentCfg, results, workers):
+        """Thread body, stores the result of one workload."""
+        try:
+            hpcBackend = HPCBackend(experimentCfg.getHPCConfig())
+            hpcBackend.run_experiment(experimentCfg)
+            results[index] = hpcBackend.get_result(experimentCfg)
+        except (Exception, SystemExit) as e:
+            # sys.exit() in a thread only ends this workload
+            self.logger.error("Workload '{}' failed: {}".format(
+                experimentCfg.get_name(), e))
+            results[index] = None
+        finally:
+            workers.release()
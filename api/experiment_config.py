@@ -30,34 +30,76 @@ import os
 import re
 
 from api.logger import getLogger, setLogLevel, muteSH
-from api.hpc_config import HPCBackendConfiguration
+from api.hpc_config import load_hpc_config
+from api.target_selector import select_target
+from api.job_cleanup import install_handlers
+from api.phase_timer import PhaseTimer
+
+
+# str and unicode in python 2, str in python 3
+try:
+    _string_types = basestring
+except NameError:
+    _string_types = str
 
 
 class ExperimentConfig(object):
     """Class for experiment configuration."""
 
-    def __init__(self, workloadDef):
-        """Initialize this Class."""
+    def __init__(self, workloadDef, hpcConfig=None):
+        """Initialize this Class, optionally sharing a loaded HPC config."""
         self.name = None
         # experiment artefacts
         self.job_script = None
         self.input_data = None
         self.qsub_args = None
         self.vsub_args = None
+        # qsub args to choose from at submission, with qsub_args
+        self.alternatives = []
+        self.plan = None
+        # job array
+        self.array_request = None
+        self.array_indices = None
+        self.array_values = None
+        # names of workloads that have to succeed first
+        self.depends_on = []
+        # small workload, may share a job with others
+        self.pack = False
+        # seconds after submission the job is cancelled at
+        self.deadline = None
+        self.max_queue_wait = None
         # hpc backend config
-        self.hpc_config = None
+        self.hpc_config = hpcConfig
+        # selected submission target, if the config lists several
+        self.hpc_target = None
+        # parameter sweep
+        self.sweep_id = None
+        self.sweep_point = None
         # set during execution
         self.job_id = None
         self.stripped_job_id = None
         self.start_time = None
-        self.stop_time = None
+        self.end_time = None
         self.job_state = None
+        self.phase_timer = PhaseTimer()
+        self.job_record = None
+        self.stage_in_stats = []
+        self.result_files = {}
+        self.vm_timings = None
+        self.array_records = {}
+        self.cache_key = None
+        self.cache_hit = False
+        self.journal_key = None
+        self.cancel_reason = None
         # logging
         self.logger = getLogger(__name__)
         self.logger.debug('Initialize class')
         muteSH();
         # parse and validate experiments
         self.__load_experiment(workloadDef)
+        # created by the main thread, unlike the back-ends of an executor
+        if self.hpc_config.cancel_on_exit:
+            install_handlers()
 
     def __load_experiment(self, experimentCfg):
         """Validate experiment's YAML, parsed/provided by scotty."""
@@ -71,7 +113,14 @@ class ExperimentConfig(object):
               input_data: example/experiment01/input_data/    [optional]
               hpc_config: example/hpc_backend.cfg             [optional]
               qsub_args: "-l nodes=1:debug                    [optional]
+              alternatives: ["-q express -l nodes=1", ...]    [optional]
               vsub_args: "-vm vcpus=4 -vm ram=8012M"          [optional]
+              array: "1-10%4" | 10 | {values: [a, b, c], slots: 2} [optional]
+              sweep: {mode: product, nodes: [1, 2], env: {...}} [optional]
+              depends_on: [<workload name>, ...]              [optional]
+              pack: true                                      [optional]
+              deadline: 3600                                  [optional]
+              max_queue_wait: 600                             [optional]
         """
 
         self.logger.debug('Validating experiment configuration')
@@ -117,23 +166,99 @@ class ExperimentConfig(object):
         if 'qsub_args' in experimentCfg.params:
             self.qsub_args = experimentCfg.params['qsub_args']
 
+        if 'alternatives' in experimentCfg.params:
+            alternatives = experimentCfg.params['alternatives']
+            if isinstance(alternatives, _string_types):
+                alternatives = [alternatives]
+            self.alternatives = list(alternatives)
+
         if 'vsub_args' in experimentCfg.params:
             self.vsub_args = experimentCfg.params['vsub_args']
 
+        if 'array' in experimentCfg.params:
+            self.__load_array(experimentCfg.params['array'])
+
+        if 'depends_on' in experimentCfg.params:
+            depends_on = experimentCfg.params['depends_on']
+            if isinstance(depends_on, _string_types):
+                depends_on = [depends_on]
+            self.depends_on = list(depends_on)
+
+        if 'pack' in experimentCfg.params:
+            self.pack = bool(experimentCfg.params['pack'])
+
+        for key in ('deadline', 'max_queue_wait'):
+            if experimentCfg.params.get(key) is None:
+                continue
+            try:
+                setattr(self, key, float(experimentCfg.params[key]))
+            except (TypeError, ValueError):
+                self.logger.error(
+                    "Parameter '{}' must be a number of seconds, got '{}'.".format(
+                        key, experimentCfg.params[key]))
+                sys.exit(1)
+
         if 'input_data' in experimentCfg.params:
             self.input_data = self.unifyPath(experimentCfg.params['input_data'])
             # remove trailing slash
             if self.input_data.endswith('/'):
                 self.input_data = self.input_data[:-1]
 
+        if self.hpc_config is not None:
+            # shared config, e.g. of a parameter sweep
+            return
+
         if "hpc_config" in experimentCfg.params:
             hpcConfigPath = self.unifyPath(experimentCfg.params['hpc_config'])
         else:
             self.logger.error("HPC back-end configuration file not found.")
             sys.exit(1)
 
-        # initialize HPC back-end config
-        self.hpc_config = HPCBackendConfiguration(hpcConfigPath)
+        # initialize HPC back-end config, shared by all workloads using it
+        self.hpc_config = load_hpc_config(hpcConfigPath)
+
+
+    def __load_array(self, arrayCfg):
+        """Parse the job array definition into a qsub '-t' request."""
+        slots = None
+        if isinstance(arrayCfg, dict):
+            slots = arrayCfg.get('slots')
+            if 'values' in arrayCfg:
+                self.array_values = [str(value) for value in arrayCfg['values']]
+                request = '0-{}'.format(len(self.array_values) - 1)
+            else:
+                request = str(arrayCfg.get('indices', ''))
+        elif isinstance(arrayCfg, int):
+            request = '0-{}'.format(arrayCfg - 1)
+        else:
+            request, _, slots = str(arrayCfg).partition('%')
+
+        # expand '1-5,8' into indices
+        indices = []
+        try:
+            for part in request.split(','):
+                first, _, last = part.strip().partition('-')
+                indices.extend(range(int(first), int(last or first) + 1))
+        except ValueError:
+            self.logger.error(
+                "Invalid job array definition '{}'.".format(arrayCfg))
+            sys.exit(1)
+        if not indices:
+            self.logger.error("Job array '{}' is empty.".format(arrayCfg))
+            sys.exit(1)
+        # passed space-separated, with qsub's comma-separated '-v'
+        if any(' ' in value or ',' in value
+               for value in self.array_values or []):
+            self.logger.error(
+                "Job array values must not contain spaces or commas.")
+            sys.exit(1)
+
+        self.array_indices = indices
+        self.array_request = request.replace(' ', '')
+        if slots:
+            self.array_request += '%{}'.format(int(slots))
+        self.logger.debug("Job array '{}' with {} sub-job(s)".format(
+            self.array_request, len(indices)))
 
 
     def unifyPath(self, path):
@@ -153,9 +278,25 @@ class ExperimentConfig(object):
 
 
     def getHPCConfig(self):
+        """HPC config, of the selected target if the config lists several."""
+        if self.hpc_target is None:
+            if self.hpc_config is None or not self.hpc_config.targets:
+                return self.hpc_config
+            self.hpc_target = select_target(self.hpc_config, self)
+        return self.hpc_target
+
+
+    def get_base_hpc_config(self):
+        """HPC config as loaded, shared by all its targets."""
         return self.hpc_config
 
 
+    def set_hpc_target(self, hpcTarget):
+        """Use the given target, e.g. the one of a dependency."""
+        if self.hpc_target is None and self.hpc_config.targets:
+            self.hpc_target = select_target(self.hpc_config, self, hpcTarget)
+
+
     def get_name(self):
         """Getter for name."""
         return self.name
@@ -180,9 +321,80 @@ class ExperimentConfig(object):
 
 
     def get_qsub_args(self):
+        """Qsub args, of the planned alternative if there are alternatives."""
+        if self.plan is not None:
+            return self.plan['qsub_args']
         return self.qsub_args
 
 
+    def get_declared_qsub_args(self):
+        """Qsub args as declared, whatever was planned."""
+        return self.qsub_args
+
+
+    def get_alternatives(self):
+        """Qsub args acceptable instead of the declared ones."""
+        return self.alternatives
+
+
+    def set_plan(self, plan):
+        """Setter for the submission plan, see SubmitPlanner."""
+        self.plan = plan
+
+
+    def get_plan(self):
+        return self.plan
+
+
+    def get_depends_on(self):
+        """Names of the workloads this one depends on."""
+        return self.depends_on
+
+
+    def get_deadline(self):
+        """Seconds after submission the job has to be finished in."""
+        return self.deadline
+
+
+    def get_max_queue_wait(self):
+        """Seconds after submission the job has to be running in."""
+        return self.max_queue_wait
+
+
+    def set_cancel_reason(self, cancelReason):
+        """Setter for the reason the job was cancelled by the generator."""
+        self.cancel_reason = cancelReason
+
+
+    def get_cancel_reason(self):
+        return self.cancel_reason
+
+
+    def is_packable(self):
+        """Whether the workload may run in a packed job with others."""
+        return (self.pack and not self.is_vm_job() and not self.is_array_job()
+                and not self.depends_on and not self.alternatives
+                and self.deadline is None and self.max_queue_wait is None)
+
+
+    def is_array_job(self):
+        return self.array_request is not None
+
+
+    def get_array_request(self):
+        """Torque array request, e.g. '1-10%4'."""
+        return self.array_request
+
+
+    def get_array_indices(self):
+        return self.array_indices
+
+
+    def get_array_values(self):
+        """Parameter values per array index, None if not defined."""
+        return self.array_values
+
+
     def set_job_id(self, jobID):
         if self.job_id is not None:
             raise Exception("Job ID cannot be overridden")
@@ -208,10 +420,10 @@ class ExperimentConfig(object):
         return self.start_time
 
 
-    def set_end_time(self, startTime):
-        if self.job_id is not None:
-            raise Exception("Job ID cannot be overridden")
-        self.end_time = startTime
+    def set_end_time(self, endTime):
+        if self.end_time is not None:
+            raise Exception("End time cannot be overridden")
+        self.end_time = endTime
 
 
     def get_end_time(self):
@@ -219,10 +431,114 @@ class ExperimentConfig(object):
 
 
     def set_job_state(self, jobState):
-        if self.job_state is not None:
-            raise Exception("Job ID cannot be overridden")
+        """Last job state reported by the batch system."""
         self.job_state = jobState
 
 
     def get_job_state(self):
         return self.job_state
+
+
+    def set_phase_timer(self, phaseTimer):
+        """Share the timer of the job this one ran in, e.g. a packed job."""
+        self.phase_timer = phaseTimer
+
+
+    def get_phase_timer(self):
+        return self.phase_timer
+
+
+    def get_timings(self):
+        """Seconds spent in each phase of the execution."""
+        return self.phase_timer.get_timings()
+
+
+    def set_job_record(self, jobRecord):
+        self.job_record = jobRecord
+
+
+    def get_job_record(self):
+        return self.job_record
+
+
+    def get_exit_status(self):
+        if self.job_record is None:
+            return None
+        return self.job_record.exit_status
+
+
+    def get_resources_used(self):
+        if self.job_record is None:
+            return {}
+        return dict(self.job_record.resources_used)
+
+
+    def add_stage_in_stats(self, stats):
+        if stats is not None:
+            self.stage_in_stats.append(stats)
+
+
+    def get_stage_in_stats(self):
+        return self.stage_in_stats
+
+
+    def set_result_files(self, resultFiles):
+        self.result_files = resultFiles
+
+
+    def get_result_files(self):
+        return self.result_files
+
+
+    def set_vm_timings(self, vmTimings):
+        """Setter for the VM phases of the job, see api.vtorque_log."""
+        self.vm_timings = vmTimings
+
+
+    def get_vm_timings(self):
+        return self.vm_timings
+
+
+    def set_array_records(self, arrayRecords):
+        self.array_records = arrayRecords
+
+
+    def get_array_records(self):
+        """Sub-job records of a job array, keyed by index."""
+        return self.array_records
+
+
+    def set_cache_info(self, cacheKey, cacheHit):
+        self.cache_key = cacheKey
+        self.cache_hit = cacheHit
+
+
+    def get_cache_info(self):
+        """Result cache key and whether the result came from the cache."""
+        return {
+            'key': self.cache_key,
+            'hit': self.cache_hit
+        }
+
+
+    def set_journal_key(self, journalKey):
+        self.journal_key = journalKey
+
+
+    def get_journal_key(self):
+        """Key of the workload in the job journal, None until computed."""
+        return self.journal_key
+
+
+    def set_sweep_point(self, sweepId, sweepPoint):
+        self.sweep_id = sweepId
+        self.sweep_point = sweepPoint
+
+
+    def get_sweep_id(self):
+        """Stable ID of the sweep point, None if not part of a sweep."""
+        return self.sweep_id
+
+
+    def get_sweep_point(self):
+        return self.sweep_point
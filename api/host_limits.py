@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Per submission host concurrency limits"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import threading
+
+from api.logger import getLogger
+
+
+# all limits of this process, keyed by submission host
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+class HostLimits(object):
+    """Bounds concurrent transfers and in-flight jobs of one host."""
+
+    def __init__(self, host, max_transfers, max_jobs):
+        """Initialize the semaphores."""
+        self.logger = getLogger(__name__)
+        self.host = host
+        self.transfers = threading.BoundedSemaphore(int(max_transfers))
+        self.jobs = threading.BoundedSemaphore(int(max_jobs))
+        self.logger.debug(
+            "Host '{}' limited to {} transfer(s) and {} job(s) in flight"
+            .format(host, max_transfers, max_jobs))
+
+
+def get_host_limits(hpcConfig):
+    """Get the process-wide limits for the config's submission host."""
+    host = hpcConfig.get_value('host')
+    with _limits_lock:
+        if host not in _limits:
+            _limits[host] = HostLimits(host,
+                                       hpcConfig.max_concurrent_transfers,
+                                       hpcConfig.max_jobs_in_flight)
+        return _limits[host]
@@ -26,13 +26,33 @@
 
 import sys
 import os
+import json
+import shutil
 
 from time import time, sleep
-from sh import ssh, ErrorReturnCode, rsync
+from sh import ErrorReturnCode, rsync
 from logging import WARNING, DEBUG
 
 from api.logger import getLogger, setLogLevel, muteSH
 from api.hpc_config import HPCBackendConfiguration
+from api.ssh_channel import get_channel
+from api.qstat_poller import get_poller
+from api.scheduler import get_scheduler
+from api.target_selector import release_target
+from api.submit_planner import SubmitPlanner
+from api.job_cleanup import install_handlers, register, unregister, is_outstanding
+from api.qstat_parser import strip_job_id
+from api.poll_strategy import (AdaptivePolling, parse_walltime, RUNNING_STATES,
+                               QUEUED_STATES)
+from api.phase_timer import export_timings
+from api.job_journal import get_journal, get_workload_key
+from api.result_cache import get_result_cache
+from api.host_limits import get_host_limits
+from api.stage_manifest import IncrementalStager
+from api.log_stream import LogFetcher, CHUNK_SIZE
+from api.result_collector import ResultCollector
+from api.vtorque_log import (get_log_format, read_vm_timings, record_vm_timings,
+                             get_vm_timing_stats)
 
 
 
@@ -40,8 +60,8 @@ from api.hpc_config import HPCBackendConfiguration
 class HPCBackend(object):
     """HPC system back-end """
 
-    def __init__(self, hpcCfg):
-        """Initialize connection object."""
+    def __init__(self, hpcCfg, channel=None):
+        """Initialize connection object, optionally on a given channel."""
         self.logger = getLogger(__name__)
         assert hpcCfg is not None
         self.hpcConfig = hpcCfg
@@ -49,56 +69,83 @@ class HPCBackend(object):
                           self.hpcConfig.get_value('host'),
                           self.hpcConfig.get_value('user_name'),
                           self.hpcConfig.get_value('ssh_port'))
-        try:
-            self.ssh_conn = ssh.bake('-n', self.hpcConfig.get_value('host'))
-            self.ssh_conn = ssh.bake('-l', self.hpcConfig.get_value('user_name'))
-            self.ssh_conn = ssh.bake('-p', self.hpcConfig.get_value('ssh_port'))
-            self.ssh_conn = ssh.bake('-i', self.hpcConfig.get_value('ssh_key'))
-            self.ssh_conn = ssh.bake(self.hpcConfig.get_value('host'))
-            # enforce desired log level
-            muteSH()
-            getLogger("sh.command").setLevel(WARNING)
-        except ErrorReturnCode as e:
-            self.logger.error('SSH initialization failed:\n{}'.format(e.stderr))
-            sys.exit(1)
+        # one multiplexed connection per host/user/port/key, process-wide
+        self.ssh_conn = channel or get_channel(self.hpcConfig)
+        # sends only what changed since the last stage-in
+        self.stager = IncrementalStager(self.ssh_conn,
+                                        self.hpcConfig.get_value('execution_dir'),
+                                        self.hpcConfig.manifest_cache_dir)
+        # streams the running job's log in chunks (live_log)
+        self.log_fetcher = LogFetcher(self.ssh_conn,
+                                      compress=self.hpcConfig.log_compress)
+        # fetches all result artifacts of a job at once
+        self.collector = ResultCollector(self.ssh_conn,
+                                         self.hpcConfig.results_dir,
+                                         self.hpcConfig.log_tail_lines)
+        # Torque, Slurm or local execution
+        self.scheduler = get_scheduler(self.hpcConfig, self.ssh_conn)
+        # picks one of the qsub args alternatives of a workload
+        self.planner = SubmitPlanner(self.scheduler)
+        # one batched status query per interval for all jobs of this process,
+        # states are at most as old as the shortest adaptive poll interval
+        self.poller = get_poller(self.scheduler, self.hpcConfig.poll_time_min)
+        # survives restarts, for reattaching to submitted jobs
+        self.journal = get_journal(self.hpcConfig)
+        # results of unchanged experiments, opt-in
+        self.result_cache = get_result_cache(self.hpcConfig)
+        # no job is left behind on failure or exit, unless disabled
+        if self.hpcConfig.cancel_on_exit:
+            install_handlers()
+        # enforce desired log level
+        muteSH()
+        getLogger("sh.command").setLevel(WARNING)
+
+    def _get_poll_id(self, experiment):
+        """Job ID as tracked by the poller, '123[]' for job arrays."""
+        return strip_job_id(experiment.get_job_id())
+
 
     def _get_job_state(self, experiment):
-        """ Determines current job state with qstat"""
+        """ Determines current job state with the shared qstat poller"""
         try:
-            self.logger.debug('getting qstat infos')
-            ssh_output = self.ssh_conn(self.hpcConfig.path_qstat, experiment.get_stripped_job_id())
-
-            self.logger.debug('qstat output:\n{}'.format(ssh_output))
-
-            if ssh_output != '':
-                # slice the header and the last line which is empty
-                jobs_displayed = ssh_output.split('\n')[2:-1]
-                for job in jobs_displayed:
-                    # remove whitespace
-                    job_info = ' '.join(job.split())
-                    # split into stuff
-                    (job_id,
-                        job_name,
-                        job_user,
-                        job_time,
-                        job_state,
-                        job_queue) = job_info.split(' ')
-                    self.logger.debug(
-                        'job {} is in state {}'.format(experiment.get_job_id(), job_state))
-                    return job_state
-            else:
-                return None
-
+            job_record = self.poller.get_record(self._get_poll_id(experiment))
         except ErrorReturnCode as e:
             self.logger.error('\nError checking job state:\n{}'.format(e.stderr))
             sys.exit(1)
+        return self._apply_job_record(experiment, job_record)
+
+
+    def _apply_job_record(self, experiment, job_record):
+        """Keep the polled record of the job, returns its state."""
+        if job_record is None:
+            job_state = None
+        else:
+            # keep exit status and resource usage of the last poll
+            experiment.set_job_record(job_record)
+            job_state = job_record.state
+            experiment.set_job_state(job_state)
+            if job_state in RUNNING_STATES:
+                # end of the queue wait, as observed; a job first seen
+                # finished is reported as never seen running
+                experiment.get_phase_timer().mark('running')
+        self.logger.debug(
+            'job {} is in state {}'.format(experiment.get_job_id(), job_state))
+        return job_state
+
+
+    def _is_job_running(self, experiment, job_status=None):
 
+        if job_status is None:
+            job_status = self._get_job_state(experiment)
+        return self._check_job_state(experiment, job_status)
 
-    def _is_job_running(self, experiment):
 
-        job_status = self._get_job_state(experiment)
+    def _check_job_state(self, experiment, job_status):
+        """Whether the job in the given state is still running, no polling."""
         job_id = experiment.get_job_id()
 
+        if self._is_overdue(experiment, job_status):
+            return False
         if job_status == 'Q':
             self.logger.debug(
                 "Job with ID '{}' is queued.".format(job_id))
@@ -124,8 +171,8 @@ class HPCBackend(object):
                 "Job with ID '{}' is completed.".format(job_id))
             return False
         elif job_status == 'H':
-            self.logger.error(
-                "Job with ID '{}' is on hold, aborting.".format(job_id))
+            # would hold its resources forever
+            self._cancel_job(experiment, 'job is on hold')
             return False
         elif job_status is None:
             self.logger.debug(
@@ -137,142 +184,125 @@ class HPCBackend(object):
             return False
 
 
+    def _is_overdue(self, experiment, job_status):
+        """Cancels the job if it exceeded its deadline or max queue wait."""
+        if job_status in (None, 'C', 'H') or experiment.get_start_time() is None:
+            return False
+        elapsed = time() - experiment.get_start_time() / 1000.0
+        deadline = experiment.get_deadline()
+        max_queue_wait = experiment.get_max_queue_wait()
+        if deadline is not None and elapsed > deadline:
+            reason = 'deadline of {:.0f}s exceeded'.format(deadline)
+        elif (max_queue_wait is not None and elapsed > max_queue_wait and
+                job_status in QUEUED_STATES and
+                'running' not in experiment.get_phase_timer().events):
+            reason = 'queued longer than {:.0f}s'.format(max_queue_wait)
+        else:
+            return False
+        self._cancel_job(experiment, reason)
+        return True
+
+
+    def _cancel_job(self, experiment, reason):
+        """Cancel the job, the workload fails."""
+        self.logger.error("Cancelling job '{}' of workload '{}', {}.".format(
+            experiment.get_job_id(), experiment.get_name(), reason))
+        experiment.set_cancel_reason(reason)
+        unregister(experiment)
+        try:
+            self.scheduler.cancel([self._get_poll_id(experiment)])
+        except ErrorReturnCode as e:
+            self.logger.warning('Cancelling failed:\n{}'.format(e.stderr))
+        if self.journal:
+            # the next run submits a new job
+            self.journal.record_finished(self._get_journal_key(experiment))
+
+
     def _wait_for_job(self, experiment):
         """Wait for the job to finish."""
         job_running = True
         job_id = experiment.get_job_id()
         self.logger.info("Job '{}' submitted, waiting for completion."
                  "  May take quite some time, so please be patient ...".format(job_id))
-        sleeping_time = 5  # seconds
+        polling = AdaptivePolling(
+            self.hpcConfig, parse_walltime(experiment.get_qsub_args()))
+        job_state = None
         while job_running:
-            self.logger.debug("Sleeping for '{}' seconds".format(sleeping_time))
+            sleeping_time = polling.next_interval(job_state)
+            self.logger.debug("Sleeping for '{:.1f}' seconds".format(sleeping_time))
             sleep(sleeping_time)
-            job_running = self._is_job_running(experiment)
+            last_state = job_state
+            job_state = self._get_job_state(experiment)
+            job_running = self._is_job_running(experiment, job_state)
+            if self.journal and job_state != last_state:
+                self.journal.record_state(
+                    self._get_journal_key(experiment), job_state)
+            if job_state == 'R' and self.hpcConfig.live_log:
+                self._tail_log(experiment)
+        self._finish_job(experiment)
         # done
         self.logger.info("Job '{}' finished. Unblocking now.".format(job_id))
 
 
-    def _build_qsub_args(self, experiment):
-        """Build a list of arguments passed to qsub."""
-        arg_list = []
-        self.logger.debug('arg_list building arg_list')
+    def _finish_job(self, experiment):
+        """Keep the final state of a finished job and stop polling it."""
+        poll_id = self._get_poll_id(experiment)
+        if experiment.is_array_job():
+            experiment.set_array_records(self.poller.get_array_records(poll_id))
+        self.poller.untrack(poll_id)
+        unregister(experiment)
+        experiment.set_end_time(int(time()) * 1000)
+        self.planner.report(experiment)
+        self._release_target(experiment)
 
-        if experiment is None:
-            self.logger.error("No experiment config.")
-            sys.exit(1)
 
-        qsub_args = experiment.get_qsub_args();
-        if qsub_args is None:
-            self.logger.info("Parameter 'qsub_args' not found.")
-        else:
-            arg_list.append(qsub_args)
+    def _release_target(self, experiment):
+        """Count the job as finished on its submission target."""
+        release_target(experiment)
 
-        vsub_args = experiment.get_vsub_args();
-        if vsub_args is None:
-            self.logger.info("Parameter 'vsub_args' not found.")
-        else:
-            arg_list.append(vsub_args)
-        self.logger.debug('returning arg list = {}'.format(arg_list))
-        return arg_list
 
+    def _stdout(self):
+        """Binary stdout the remote logs are streamed to."""
+        sys.stdout.flush()
+        return getattr(sys.stdout, 'buffer', sys.stdout)
 
-    def _get_output_log(self, log_path):
-        """Collect the output log form the remote system."""
-        self.logger.info("Fetching remote log file '%s'", log_path)
-        try:
-            remote_log = self.ssh_conn('cat', log_path)
-        except ErrorReturnCode as e:
-            self.logger.error("Failed to fetch log file '%s' from HPC system, error msg:\n%s",
-                              log_path, e.stderr)
-            sys.exit(1)
-        return remote_log
 
+    def _tail_log(self, experiment):
+        """Print what the running job appended to its stdout log."""
+        log_path = self._get_std_log_path('STDIN', experiment)
+        try:
+            self.log_fetcher.fetch_new(log_path, self._stdout())
+        except ErrorReturnCode:
+            self.logger.debug("Log '{}' not available yet.".format(log_path))
 
-    def _get_std_log_path(self, log_type, experimentCfg):
-        """Build log path with log type option."""
-        if log_type == 'STDIN':
-            log_type_string = 'o'
-        elif log_type == 'STDERR':
-            log_type_string = 'e'
-        else:
-            self.logger.error('Unknown log type, {}'.format(log_type))
-
-        job_script = os.path.basename(experimentCfg.get_job_script())
-        job_id = experimentCfg.get_stripped_job_id()
-        log_path = '~/{}.{}{}'.format(job_script,
-                                      log_type_string,
-                                      job_id)
 
+    def _get_std_log_path(self, log_type, experimentCfg, index=None):
+        """Build log path with log type option, per index for job arrays."""
+        log_path = self.scheduler.get_log_path(log_type, experimentCfg, index)
         self.logger.debug("Remote log file '{}' as path for log-file".format(log_path))
         return log_path
 
 
-    def _get_vsub_debug_log_path(self, experiment):
-        vtorque_args = experiment.get_vsub_args()
-        self.logger.debug('getting vtorque as {}'.format(vtorque_args))
-        if experiment.is_vm_job():
-            return '{}/{}/debug.log'.format(
-                self.hpcConfig.get_value('path_vtorque_log'),
-                experiment.get_job_id()).replace('\n','')
-
-
-    def _print_log_file(self, log_type, log_file):
-        """Collect and print the stdin log from qsub."""
+    def _print_log_file(self, log_type, log_path):
+        """Print the collected log file."""
         self.logger.info(
             '\n'
             '----------------------------------------------\n'
             'Log file content: {}\n'
             '----------------------------------------------\n'.format(log_type)
         )
-        print(log_file)
+        with open(log_path, 'rb') as log_file:
+            shutil.copyfileobj(log_file, self._stdout(), CHUNK_SIZE)
         self.logger.info(
             '\n'
             '----------------------------------------------\n')
 
 
-    def _print_log(self, log_type, experiment):
-        """Switch for different log types."""
-        if log_type == 'STDIN' or log_type == 'STDERR':
-            log_path = self._get_std_log_path(log_type, experiment)
-        elif log_type == 'VTORQUE_DEBUG_LOG':
-            log_path = self._get_vsub_debug_log_path(experiment)
-        else:
-            self.logger.error('Unknown log type, {}'.format(log_type))
-            exit(1)
-        # print log if exists
-        if log_path is None:
-            self.logger.info('No log for {}'.format(log_type))
-        else:
-            log_file = self._get_output_log(log_path)
-            self._print_log_file(log_type, log_file)
-
-
-    def _submit_job(self, experiment):
-        """Submit the job to qsub, returns job_id."""
+    def _submit_job(self, experiment, depends_on=None):
+        """Submit the job to the batch system, sets the job_id."""
         self.logger.info('Submitting experiment to HPC system.')
-
-        exec_dir = self.hpcConfig.get_value('execution_dir')
-        job_script = os.path.basename(experiment.get_job_script())
-
-        arg_list = self._build_qsub_args(experiment)
-        arg_list.append(job_script)
-        self.logger.info('Batch-System arguments:\n {}'.format(arg_list))
-
-        self.logger.debug(
-            '{} {}'.format(self.hpcConfig.path_qsub, arg_list)
-        )
-
-        # job submit depends on either vm job or not
-        submission_cmd = "cd {}; ".format(exec_dir)
-        if experiment.is_vm_job():
-            self.logger.info('VM job detected')
-            submission_cmd += self.hpcConfig.path_vsub;
-        else:
-            submission_cmd += self.hpcConfig.path_qsub;
-            self.logger.info('Bare-metal job detected.')
-        self.logger.info(
-            'using command \'{}\' for job submission.'.format(
-                submission_cmd))
+        if experiment.get_alternatives() and experiment.get_plan() is None:
+            self.planner.plan(experiment)
 
         # get stating time and convert
         experiment.set_start_time(int(time()) * 1000)
@@ -280,43 +310,44 @@ class HPCBackend(object):
             'stat time stamp: {}'.format(experiment.get_start_time())
         )
 
-        try:
-            ssh_output = self.ssh_conn(submission_cmd, arg_list)
-        except ErrorReturnCode as e:
-            self.logger.error(
-                "Job failed. Error code '{}' for SSH cmd:\n {}".format(
-                    e.exit_code, e.full_cmd))
-            sys.exit(1)
-        self.logger.debug("SSH output:\n%s", ssh_output)
-
-        # searching job id
-        for line in ssh_output:
-            self.logger.debug("searching for job id in \n{}".format(line))
-            # job failed ?
-            if "error" in line:
-                self.logger.info("Job submission failed!\n %s", line)
-                sys.exit(1)
-            elif self.hpcConfig.domain in line:
-                self.logger.debug('Job id found: {}'.format(line))
-                experiment.set_job_id(str(line))
-                if self.hpcConfig.grafana:
-                    self.logger.info(
-                        'Job performance available data at:\n  '
-                        '{}var-JobId=snapTask-{}-{}&'
-                        'from={}&'
-                        'to=now'.format(
-                            self.hpcConfig.grafana_base_string,
-                            self.hpcConfig.user_name,
-                            experiment.get_job_id().rstrip(),
-                            experiment.get_start_time()
-                        )
-                    )
-                return
-            # job ID not found in output
-            self.logger.error(
-                "No job id found in ssh-output:\n-----\n{}\n-----\nexiting!".format(ssh_output)
+        job_id = self.scheduler.submit(experiment, depends_on)
+        self._track_job(experiment, job_id)
+
+
+    def _track_job(self, experiment, job_id):
+        """Keep the ID of the submitted job and start polling it."""
+        self.logger.debug('Job id found: {}'.format(job_id))
+        experiment.set_job_id(str(job_id))
+        self.poller.track(self._get_poll_id(experiment))
+        if self.hpcConfig.cancel_on_exit:
+            register(self, experiment)
+        if self.hpcConfig.grafana:
+            self.logger.info(
+                'Job performance available data at:\n  '
+                '{}var-JobId=snapTask-{}-{}&'
+                'from={}&'
+                'to=now'.format(
+                    self.hpcConfig.grafana_base_string,
+                    self.hpcConfig.user_name,
+                    experiment.get_job_id().rstrip(),
+                    experiment.get_start_time()
+                )
             )
-            sys.exit(1)
+
+
+    def _transfer(self, local_path):
+        """Transfer a file or dir into the execution dir."""
+        if self.hpcConfig.incremental_stage_in:
+            # only changed files, skipped entirely if nothing changed
+            return self.stager.stage(local_path)
+        else:
+            rsync_output = rsync(
+                "-pzvr", self.ssh_conn.rsync_args(), local_path,
+                self.ssh_conn.rsync_target(
+                    self.hpcConfig.get_value('execution_dir')))
+            self.logger.debug(
+                "rsync output:\n{}".format(rsync_output))
+            return None
 
 
     def _stage_in_data(self, experimentCfg):
@@ -330,61 +361,239 @@ class HPCBackend(object):
             try:
                 # transfer input data dir
                 self.logger.debug("Staging experiment dir '{}' to HPC system..".format(experimentCfg.get_input_data()))
-                rsync_output = rsync(
-                    "-pzvr", experimentCfg.get_input_data(), '{}@{}:{}'.format(
-                        self.hpcConfig.get_value('user_name'),
-                        self.hpcConfig.get_value('host'),
-                        self.hpcConfig.get_value('execution_dir')))
-                self.logger.debug(
-                    "rsync output:\n{}".format(rsync_output))
+                experimentCfg.add_stage_in_stats(self._transfer(experiment_dir))
             except ErrorReturnCode as e:
                 self.logger.error('Staging input data failed:\n{}'.format(e.stderr))
                 raise e
 
         try:
             # transfer job script
-            rsync_output = rsync(
-                "-pzvr", job_script, '{}@{}:{}'.format(
-                    self.hpcConfig.get_value('user_name'),
-                    self.hpcConfig.get_value('host'),
-                    self.hpcConfig.get_value('execution_dir')))
-            self.logger.debug(
-                "rsync output:\n{}".format(rsync_output))
+            experimentCfg.add_stage_in_stats(self._transfer(job_script))
         except ErrorReturnCode as e:
             self.logger.error('Staging job script failed:\n{}'.format(e.stderr))
             raise e
 
 
+    def _get_result_artifacts(self, experiment):
+        """Remote paths of all result artifacts of the job."""
+        return self.scheduler.get_result_artifacts(experiment)
+
+
     def _collect_output(self, experiment):
+        """Fetch all result artifacts in one round trip."""
+        try:
+            result_files = self.collector.collect(
+                experiment, self._get_result_artifacts(experiment))
+        except ErrorReturnCode as e:
+            self.logger.error('Collecting results failed:\n{}'.format(e.stderr))
+            raise e
+        experiment.set_result_files(result_files)
+        if 'vtorque_log' in result_files:
+            self._report_vm_timings(experiment, result_files['vtorque_log'])
         # print log ?
         if getLogger(__name__).getEffectiveLevel() is DEBUG:
-            self._print_log('STDIN', experiment)
-            self._print_log('STDERR', experiment)
-            if experiment.is_vm_job():
-                self._print_log('VTORQUE_DEBUG_LOG', experiment)
+            for name in sorted(result_files):
+                self._print_log_file(name, result_files[name])
+
+
+    def _report_vm_timings(self, experiment, log_path):
+        """Parse the VM phases of the collected vTorque debug log."""
+        line_pattern, events = get_log_format(self.hpcConfig)
+        vm_timings = read_vm_timings(log_path, line_pattern, events)
+        experiment.set_vm_timings(vm_timings)
+        if vm_timings is None:
+            self.logger.warning(
+                "No VM phases in the vTorque debug log of job '{}', check "
+                "'vtorque_log_line' and 'vtorque_log_events' against the "
+                "log.".format(experiment.get_job_id()))
+            return
+        record_vm_timings(vm_timings)
+        self.logger.info("VM phases of job '{}' in seconds: {}".format(
+            experiment.get_job_id(), json.dumps(dict(
+                (phase, seconds) for (phase, seconds) in vm_timings.items()
+                if phase != 'nodes'), sort_keys=True)))
+        self.logger.info('VM phases of all jobs: {}'.format(
+            json.dumps(get_vm_timing_stats(), sort_keys=True)))
 
 
     def cleanUp(self, jobID):
         assert jobID is not None
-        path = self.get_value('path_vtorque_log') + "/" + jobID
+        path = self.hpcConfig.get_value('path_vtorque_log') + "/" + jobID
         self.ssh_conn('rm', '-rf', path)
 
 
+    def close(self):
+        """Close the shared SSH connection and log its statistics."""
+        self.logger.debug('SSH channel statistics: {}'.format(
+            self.ssh_conn.get_stats()))
+        self.ssh_conn.close()
+
+
+    def _get_journal_key(self, experiment):
+        # hashes the job script and input data, thus only once
+        if experiment.get_journal_key() is None:
+            experiment.set_journal_key(get_workload_key(
+                experiment, self.hpcConfig.get_value('host'),
+                self.hpcConfig.manifest_cache_dir))
+        return experiment.get_journal_key()
+
+
+    def _reattach(self, experiment):
+        """Continue with the job of an interrupted run, if there is one."""
+        if self.journal is None or not self.hpcConfig.journal_reattach:
+            return False
+        entry = self.journal.get_unfinished(self._get_journal_key(experiment))
+        if entry is None or entry['job_id'] is None:
+            return False
+        if not self.journal.claim(entry):
+            self.logger.warning(
+                "Not reattaching to job '{}', the run that submitted it "
+                "(process {} on '{}') is still alive.".format(
+                    entry['job_id'], entry['owner_pid'], entry['owner_host']))
+            return False
+        self.logger.info(
+            "Reattaching to job '{}' submitted by an earlier run, last known "
+            "state '{}'.".format(entry['job_id'], entry['state']))
+        experiment.set_start_time(entry['submit_time'])
+        # cancelled on failures and signals like a job submitted by this run
+        self._track_job(experiment, entry['job_id'])
+        return True
+
+
     def run_experiment(self, experimentCfg):
+        try:
+            self._run_experiment(experimentCfg)
+        finally:
+            self._end_run(experimentCfg)
+
+
+    def _run_experiment(self, experimentCfg):
+        if self._start_run(experimentCfg):
+            return
+        limits = get_host_limits(self.hpcConfig)
+        timer = experimentCfg.get_phase_timer()
+        reattached = self._reattach(experimentCfg)
+        if not reattached:
+            # stage the input data
+            with limits.transfers:
+                self._stage_in(experimentCfg)
+        with limits.jobs:
+            if not reattached:
+                # submit job
+                with timer.phase('submit'):
+                    self._submit_job(experimentCfg)
+                self._record_submit(experimentCfg)
+            # waiting for job until done
+            with timer.phase('wait'):
+                self._wait_for_job(experimentCfg)
+        self._exit_if_cancelled(experimentCfg)
+        self._complete_run(experimentCfg)
+
+
+    #
+    # steps shared with the asyncio back-end, blocking
+    #
+
+    def _start_run(self, experimentCfg):
+        """Look the experiment up in the result cache, True on a hit."""
         self.logger.info("Experiment execution starts.")
         self.logger.info("Executing experiment '{}'".format(experimentCfg.name))
-        # stage the input data
-        self._stage_in_data(experimentCfg)
-        # submit job
-        self._submit_job(experimentCfg)
-        # waiting for job until done
-        self._wait_for_job(experimentCfg)
-        # collect output
-        self._collect_output(experimentCfg)
+        if not self.result_cache:
+            return False
+        cache_key = self.result_cache.get_key(experimentCfg, self.hpcConfig)
+        cache_hit = self.result_cache.load(cache_key, experimentCfg)
+        experimentCfg.set_cache_info(cache_key, cache_hit)
+        if cache_hit:
+            self.logger.info('Experiment result taken from the cache.')
+        return cache_hit
+
+
+    def _stage_in(self, experimentCfg):
+        """Stage the input data and job script, journaled."""
+        with experimentCfg.get_phase_timer().phase('stage_in'):
+            self._stage_in_data(experimentCfg)
+        if self.journal:
+            self.journal.record_stage_in(
+                self._get_journal_key(experimentCfg), experimentCfg,
+                self.hpcConfig.get_value('host'))
+
+
+    def _record_submit(self, experimentCfg):
+        if self.journal:
+            self.journal.record_submit(
+                self._get_journal_key(experimentCfg),
+                experimentCfg.get_job_id(),
+                experimentCfg.get_start_time())
+
+
+    def _complete_run(self, experimentCfg):
+        """Collect the output of the finished job, store and export it."""
+        with experimentCfg.get_phase_timer().phase('collect'):
+            self._collect_output(experimentCfg)
+        if self.journal:
+            self.journal.record_finished(self._get_journal_key(experimentCfg))
+        if self.result_cache:
+            self.result_cache.store(experimentCfg.get_cache_info()['key'],
+                                    experimentCfg)
         # clean up
         #self.clean_up()
         # done
-        self.logger.info('Experiment execution finished.')
+        self.logger.info('Experiment execution finished, timings: {}'.format(
+            experimentCfg.get_timings()))
+        export_timings(self.hpcConfig, experimentCfg)
+
+
+    def _end_run(self, experimentCfg):
+        """Clean up after the run, whether it succeeded or not."""
+        if is_outstanding(experimentCfg):
+            # failed or interrupted while the job is queued or running
+            self._cancel_job(experimentCfg, 'the run was aborted')
+        # also if it failed, the job is not in flight anymore
+        self._release_target(experimentCfg)
+
+
+    def _exit_if_cancelled(self, experimentCfg):
+        if experimentCfg.get_cancel_reason() is not None:
+            self.logger.error("Workload '{}' failed, its job was cancelled: {}".format(
+                experimentCfg.get_name(), experimentCfg.get_cancel_reason()))
+            sys.exit(1)
+
+
+    def get_result(self, experimentCfg):
+        """Result of a finished experiment, as returned to scotty."""
+        # local copies of the collected artifacts, remote paths otherwise
+        data = self._get_result_artifacts(experimentCfg)
+        data.update(experimentCfg.get_result_files())
+        data.setdefault('vtorque_log', None)
+        return {
+                "endpoint" : {
+                   "identifier": "submission host",
+                   "host" : self.hpcConfig.get_value('host')
+                },
+                "data" : data,
+                "job" : {
+                    "id" : experimentCfg.get_job_id(),
+                    "exit_status" : experimentCfg.get_exit_status(),
+                    "cancelled" : experimentCfg.get_cancel_reason(),
+                    "resources_used" : experimentCfg.get_resources_used(),
+                    "array" : dict(
+                        (index, record.to_dict()) for (index, record)
+                        in experimentCfg.get_array_records().items())
+                },
+                "sweep" : {
+                    "id" : experimentCfg.get_sweep_id(),
+                    "params" : experimentCfg.get_sweep_point()
+                },
+                "stage_in" : experimentCfg.get_stage_in_stats(),
+                "timings" : experimentCfg.get_timings(),
+                "vm_timings" : experimentCfg.get_vm_timings(),
+                "cache" : experimentCfg.get_cache_info(),
+                "plan" : experimentCfg.get_plan(),
+                "start_time" : experimentCfg.get_start_time(),
+                "end_time" : experimentCfg.get_end_time(),
+                "config" : experimentCfg,
+                "backend" : "HPC"
+            }
 
 
 
@@ -26,14 +26,59 @@ from __future__ import with_statement
 import sys
 import json
 import os
+import hashlib
+import threading
 from api.logger import getLogger, setLogLevel, muteSH
 
 
+# config keys that can be set as '__<key>__' placeholders, from env vars
+TEMPLATE_KEYS = [
+    'domain', 'host', 'user_name', 'ssh_port', 'ssh_key',
+    'grafana', 'grafana_dashbord_name', 'grafana_host', 'grafana_dashboard_url',
+    'path_qstat', 'path_qsub', 'path_vsub', 'path_vtorque_log',
+    'execution_dir', 'poll_time_qstat']
+
+# loaded configs, keyed by (path, mtime, size, env hash)
+_configs = {}
+_configs_lock = threading.Lock()
+
+
+def _get_cache_key(hpcConfigPath):
+    """Changes whenever the file or one of the template env vars does."""
+    path = os.path.abspath(hpcConfigPath)
+    stat = os.stat(path)
+    env = hashlib.sha1('\0'.join(
+        os.getenv(key, '') for key in TEMPLATE_KEYS).encode('utf-8'))
+    return (path, stat.st_mtime, stat.st_size, env.hexdigest())
+
+
+def load_hpc_config(hpcConfigPath):
+    """
+    Shared, parsed HPC back-end configuration of the given file.
+
+    The file is parsed once per process as long as neither the file nor
+    the template env vars change.
+    """
+    if hpcConfigPath is None or not os.path.isfile(hpcConfigPath):
+        # reports the error
+        return HPCBackendConfiguration(hpcConfigPath)
+    key = _get_cache_key(hpcConfigPath)
+    with _configs_lock:
+        hpcConfig = _configs.get(key)
+        if hpcConfig is None:
+            # drop outdated versions of this file
+            for old_key in [k for k in _configs if k[0] == key[0]]:
+                del _configs[old_key]
+            hpcConfig = HPCBackendConfiguration(hpcConfigPath)
+            _configs[key] = hpcConfig
+        return hpcConfig
+
+
 class HPCBackendConfiguration(object):
     """Connect to the hpc system."""
 
 
-    def __init__(self, hpcConfigPath):
+    def __init__(self, hpcConfigPath, config_dict=None):
         """
         Default values for the generator.
 
@@ -55,45 +100,16 @@ class HPCBackendConfiguration(object):
         """
         self.logger = getLogger(__name__)
         muteSH()
-        # ensure file exists
-        if hpcConfigPath is None or not os.path.isfile(hpcConfigPath):
-            self.logger.error(
-                'HPC back-end configuration \'{}\' is missing.'.format(hpcConfigPath)
-            )
-            sys.exit(1)
-
-        #
-        # replace placeholders with settings from env vars
-        #
-        varList = [
-            'domain', 'host', 'user_name', 'ssh_port', 'ssh_key',
-            'grafana', 'grafana_dashbord_name', 'grafana_host', 'grafana_dashboard_url',
-            'path_qstat', 'path_qsub', 'path_vsub', 'path_vtorque_log',
-            'execution_dir', 'poll_time_qstat']
-
-        # Read in the file
-        with open(hpcConfigPath, 'r') as file :
-            fileContent = file.read()
-
-        # Replace the target string
-        for key in varList:
-            value = os.getenv(key, '')
-            if not value:
-                self.logger.warning("Key '{}' not found in environment, aborting.".format(key))
-                sys.exit(1)
-            else:
-                self.logger.debug("Key '{}'='{}' found in environment.".format(key, value))
-            self.logger.debug(
-                "Replacing key '{}' in config template with value '{}'"
-                .format(key, value))
-            fileContent = fileContent.replace('__'+key+'__', value)
+        if config_dict is None:
+            config_dict = self._read_config_dict(hpcConfigPath)
+        self.config_dict = config_dict
+        # submission targets, each one overrides keys of this config
+        self.targets = []
+        if self.config_dict.get('targets'):
+            self._load_targets(hpcConfigPath)
+        self.target_name = self.config_dict.get(
+            'name', self.config_dict.get('host'))
 
-        # Write the file out again
-        with open(hpcConfigPath, 'w') as file:
-            file.write(fileContent)
-
-        # load JSON
-        self.config_dict = self._get_config_dict(hpcConfigPath)
         self.logger.debug('{}'.format(self.config_dict))
         try:
             self.host = self.config_dict['host']
@@ -102,11 +118,75 @@ class HPCBackendConfiguration(object):
             self.execution_dir = self.config_dict['execution_dir']
 
             self.poll_time_qstat = self.config_dict['poll_time_qstat']
+            # adaptive polling, optional
+            self.poll_time_min = self.config_dict.get('poll_time_min', 1)
+            self.poll_time_max = self.config_dict.get('poll_time_max', 60)
+            self.poll_backoff = self.config_dict.get('poll_backoff', 1.5)
+            self.poll_jitter = self.config_dict.get('poll_jitter', 0.1)
+            self.poll_fast_period = self.config_dict.get('poll_fast_period', 30)
+            # concurrency limits per submission host, optional
+            self.max_concurrent_transfers = self.config_dict.get(
+                'max_concurrent_transfers', 4)
+            self.max_jobs_in_flight = self.config_dict.get(
+                'max_jobs_in_flight', 100)
+            # incremental stage-in, optional
+            self.incremental_stage_in = self.config_dict.get(
+                'incremental_stage_in', True)
+            self.manifest_cache_dir = self.config_dict.get(
+                'manifest_cache_dir', '~/.cache/hpc-workload-gen/manifests')
+            # log retrieval, optional
+            self.log_compress = self.config_dict.get('log_compress', False)
+            self.log_tail_lines = self.config_dict.get('log_tail_lines', None)
+            self.live_log = self.config_dict.get('live_log', False)
+            # local dir for collected result artifacts, optional
+            self.results_dir = self.config_dict.get('results_dir', './results')
 
             self.path_qsub = self.config_dict['path_qsub']
             self.path_vsub = self.config_dict['path_vsub']
             self.path_qstat = self.config_dict['path_qstat']
             self.path_vtorque_log = self.config_dict['path_vtorque_log']
+            # format of the vTorque debug log, optional
+            self.vtorque_log_line = self.config_dict.get('vtorque_log_line', None)
+            self.vtorque_log_events = self.config_dict.get('vtorque_log_events', {})
+            # export of per-phase timings, optional
+            self.timings_jsonl = self.config_dict.get('timings_jsonl', None)
+            self.timings_prometheus = self.config_dict.get(
+                'timings_prometheus', None)
+            # journal of submitted jobs, optional, null disables it
+            self.journal_path = self.config_dict.get(
+                'journal_path', '~/.cache/hpc-workload-gen/journal.sqlite')
+            # reattach to the journaled jobs of dead runs, opt-in
+            self.journal_reattach = self.config_dict.get('journal_reattach', False)
+            # memoization of results, optional
+            self.result_cache = self.config_dict.get('result_cache', False)
+            self.result_cache_dir = self.config_dict.get(
+                'result_cache_dir', '~/.cache/hpc-workload-gen/results')
+            self.result_cache_ttl = self.config_dict.get(
+                'result_cache_ttl', 7 * 24 * 3600)
+            self.result_cache_max_bytes = self.config_dict.get(
+                'result_cache_max_bytes', 1024 ** 3)
+            # batch system, optional
+            self.scheduler = self.config_dict.get('scheduler', 'torque')
+            self.path_qdel = self.config_dict.get(
+                'path_qdel',
+                os.path.join(os.path.dirname(self.path_qstat), 'qdel'))
+            self.path_sbatch = self.config_dict.get('path_sbatch', 'sbatch')
+            self.path_sacct = self.config_dict.get('path_sacct', 'sacct')
+            self.path_scancel = self.config_dict.get('path_scancel', 'scancel')
+            # job packing of small workloads, optional
+            self.pack_max_workloads = self.config_dict.get(
+                'pack_max_workloads', 16)
+            self.pack_parallel = self.config_dict.get('pack_parallel', False)
+            # selection of submission targets, optional
+            self.target_load_max_age = self.config_dict.get(
+                'target_load_max_age', 30)
+            self.path_squeue = self.config_dict.get('path_squeue', 'squeue')
+            # planning of workloads with alternatives, optional
+            self.path_showstart = self.config_dict.get('path_showstart', None)
+            self.planner_queued_job_time = self.config_dict.get(
+                'planner_queued_job_time', 60)
+            # cancel outstanding jobs on failure and exit, optional
+            self.cancel_on_exit = self.config_dict.get('cancel_on_exit', True)
 
             self.grafana = self.config_dict['grafana']
             self.grafana_host = self.config_dict['grafana_host']
@@ -115,7 +195,7 @@ class HPCBackendConfiguration(object):
             #self.grafana_base_string = str(self.config_dict['grafana_dashbord_url']).format(
             #    self.grafana_host, self.grafana_dashbord_name)
 
-        except Error as e:
+        except KeyError as e:
             self.logger.warning(
                 '\nConfig file \'{}\' parsing failed, error msg: \'{}\''.format(
                     hpcConfigPath, str(e)))
@@ -129,19 +209,64 @@ class HPCBackendConfiguration(object):
         )
 
 
-    def _get_config_dict(self, path):
+    def _read_config_dict(self, hpcConfigPath):
+        """Parse the file, with placeholders replaced by env vars."""
+        # ensure file exists
+        if hpcConfigPath is None or not os.path.isfile(hpcConfigPath):
+            self.logger.error(
+                'HPC back-end configuration \'{}\' is missing.'.format(hpcConfigPath)
+            )
+            sys.exit(1)
+
+        # Read in the file
+        with open(hpcConfigPath, 'r') as file :
+            fileContent = file.read()
+
+        #
+        # replace placeholders with settings from env vars, in memory only,
+        # the template is never written back
+        #
+        for key in TEMPLATE_KEYS:
+            placeholder = '__' + key + '__'
+            if placeholder not in fileContent:
+                continue
+            value = os.getenv(key, '')
+            if not value:
+                self.logger.warning("Key '{}' not found in environment, aborting.".format(key))
+                sys.exit(1)
+            else:
+                self.logger.debug("Key '{}'='{}' found in environment.".format(key, value))
+            self.logger.debug(
+                "Replacing key '{}' in config template with value '{}'"
+                .format(key, value))
+            fileContent = fileContent.replace(placeholder, value)
+
+        # load JSON
+        return self._get_config_dict(hpcConfigPath, fileContent)
+
+
+    def _load_targets(self, hpcConfigPath):
+        """One config per target, the first one's values stand for all."""
+        shared = dict((key, value) for (key, value) in self.config_dict.items()
+                      if key != 'targets')
+        for target in self.config_dict['targets']:
+            target_dict = dict(shared)
+            target_dict.update(target)
+            self.targets.append(
+                HPCBackendConfiguration(hpcConfigPath, target_dict))
+        names = [target.target_name for target in self.targets]
+        if len(set(names)) != len(names):
+            self.logger.error(
+                "Target names (or hosts) in '{}' are not unique: {}".format(
+                    hpcConfigPath, ', '.join(names)))
+            sys.exit(1)
+        self.config_dict = dict(self.targets[0].config_dict,
+                                targets=self.config_dict['targets'])
+
+
+    def _get_config_dict(self, path, content):
         try:
-            with open(path, 'r') as data_file:
-                config_dict = json.load(data_file)
-        except (IOError):
-            # file not found
-            self.logger.info('No HPC backend configuration found!')
-            config_dict = self._get_default_dict()
-            with open(path, 'w') as data_file:
-                json.dump(
-                    config_dict, data_file, sort_keys=True, indent=4)
-            self.logger.info('New HPC backend configuration file \'{}\' created.\nPlease edit it and re-run.'.format(path))
-            sys.exit(1);
+            config_dict = json.loads(content)
         except (ValueError) as e:
             # display json errors
             self.logger.error(
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Cancellation of the outstanding jobs of this process"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import atexit
+import signal
+import threading
+
+from sh import ErrorReturnCode
+
+from api.logger import getLogger
+
+
+# signals that end the process after cancelling its jobs
+EXIT_SIGNALS = tuple(getattr(signal, name) for name in ('SIGTERM', 'SIGHUP')
+                     if hasattr(signal, name))
+
+# seconds a signal handler waits for the jobs to be cancelled
+SIGNAL_CANCEL_TIMEOUT = 30
+
+# submitted, unfinished jobs, the back-end of each keyed by its experiment
+_outstanding = {}
+_lock = threading.Lock()
+# 'atexit' and 'signals' once installed
+_installed = set()
+
+
+class SignalExit(SystemExit):
+    """
+    Raised by the signal handlers, ends the process even where sys.exit()
+    on errors only fails one workload.
+    """
+
+
+def register(backend, experiment):
+    """Track the experiment's job until it finished or was cancelled."""
+    with _lock:
+        _outstanding[experiment] = backend
+
+
+def unregister(experiment):
+    with _lock:
+        _outstanding.pop(experiment, None)
+
+
+def is_outstanding(experiment):
+    with _lock:
+        return experiment in _outstanding
+
+
+def cancel_outstanding(reason='generator exits'):
+    """
+    Cancel all outstanding jobs of this process, with one cancel command
+    per batch system. Returns the number of cancelled jobs.
+    """
+    logger = getLogger(__name__)
+    with _lock:
+        outstanding = list(_outstanding.items())
+    groups = {}
+    for experiment, backend in outstanding:
+        key = backend.scheduler.get_poll_key()
+        groups.setdefault(key, (backend, []))[1].append(experiment)
+    for backend, experiments in groups.values():
+        poll_ids = [backend._get_poll_id(experiment) for experiment in experiments]
+        logger.warning('Cancelling {} outstanding job(s), {}: {}'.format(
+            len(poll_ids), reason, ', '.join(poll_ids)))
+        try:
+            backend.scheduler.cancel(poll_ids)
+        except ErrorReturnCode as e:
+            logger.warning('Cancelling failed:\n{}'.format(e.stderr))
+        # only now, jobs left by an interrupted call are cancelled at exit
+        with _lock:
+            for experiment in experiments:
+                _outstanding.pop(experiment, None)
+        for experiment, poll_id in zip(experiments, poll_ids):
+            experiment.set_cancel_reason(reason)
+            backend.poller.untrack(poll_id)
+            if backend.journal:
+                # a cancelled job is not reattached to
+                backend.journal.record_finished(
+                    backend._get_journal_key(experiment))
+    return len(outstanding)
+
+
+def _on_signal(signum, frame, previous):
+    # the interrupted main thread may hold locks the cancellation needs,
+    # e.g. the poller's, thus it runs in a thread of its own; what it did
+    # not cancel is cancelled at exit, after these locks were released
+    canceller = threading.Thread(target=cancel_outstanding,
+                                 args=('signal {}'.format(signum),),
+                                 name='job-cleanup')
+    canceller.daemon = True
+    canceller.start()
+    canceller.join(SIGNAL_CANCEL_TIMEOUT)
+    if callable(previous):
+        previous(signum, frame)
+    else:
+        raise SignalExit(128 + signum)
+
+
+def install_handlers():
+    """
+    Cancel the outstanding jobs at exit and on SIGTERM or SIGHUP, once per
+    process. Signal handlers can only be installed by the main thread,
+    handlers set by the host application are called afterwards, ignored
+    signals stay ignored.
+    """
+    with _lock:
+        if 'atexit' not in _installed:
+            _installed.add('atexit')
+            atexit.register(cancel_outstanding)
+        if 'signals' in _installed:
+            return
+        for signum in EXIT_SIGNALS:
+            previous = signal.getsignal(signum)
+            if previous == signal.SIG_IGN:
+                continue
+            try:
+                signal.signal(signum, lambda signum, frame, previous=previous:
+                              _on_signal(signum, frame, previous))
+            except ValueError:
+                # not the main thread, tried again on the next call
+                return
+        _installed.add('signals')
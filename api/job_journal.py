@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Durable journal of submitted jobs"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import json
+import errno
+import socket
+import sqlite3
+import hashlib
+import threading
+
+from time import time
+
+from api.logger import getLogger
+from api.stage_manifest import build_manifest
+
+
+# seconds to wait for a concurrent writer's lock
+BUSY_TIMEOUT = 30
+
+_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS jobs (
+        workload_key TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        sweep_id TEXT,
+        host TEXT,
+        job_id TEXT,
+        state TEXT,
+        stage_in_time REAL,
+        submit_time INTEGER,
+        updated REAL NOT NULL,
+        finished INTEGER NOT NULL DEFAULT 0,
+        owner_host TEXT,
+        owner_pid INTEGER)''',
+    'CREATE INDEX IF NOT EXISTS jobs_job_id ON jobs (job_id)',
+    'CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished, updated)'
+]
+
+_COLUMNS = ('workload_key', 'name', 'sweep_id', 'host', 'job_id', 'state',
+            'stage_in_time', 'submit_time', 'updated', 'finished',
+            'owner_host', 'owner_pid')
+
+# added after the first release, missing in older journals
+_OWNER_COLUMNS = (('owner_host', 'TEXT'), ('owner_pid', 'INTEGER'))
+
+# all journals of this process, keyed by path
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def _get_content(path, manifest_cache_dir):
+    """Content hashes of the files at path, None if there is no path."""
+    if path is None:
+        return None
+    manifest = build_manifest(path, manifest_cache_dir)
+    return dict((rel_path, entry['sha1'])
+                for (rel_path, entry) in manifest.items())
+
+
+def get_workload_key(experiment, host, manifest_cache_dir):
+    """
+    Identity of a workload, equal across runs of the same definition with
+    unchanged job script and input data.
+    """
+    identity = [
+        host,
+        experiment.get_name(),
+        experiment.get_sweep_id(),
+        experiment.get_job_script(),
+        experiment.get_input_data(),
+        experiment.get_declared_qsub_args(),
+        experiment.get_vsub_args(),
+        experiment.get_array_request(),
+        _get_content(experiment.get_job_script(), manifest_cache_dir),
+        _get_content(experiment.get_input_data(), manifest_cache_dir)
+    ]
+    if experiment.get_alternatives():
+        # whichever alternative was planned
+        identity.append(experiment.get_alternatives())
+    return hashlib.sha1(
+        json.dumps(identity, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class JobJournal(object):
+    """
+    SQLite journal of the jobs of all workloads, one row per workload.
+
+    A restarted generator finds the unfinished row of a workload and
+    reattaches to its job instead of submitting it again. Each row is
+    owned by the process that staged the workload, only the owner updates
+    it and a row is only taken over once its owner has died. The journal
+    is shared by threads (one connection each) and processes (WAL mode).
+    """
+
+    def __init__(self, path):
+        """Initialize the journal, creates the database if needed."""
+        self.logger = getLogger(__name__)
+        self.path = os.path.expanduser(path)
+        journal_dir = os.path.dirname(self.path)
+        if journal_dir and not os.path.isdir(journal_dir):
+            os.makedirs(journal_dir)
+        self._local = threading.local()
+        connection = self._connect()
+        connection.execute('PRAGMA journal_mode=WAL')
+        with connection:
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            columns = [row[1] for row in
+                       connection.execute('PRAGMA table_info(jobs)')]
+            for column, column_type in _OWNER_COLUMNS:
+                if column not in columns:
+                    connection.execute('ALTER TABLE jobs ADD COLUMN {} {}'.format(
+                        column, column_type))
+        self.owner = (socket.gethostname(), os.getpid())
+
+
+    def _connect(self):
+        """Connection of the calling thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+
+    def _execute(self, statement, args):
+        """Run a modifying statement, returns the number of changed rows."""
+        connection = self._connect()
+        with connection:
+            return connection.execute(statement, args).rowcount
+
+
+    def _get_owner(self):
+        # the pid changes in forked children
+        if self.owner[1] != os.getpid():
+            self.owner = (self.owner[0], os.getpid())
+        return self.owner
+
+
+    def is_owner_alive(self, entry):
+        """
+        Whether the process owning the row may still run its job. Owners
+        on other hosts cannot be checked and count as alive.
+        """
+        if entry['owner_pid'] is None:
+            # written before owners were recorded
+            return False
+        if entry['owner_host'] != self._get_owner()[0]:
+            return True
+        try:
+            os.kill(entry['owner_pid'], 0)
+        except OSError as e:
+            return e.errno == errno.EPERM
+        return True
+
+
+    def claim(self, entry):
+        """
+        Take over the unfinished row of a dead owner. False if the owner is
+        alive or another process took the row over first.
+        """
+        if self.is_owner_alive(entry):
+            return False
+        host, pid = self._get_owner()
+        return self._execute(
+            'UPDATE jobs SET owner_host = ?, owner_pid = ?, updated = ? '
+            'WHERE workload_key = ? AND finished = 0 AND '
+            'owner_host IS ? AND owner_pid IS ?',
+            (host, pid, time(), entry['workload_key'],
+             entry['owner_host'], entry['owner_pid'])) == 1
+
+
+    def get_unfinished(self, workload_key):
+        """Row of the workload's last unfinished run, None if there is none."""
+        row = self._connect().execute(
+            'SELECT {} FROM jobs WHERE workload_key = ? AND finished = 0'.format(
+                ', '.join(_COLUMNS)), (workload_key,)).fetchone()
+        return None if row is None else dict(zip(_COLUMNS, row))
+
+
+    def get_in_flight(self):
+        """All unfinished rows with a submitted job."""
+        rows = self._connect().execute(
+            'SELECT {} FROM jobs WHERE finished = 0 AND job_id IS NOT NULL '
+            'ORDER BY updated'.format(', '.join(_COLUMNS)))
+        return [dict(zip(_COLUMNS, row)) for row in rows]
+
+
+    def record_stage_in(self, workload_key, experiment, host):
+        """Start of a new run, the input data has been staged."""
+        host_name, pid = self._get_owner()
+        self._execute(
+            'INSERT OR REPLACE INTO jobs (workload_key, name, sweep_id, host, '
+            'stage_in_time, updated, finished, owner_host, owner_pid) '
+            'VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)',
+            (workload_key, experiment.get_name(), experiment.get_sweep_id(),
+             host, time(), time(), host_name, pid))
+
+
+    def _update(self, workload_key, assignments, args):
+        """Update the row of the workload if this process owns it."""
+        host, pid = self._get_owner()
+        self._execute(
+            'UPDATE jobs SET {}, updated = ? WHERE workload_key = ? AND '
+            'owner_host = ? AND owner_pid = ?'.format(assignments),
+            tuple(args) + (time(), workload_key, host, pid))
+
+
+    def record_submit(self, workload_key, job_id, submit_time):
+        self._update(workload_key, 'job_id = ?, submit_time = ?',
+                     (job_id, submit_time))
+
+
+    def record_state(self, workload_key, state):
+        self._update(workload_key, 'state = ?', (state,))
+
+
+    def record_finished(self, workload_key):
+        """Results are collected, the next run submits a new job."""
+        self._update(workload_key, 'finished = 1', ())
+
+
+def get_journal(hpcConfig):
+    """Process-wide journal of the config, None if disabled."""
+    if not hpcConfig.journal_path:
+        return None
+    path = os.path.abspath(os.path.expanduser(hpcConfig.journal_path))
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = JobJournal(path)
+        return _journals[path]
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Open-loop load generation at a target submission rate"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import sys
+import json
+import random
+import threading
+
+from time import sleep
+from sh import ErrorReturnCode
+
+from api.logger import getLogger
+from api.experiment_config import ExperimentConfig
+from api.hpc_backend import HPCBackend
+from api.poll_strategy import AdaptivePolling
+from api.phase_timer import monotonic, get_distribution
+from api.job_cleanup import unregister
+
+
+# supported arrival processes
+ARRIVAL_MODES = ('constant', 'poisson', 'burst')
+
+
+class LoadWorkload(object):
+    """Workload definition of one generated job, as scotty would pass it."""
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+
+
+def is_load(workloadDef):
+    return 'load' in workloadDef.params
+
+
+def iter_arrivals(mode, rate, burst_size=10, seed=None):
+    """Endless arrival times in seconds from the start, 'rate' jobs/s on average."""
+    rand = random.Random(seed)
+    arrival = 0.0
+    while True:
+        if mode == 'constant':
+            yield arrival
+            arrival += 1.0 / rate
+        elif mode == 'poisson':
+            yield arrival
+            arrival += rand.expovariate(rate)
+        else:
+            for _ in range(burst_size):
+                yield arrival
+            arrival += burst_size / float(rate)
+
+
+class LoadGenerator(object):
+    """
+    Submits jobs of a workload template at a target rate, independent of
+    their completion, for a fixed duration or number of jobs.
+
+    Jobs are submitted with HPCBackend._submit_job by up to 'submitters'
+    threads and tracked by one thread with the shared, batched poller.
+    The distributions of submit latency, queue wait and turnaround are
+    returned, results of the jobs are not collected.
+    """
+
+    def __init__(self, workloadDef):
+        """Initialize the generator of the workload's load definition."""
+        self.logger = getLogger(__name__)
+        self.workloadDef = workloadDef
+        self.loadCfg = workloadDef.params['load']
+        self.mode = self.loadCfg.get('arrival', 'constant')
+        if self.mode not in ARRIVAL_MODES:
+            self.logger.error("Unknown arrival mode '{}', expected one of {}.".format(
+                self.mode, ', '.join(ARRIVAL_MODES)))
+            sys.exit(1)
+        self.rate = float(self.loadCfg.get('rate', 1.0))
+        self.duration = self.loadCfg.get('duration')
+        self.max_jobs = self.loadCfg.get('jobs')
+        if self.rate <= 0 or (self.duration is None and self.max_jobs is None):
+            self.logger.error("Load needs a positive 'rate' and a 'duration' "
+                              "or a number of 'jobs'.")
+            sys.exit(1)
+        # wait for the submitted jobs, or cancel them at the end
+        self.drain = self.loadCfg.get('drain', True)
+        self._submitters = threading.BoundedSemaphore(
+            int(self.loadCfg.get('submitters', 4)))
+        self._lock = threading.Lock()
+        self._pending = []
+        self._submitting = True
+        # why tracking failed, the statistics are incomplete then
+        self.tracking_error = None
+        self.latencies = {
+            'submit_latency': [],
+            'queue_wait': [],
+            'turnaround': []
+        }
+        self.counts = {
+            'submitted': 0,
+            'submit_errors': 0,
+            'completed': 0,
+            'failed': 0,
+            'cancelled': 0
+        }
+
+
+    def _get_params(self):
+        return dict((key, value) for (key, value)
+                    in self.workloadDef.params.items() if key != 'load')
+
+
+    def run(self):
+        """Generate the load, returns the measured distributions."""
+        params = self._get_params()
+        template = ExperimentConfig(
+            LoadWorkload(self.workloadDef.name, params))
+        # all jobs go to the target selected for the template
+        hpcConfig = template.getHPCConfig()
+        self.backend = HPCBackend(hpcConfig)
+        # job script and input data are shared by all jobs
+        self.backend._stage_in_data(template)
+        self.backend._release_target(template)
+
+        tracker = threading.Thread(target=self._track, name='load-tracker')
+        tracker.daemon = True
+        tracker.start()
+
+        threads = []
+        start = monotonic()
+        arrivals = iter_arrivals(self.mode, self.rate,
+                                 int(self.loadCfg.get('burst_size', 10)),
+                                 self.loadCfg.get('seed'))
+        for number, arrival in enumerate(arrivals):
+            if self.max_jobs is not None and number >= self.max_jobs:
+                break
+            if self.duration is not None and arrival >= self.duration:
+                break
+            if self.tracking_error is not None:
+                break
+            delay = start + arrival - monotonic()
+            if delay > 0:
+                sleep(delay)
+            experimentCfg = ExperimentConfig(
+                LoadWorkload('{}-{}'.format(self.workloadDef.name, number),
+                             params), hpcConfig=hpcConfig)
+            self._submitters.acquire()
+            thread = threading.Thread(target=self._submit, args=(experimentCfg,),
+                                      name='load-submit-{}'.format(number))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+            threads = [thread for thread in threads if thread.is_alive()]
+        for thread in threads:
+            thread.join()
+        submit_time = monotonic() - start
+        self._submitting = False
+        if not self.drain:
+            self._cancel_pending()
+        tracker.join()
+        if self.tracking_error is not None:
+            # nobody waits for them anymore
+            self._cancel_pending()
+
+        result = dict(self.counts)
+        result.update({
+            'complete': self.tracking_error is None,
+            'error': None if self.tracking_error is None else '{}: {}'.format(
+                type(self.tracking_error).__name__, self.tracking_error),
+            'arrival': self.mode,
+            'target_rate': self.rate,
+            'achieved_rate': self.counts['submitted'] / submit_time
+            if submit_time > 0 else None,
+            'duration': monotonic() - start
+        })
+        for name, values in self.latencies.items():
+            result[name] = get_distribution(values)
+        self.logger.info('Load generated: {}'.format(
+            json.dumps(result, sort_keys=True)))
+        return result
+
+
+    def _submit(self, experimentCfg):
+        """Thread body, submits one job."""
+        timer = experimentCfg.get_phase_timer()
+        try:
+            with timer.phase('submit'):
+                self.backend._submit_job(experimentCfg)
+            timer.start('wait')
+            with self._lock:
+                self.counts['submitted'] += 1
+                self.latencies['submit_latency'].append(timer.durations['submit'])
+                self._pending.append(experimentCfg)
+        except (Exception, SystemExit) as e:
+            # sys.exit() in a thread only ends this submission
+            self.logger.error("Submitting '{}' failed: {}".format(
+                experimentCfg.get_name(), e))
+            with self._lock:
+                self.counts['submit_errors'] += 1
+        finally:
+            self._submitters.release()
+
+
+    def _track(self):
+        """Thread body, polls all submitted jobs until they finished."""
+        try:
+            self._track_jobs()
+        except (Exception, SystemExit) as e:
+            # sys.exit() on SSH errors, ends the load generation
+            self.logger.error('Tracking the submitted jobs failed, the '
+                              'statistics are incomplete: {}: {}'.format(
+                                  type(e).__name__, e))
+            self.tracking_error = e
+
+
+    def _track_jobs(self):
+        polling = AdaptivePolling(self.backend.hpcConfig, None)
+        job_state = None
+        while True:
+            with self._lock:
+                if not self._pending and not self._submitting:
+                    return
+                pending = list(self._pending)
+            sleep(polling.next_interval(job_state))
+            states = set()
+            for experimentCfg in pending:
+                job_state = self.backend._get_job_state(experimentCfg)
+                states.add(job_state)
+                if self.backend._is_job_running(experimentCfg, job_state):
+                    continue
+                self._finish(experimentCfg)
+            # poll at the pace of the most active job
+            job_state = 'R' if 'R' in states else 'Q'
+
+
+    def _finish(self, experimentCfg):
+        with self._lock:
+            if experimentCfg not in self._pending:
+                # cancelled meanwhile
+                return
+            self._pending.remove(experimentCfg)
+        timer = experimentCfg.get_phase_timer()
+        timer.stop('wait')
+        self.backend._finish_job(experimentCfg)
+        timings = timer.get_timings()
+        with self._lock:
+            self.latencies['queue_wait'].append(timings['queue_wait'])
+            self.latencies['turnaround'].append(
+                timings['submit'] + timings['queue_wait'] + timings['execution'])
+            if experimentCfg.get_cancel_reason() is not None:
+                # on hold, or past its deadline or max queue wait
+                self.counts['cancelled'] += 1
+            elif experimentCfg.get_exit_status() in (0, None):
+                self.counts['completed'] += 1
+            else:
+                self.counts['failed'] += 1
+
+
+    def _cancel_pending(self):
+        """Cancel all unfinished jobs at once."""
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        if not pending:
+            return
+        poll_ids = [self.backend._get_poll_id(experimentCfg)
+                    for experimentCfg in pending]
+        self.logger.info('Cancelling {} unfinished job(s).'.format(len(pending)))
+        try:
+            self.backend.scheduler.cancel(poll_ids)
+        except ErrorReturnCode as e:
+            self.logger.warning('Cancelling failed:\n{}'.format(e.stderr))
+        for experimentCfg, poll_id in zip(pending, poll_ids):
+            experimentCfg.set_cancel_reason('load generation ended')
+            unregister(experimentCfg)
+            self.backend.poller.untrack(poll_id)
+        self.counts['cancelled'] += len(pending)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Streaming, bounded-memory retrieval of remote log files"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import zlib
+import threading
+
+from api.logger import getLogger
+
+
+# bytes read from the ssh pipe at once, also the decompression limit
+CHUNK_SIZE = 64 * 1024
+
+
+class _ChunkWriter(object):
+    """
+    File-like sink for sh's '_out', forwards raw chunks to 'out' and
+    inflates them on the fly if the remote side compressed the stream.
+    """
+
+    def __init__(self, out, compressed, chunk_size):
+        self.out = out
+        self.chunk_size = chunk_size
+        self.decompressor = None
+        if compressed:
+            # gzip header and trailer
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.bytes_received = 0
+        self.bytes_written = 0
+
+
+    def _emit(self, data):
+        if data:
+            self.out.write(data)
+            self.bytes_written += len(data)
+
+
+    def write(self, chunk):
+        if not isinstance(chunk, bytes):
+            chunk = chunk.encode('utf-8')
+        self.bytes_received += len(chunk)
+        if self.decompressor is None:
+            self._emit(chunk)
+            return
+        # never inflate more than one chunk at once
+        data = self.decompressor.decompress(chunk, self.chunk_size)
+        while data:
+            self._emit(data)
+            data = self.decompressor.decompress(
+                self.decompressor.unconsumed_tail, self.chunk_size)
+
+
+    def finish(self):
+        if self.decompressor is not None:
+            self._emit(self.decompressor.flush())
+
+
+class LogFetcher(object):
+    """
+    Streams remote files over the SSH channel in fixed size chunks.
+
+    Supports whole files, byte ranges, the last N lines and live tailing,
+    i.e. repeated fetches continuing at the offset the last one ended.
+    """
+
+    def __init__(self, channel, chunk_size=CHUNK_SIZE, compress=False):
+        """Initialize the fetcher."""
+        self.logger = getLogger(__name__)
+        self.channel = channel
+        self.chunk_size = chunk_size
+        self.compress = compress
+        # offsets for live tailing, keyed by remote path
+        self.offsets = {}
+        self._lock = threading.Lock()
+
+
+    def _remote_cmd(self, log_path, offset=0, length=None, tail_lines=None,
+                    compress=False):
+        """Shell command producing the requested part of the file."""
+        if tail_lines is not None:
+            cmd = 'tail -n {} {}'.format(int(tail_lines), log_path)
+        elif offset:
+            cmd = 'tail -c +{} {}'.format(int(offset) + 1, log_path)
+        else:
+            cmd = 'cat {}'.format(log_path)
+        if length is not None:
+            cmd += ' | head -c {}'.format(int(length))
+        if compress:
+            cmd += ' | gzip -c'
+        return cmd
+
+
+    def fetch(self, log_path, out, offset=0, length=None, tail_lines=None,
+              compress=None):
+        """
+        Stream (part of) the remote file into the binary file-like 'out',
+        returns the number of uncompressed bytes written.
+        """
+        if compress is None:
+            compress = self.compress
+        writer = _ChunkWriter(out, compress, self.chunk_size)
+        cmd = self._remote_cmd(log_path, offset, length, tail_lines, compress)
+        self.logger.debug("Streaming remote log with '{}'".format(cmd))
+        # binary data, thus no pseudo terminal
+        self.channel(cmd, _out=writer, _out_bufsize=self.chunk_size,
+                     _no_out=True, _tty_out=False)
+        writer.finish()
+        self.logger.debug("Received {} byte(s), {} byte(s) uncompressed".format(
+            writer.bytes_received, writer.bytes_written))
+        return writer.bytes_written
+
+
+    def fetch_new(self, log_path, out):
+        """
+        Stream what was appended to the remote file since the last call,
+        used for live tailing of running jobs.
+        """
+        with self._lock:
+            offset = self.offsets.get(log_path, 0)
+        written = self.fetch(log_path, out, offset=offset)
+        with self._lock:
+            self.offsets[log_path] = offset + written
+        return written
@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Packing of small workloads into one job"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import posixpath
+
+from copy import copy
+from sh import ErrorReturnCode
+
+from api.logger import getLogger
+from api.experiment_config import ExperimentConfig
+from api.hpc_backend import HPCBackend
+from api.executor import WorkloadExecutor
+from api.phase_timer import export_timings
+from api.target_selector import release_target
+
+
+# name prefix of the wrapper job script and its output dir
+PACK_PREFIX = 'hpcwg_pack_'
+
+_WRAPPER_HEAD = '''#!/bin/bash
+{directives}# Packed job of the HPC workload generator, runs {count} workload(s).
+job_dir="${{PBS_O_WORKDIR:-$PWD}}"
+pack_dir="$job_dir/{pack_name}"
+mkdir -p "$pack_dir"
+
+run_workload() {{
+    # run by its own interpreter line, like a job of its own
+    chmod +x "$job_dir/$2"
+    "$job_dir/$2" > "$pack_dir/$1.o" 2> "$pack_dir/$1.e"
+    echo $? > "$pack_dir/$1.rc"
+}}
+
+'''
+
+
+class _PackWorkload(object):
+    """Workload definition of a packed job, as provided by scotty."""
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+
+
+def get_pbs_directives(job_script):
+    """
+    The '#PBS' directives of a local job script, in order. Like qsub, the
+    directives end at the first line that is neither blank nor a comment.
+    """
+    directives = []
+    with open(job_script, 'r') as script_file:
+        for line in script_file:
+            line = line.strip()
+            if line.startswith('#PBS'):
+                directives.append(' '.join(line.split()))
+            elif line and not line.startswith('#'):
+                break
+    return tuple(directives)
+
+
+def get_pack_groups(experiments):
+    """
+    Indices of the experiments packed into one job each, and of the ones
+    run alone. Packable experiments share a job if they share the HPC
+    back-end config, the qsub args and the '#PBS' directives of their job
+    script, which become the packed job's, but not the name of their job
+    script, all job scripts of a pack are staged into the same dir.
+    """
+    logger = getLogger(__name__)
+    groups = []
+    keys = {}
+    singles = []
+    for index, experiment in enumerate(experiments):
+        if not experiment.is_packable():
+            singles.append(index)
+            continue
+        try:
+            directives = get_pbs_directives(experiment.get_job_script())
+        except (IOError, OSError) as e:
+            logger.warning("Not packing workload '{}': {}".format(
+                experiment.get_name(), e))
+            singles.append(index)
+            continue
+        key = (id(experiment.getHPCConfig()), experiment.get_qsub_args(),
+               directives)
+        script = os.path.basename(experiment.get_job_script())
+        max_workloads = experiment.getHPCConfig().pack_max_workloads
+        for group, scripts in keys.setdefault(key, []):
+            if len(group) < max_workloads and script not in scripts:
+                break
+        else:
+            group, scripts = [], set()
+            keys[key].append((group, scripts))
+            groups.append(group)
+        group.append(index)
+        scripts.add(script)
+    # nothing to share a job with
+    for group in [group for group in groups if len(group) < 2]:
+        groups.remove(group)
+        singles.extend(group)
+    return groups, sorted(singles)
+
+
+class PackBackend(HPCBackend):
+    """
+    Runs several workloads as one job, a generated wrapper job script
+    running their job scripts one after the other or all at once.
+
+    The stdout, stderr and exit status of each job script are collected
+    per workload, thus the result of each one looks like it ran alone,
+    except for the job ID and the resource usage which are the packed
+    job's.
+    """
+
+    def __init__(self, hpcCfg, members, channel=None):
+        """Initialize the back-end, writes the wrapper job script."""
+        HPCBackend.__init__(self, hpcCfg, channel)
+        self.members = members
+        # the wrapper does not show the content of the packed job scripts
+        self.result_cache = None
+        # same for all members, see get_pack_groups()
+        self.directives = get_pbs_directives(members[0].get_job_script())
+        identity = [hpcCfg.pack_parallel, members[0].get_qsub_args(),
+                    list(self.directives)] + [
+            [member.get_name(), member.get_job_script()] for member in members]
+        self.pack_name = PACK_PREFIX + hashlib.sha1(
+            json.dumps(identity).encode('utf-8')).hexdigest()[:12]
+        self.pack_dir = posixpath.join(
+            self.hpcConfig.get_value('execution_dir'), self.pack_name)
+        params = {'job_script': self._write_wrapper()}
+        if members[0].get_qsub_args() is not None:
+            params['qsub_args'] = members[0].get_qsub_args()
+        self.experiment = ExperimentConfig(
+            _PackWorkload(self.pack_name, params), hpcCfg)
+
+
+    def _write_wrapper(self):
+        """Local path of the wrapper job script, same for the same members."""
+        script = _WRAPPER_HEAD.format(
+            directives=''.join(line + '\n' for line in self.directives),
+            count=len(self.members), pack_name=self.pack_name)
+        for index, member in enumerate(self.members):
+            script += "run_workload {} '{}'{}\n".format(
+                index, os.path.basename(member.get_job_script()),
+                ' &' if self.hpcConfig.pack_parallel else '')
+        script += 'wait\n'
+        # a stable path, a restarted run reattaches to the packed job
+        path = os.path.join(tempfile.gettempdir(), self.pack_name + '.sh')
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as script_file:
+            script_file.write(script)
+        os.rename(tmp_path, path)
+        return path
+
+
+    def _stage_in_data(self, experimentCfg):
+        """Stage the members' input data and job scripts, then the wrapper."""
+        for member in self.members:
+            HPCBackend._stage_in_data(self, member)
+        HPCBackend._stage_in_data(self, experimentCfg)
+
+
+    def _release_target(self, experiment):
+        """Count the members as finished, the wrapper has no target of its own."""
+        for member in self.members:
+            release_target(member)
+
+
+    def _collect_output(self, experimentCfg):
+        """Collect the packed job's logs and split the members' out of it."""
+        HPCBackend._collect_output(self, experimentCfg)
+        artifacts = {}
+        for index in range(len(self.members)):
+            for suffix in ('o', 'e', 'rc'):
+                name = '{}.{}'.format(index, suffix)
+                artifacts[name] = posixpath.join(self.pack_dir, name)
+        try:
+            result_files = self.collector.collect(experimentCfg, artifacts)
+        except ErrorReturnCode as e:
+            self.logger.error('Collecting packed results failed:\n{}'.format(
+                e.stderr))
+            raise e
+        for index, member in enumerate(self.members):
+            self._split_member(experimentCfg, index, member, result_files)
+        try:
+            self.ssh_conn('rm', '-rf', self.pack_dir)
+        except ErrorReturnCode as e:
+            self.logger.warning("Removing '{}' failed:\n{}".format(
+                self.pack_dir, e.stderr))
+
+
+    def _split_member(self, experimentCfg, index, member, result_files):
+        """Apply the packed job's metadata and the member's own output."""
+        member.set_start_time(experimentCfg.get_start_time())
+        member.set_job_id(experimentCfg.get_job_id())
+        member.set_end_time(experimentCfg.get_end_time())
+        member.set_phase_timer(experimentCfg.get_phase_timer())
+        job_dir = self.collector.get_job_dir(member)
+        if not os.path.isdir(job_dir):
+            os.makedirs(job_dir)
+        member_files = {}
+        for name, suffix in (('stdout', 'o'), ('stderr', 'e')):
+            local_path = result_files.get('{}.{}'.format(index, suffix))
+            if local_path is not None:
+                member_files[name] = os.path.join(job_dir, name)
+                shutil.move(local_path, member_files[name])
+        member.set_result_files(member_files)
+
+        exit_status = None
+        rc_path = result_files.get('{}.rc'.format(index))
+        if rc_path is not None:
+            with open(rc_path, 'r') as rc_file:
+                try:
+                    exit_status = int(rc_file.read().strip())
+                except ValueError:
+                    pass
+            os.remove(rc_path)
+        job_record = experimentCfg.get_job_record()
+        if job_record is not None:
+            job_record = copy(job_record)
+            job_record.resources_used = dict(job_record.resources_used)
+            job_record.exit_status = exit_status
+            member.set_job_record(job_record)
+            member.set_job_state(job_record.state)
+        self.logger.info(
+            "Workload '{}' of packed job '{}' finished with exit status "
+            "{}.".format(member.get_name(), experimentCfg.get_job_id(),
+                         exit_status))
+
+
+class PackExecutor(object):
+    """
+    Runs many workloads concurrently like the WorkloadExecutor, but packs
+    the packable ones into as few jobs as possible, saving the submission
+    and scheduling latency of each one.
+    """
+
+    def __init__(self, max_workers=100):
+        """Initialize the executor."""
+        self.logger = getLogger(__name__)
+        self.max_workers = max_workers
+
+
+    def run(self, experiments):
+        """Run all experiments, returns one result (or None) per experiment."""
+        experiments = list(experiments)
+        groups, singles = get_pack_groups(experiments)
+        results = [None] * len(experiments)
+        threads = []
+        for group in groups:
+            thread = threading.Thread(
+                target=self._run_pack,
+                args=([experiments[index] for index in group], group, results),
+                name='pack-{}'.format(group[0]))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        self.logger.info('{} workload(s) packed into {} job(s).'.format(
+            sum(len(group) for group in groups), len(groups)))
+
+        single_results = WorkloadExecutor(self.max_workers).run_experiments(
+            [experiments[index] for index in singles])
+        for index, result in zip(singles, single_results):
+            results[index] = result
+        for thread in threads:
+            thread.join()
+        return results
+
+
+    def _run_pack(self, members, indices, results):
+        """Thread body, stores the results of the packed workloads."""
+        try:
+            hpcBackend = PackBackend(members[0].getHPCConfig(), members)
+            self.logger.info("Packing workloads {} into job '{}'.".format(
+                ', '.join(member.get_name() for member in members),
+                hpcBackend.pack_name))
+            hpcBackend.run_experiment(hpcBackend.experiment)
+            for index, member in zip(indices, members):
+                export_timings(hpcBackend.hpcConfig, member)
+                results[index] = hpcBackend.get_result(member)
+        except (Exception, SystemExit) as e:
+            # sys.exit() in a thread only ends this pack
+            self.logger.error("Packed workloads {} failed: {}".format(
+                ', '.join(member.get_name() for member in members), e))
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Per-phase timing of an experiment's execution"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import json
+import time
+import threading
+
+from contextlib import contextmanager
+
+from api.logger import getLogger
+
+
+# not affected by clock adjustments, wall clock on Python 2
+monotonic = getattr(time, 'monotonic', time.time)
+
+# phases in execution order, as reported
+PHASES = ('stage_in', 'submit', 'queue_wait', 'execution', 'collect')
+
+# reported percentiles of each distribution
+PERCENTILES = (50, 95, 99)
+
+# last timings per workload, written as Prometheus textfile
+_prometheus_timings = {}
+_export_lock = threading.Lock()
+
+
+class PhaseTimer(object):
+    """
+    Measures the phases of one experiment with a monotonic clock.
+
+    The wait for the job is split into queue wait and execution at the
+    moment the poller first reports the job as running, thus the split
+    is only as precise as the poll interval.
+    """
+
+    def __init__(self):
+        """Initialize the timer."""
+        self.started = {}
+        self.durations = {}
+        self.events = {}
+
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as phase 'name'."""
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+
+    def start(self, name):
+        self.started[name] = monotonic()
+
+
+    def stop(self, name):
+        if name in self.started:
+            self.durations[name] = monotonic() - self.started[name]
+
+
+    def mark(self, event):
+        """Record the first occurrence of an event, e.g. 'running'."""
+        self.events.setdefault(event, monotonic())
+
+
+    def get_timings(self):
+        """Seconds per phase, None for phases not (yet) passed."""
+        timings = dict((phase, self.durations.get(phase)) for phase in PHASES)
+        wait = self.durations.get('wait')
+        if wait is not None:
+            running = self.events.get('running')
+            if running is None:
+                # finished between two polls, never seen running
+                timings['queue_wait'] = wait
+                timings['execution'] = 0.0
+            else:
+                timings['queue_wait'] = running - self.started['wait']
+                timings['execution'] = wait - timings['queue_wait']
+        timings['running_observed'] = 'running' in self.events
+        if self.started:
+            start = min(self.started.values())
+            end = max(self.started[name] + self.durations[name]
+                      for name in self.durations)
+            timings['total'] = end - start
+        else:
+            timings['total'] = None
+        return timings
+
+
+def get_distribution(values):
+    """Mean, max and percentiles (nearest rank) of the values."""
+    if not values:
+        return None
+    values = sorted(values)
+    distribution = {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'max': values[-1]
+    }
+    for percentile in PERCENTILES:
+        rank = max(0, int(-(-len(values) * percentile // 100)) - 1)
+        distribution['p{}'.format(percentile)] = values[rank]
+    return distribution
+
+
+def _export_jsonl(path, record):
+    with open(os.path.expanduser(path), 'a') as out_file:
+        out_file.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _export_prometheus(path, record):
+    """Rewrite the textfile with the last timings of each workload."""
+    _prometheus_timings[record['workload']] = record
+    path = os.path.expanduser(path)
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as out_file:
+        out_file.write('# HELP hpcwg_phase_seconds Duration of an experiment '
+                       'phase in seconds.\n')
+        out_file.write('# TYPE hpcwg_phase_seconds gauge\n')
+        for workload in sorted(_prometheus_timings):
+            workload_record = _prometheus_timings[workload]
+            for phase in PHASES + ('total',):
+                seconds = workload_record['timings'].get(phase)
+                if seconds is None:
+                    continue
+                out_file.write(
+                    'hpcwg_phase_seconds{{workload="{}",job_id="{}",'
+                    'phase="{}"}} {:.6f}\n'.format(
+                        _escape(workload), _escape(workload_record['job_id']),
+                        phase, seconds))
+    # atomic, the collector never reads a partial file
+    os.rename(tmp_path, path)
+
+
+def export_timings(hpcConfig, experiment):
+    """Write the experiment's timings to the configured files, if any."""
+    if not hpcConfig.timings_jsonl and not hpcConfig.timings_prometheus:
+        return
+    record = {
+        'workload': experiment.get_name(),
+        'job_id': experiment.get_job_id(),
+        'start_time': experiment.get_start_time(),
+        'end_time': experiment.get_end_time(),
+        'timings': experiment.get_timings()
+    }
+    if experiment.get_vm_timings() is not None:
+        record['vm_timings'] = experiment.get_vm_timings()
+    try:
+        with _export_lock:
+            if hpcConfig.timings_jsonl:
+                _export_jsonl(hpcConfig.timings_jsonl, record)
+            if hpcConfig.timings_prometheus:
+                _export_prometheus(hpcConfig.timings_prometheus, record)
+    except (IOError, OSError) as e:
+        getLogger(__name__).warning(
+            'Exporting timings failed: {}'.format(e))
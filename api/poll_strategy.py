@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Adaptive job state polling"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import re
+import random
+
+from time import time
+
+from api.logger import getLogger
+
+
+# job states the poll interval backs off in
+QUEUED_STATES = ('Q', 'W', 'H', 'T')
+
+# job states the job consumes its walltime in
+RUNNING_STATES = ('R', 'S')
+
+
+def parse_walltime(args):
+    """Requested walltime in seconds from qsub args, None if not given."""
+    if not args:
+        return None
+    match = re.search(r'walltime=([\d:]+)', args)
+    if match is None:
+        return None
+    seconds = 0
+    for part in match.group(1).split(':'):
+        seconds = seconds * 60 + int(part or 0)
+    return seconds
+
+
+class AdaptivePolling(object):
+    """
+    Computes the sleeping time between two job state polls.
+
+    Right after submission the job is polled with 'poll_time_min' to catch
+    immediate failures, while queued the interval grows by 'poll_backoff'
+    up to 'poll_time_max', while running it returns to 'poll_time_qstat'
+    and shrinks towards 'poll_time_min' as the requested walltime expires.
+    """
+
+    def __init__(self, hpcConfig, walltime=None):
+        """Initialize the strategy for one job."""
+        self.logger = getLogger(__name__)
+        self.base = float(hpcConfig.poll_time_qstat)
+        self.min = float(hpcConfig.poll_time_min)
+        self.max = float(hpcConfig.poll_time_max)
+        self.backoff = float(hpcConfig.poll_backoff)
+        self.jitter = float(hpcConfig.poll_jitter)
+        self.fast_period = float(hpcConfig.poll_fast_period)
+        self.walltime = walltime
+        self.submit_time = time()
+        self.run_start = None
+        self.interval = self.base
+
+
+    def next_interval(self, job_state):
+        """Seconds to sleep before polling again."""
+        now = time()
+        if job_state in RUNNING_STATES:
+            if self.run_start is None:
+                self.run_start = now
+            interval = self.base
+            if self.walltime:
+                remaining = self.walltime - (now - self.run_start)
+                interval = min(interval, remaining / 2.0)
+        elif job_state in QUEUED_STATES:
+            interval = self.interval * self.backoff
+        else:
+            # unknown yet or finishing
+            interval = self.min
+        # fast polling right after submit
+        if now - self.submit_time < self.fast_period:
+            interval = self.min
+        self.interval = max(self.min, min(self.max, interval))
+        # spread the polls of concurrent jobs
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Parser for qstat's full (-f) and XML (-x) output"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import re
+
+from xml.etree import ElementTree
+
+
+# resources reported per job
+RESOURCES = ('cput', 'mem', 'vmem', 'walltime')
+
+# attributes of interest in 'qstat -f' output, mapped to record fields
+_FULL_ATTRIBUTES = {
+    'job_state': 'state',
+    'exit_status': 'exit_status',
+    'queue': 'queue',
+    'exec_host': 'exec_host'
+}
+for _resource in RESOURCES:
+    _FULL_ATTRIBUTES['resources_used.' + _resource] = _resource
+
+_JOB_ID_PREFIX = 'Job Id:'
+
+_STRIPPED_JOB_ID = re.compile(r'^\d+(\[\d*\])?')
+
+_ARRAY_SUB_JOB_ID = re.compile(r'^(\d+)\[(\d+)\]$')
+
+# precedence of sub-job states for the state of a whole job array
+_ARRAY_STATE_ORDER = ('R', 'E', 'S', 'T', 'W', 'Q', 'H', 'C')
+
+
+def strip_job_id(job_id):
+    """
+    Job ID without server name, e.g. '123' for '123.host.domain', array
+    brackets are kept, e.g. '123[]' or '123[4]'.
+    """
+    match = _STRIPPED_JOB_ID.match(job_id)
+    return match.group(0) if match else job_id
+
+
+def split_array_job_id(job_id):
+    """('123[]', 4) for the array sub-job '123[4]', None otherwise."""
+    match = _ARRAY_SUB_JOB_ID.match(job_id)
+    if match is None:
+        return None
+    return ('{}[]'.format(match.group(1)), int(match.group(2)))
+
+
+def aggregate_array(array_id, sub_records):
+    """
+    One record for a whole job array: the most active state and the
+    first non-zero exit status of all sub-jobs.
+    """
+    record = JobRecord(array_id)
+    states = set(sub.state for sub in sub_records.values())
+    for state in _ARRAY_STATE_ORDER:
+        if state in states:
+            record.state = state
+            break
+    exit_states = [sub.exit_status for (index, sub) in sorted(sub_records.items())
+                   if sub.exit_status is not None]
+    if exit_states:
+        record.exit_status = next(
+            (code for code in exit_states if code != 0), 0)
+    for sub in sub_records.values():
+        record.queue = record.queue or sub.queue
+    return record
+
+
+class JobRecord(object):
+    """State, exit status and resource usage of one job."""
+
+    __slots__ = ('job_id', 'state', 'exit_status', 'queue', 'exec_host',
+                 'resources_used')
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.state = None
+        self.exit_status = None
+        self.queue = None
+        self.exec_host = None
+        self.resources_used = {}
+
+
+    def _set(self, field, value):
+        if field in RESOURCES:
+            self.resources_used[field] = value
+        elif field == 'exit_status':
+            try:
+                self.exit_status = int(value)
+            except ValueError:
+                self.exit_status = None
+        else:
+            setattr(self, field, value)
+
+
+    def _append(self, field, value):
+        if field in RESOURCES:
+            self.resources_used[field] += value
+        else:
+            setattr(self, field, (getattr(self, field) or '') + value)
+
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'state': self.state,
+            'exit_status': self.exit_status,
+            'queue': self.queue,
+            'exec_host': self.exec_host,
+            'resources_used': dict(self.resources_used)
+        }
+
+
+    @classmethod
+    def from_dict(cls, values):
+        """Inverse of to_dict."""
+        record = cls(values['job_id'])
+        for field in cls.__slots__:
+            if field in values:
+                setattr(record, field, values[field])
+        record.resources_used = dict(record.resources_used or {})
+        return record
+
+
+    def __repr__(self):
+        return 'JobRecord({})'.format(self.to_dict())
+
+
+def parse_full(lines):
+    """
+    Parse 'qstat -f' output line by line, yields a JobRecord per job.
+
+    Accepts any iterable of lines, e.g. a streamed ssh command, thus the
+    whole output is never held in memory.
+    """
+    record = None
+    field = None
+    for line in lines:
+        if line.startswith(_JOB_ID_PREFIX):
+            if record is not None:
+                yield record
+            record = JobRecord(line[len(_JOB_ID_PREFIX):].strip())
+            field = None
+        elif record is None:
+            continue
+        elif line.startswith('\t'):
+            # continuation of a long value
+            if field is not None:
+                record._append(field, line.strip())
+        else:
+            key, sep, value = line.partition(' = ')
+            field = _FULL_ATTRIBUTES.get(key.strip()) if sep else None
+            if field is not None:
+                record._set(field, value.strip())
+    if record is not None:
+        yield record
+
+
+class _ChunkReader(object):
+    """File-like wrapper for an iterable of text or byte chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+
+
+    def read(self, size=-1):
+        for chunk in self.chunks:
+            if chunk:
+                return chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+        return b''
+
+
+def parse_xml(source):
+    """
+    Parse 'qstat -x' output incrementally, yields a JobRecord per job.
+
+    'source' is a file-like object or an iterable of text chunks.
+    """
+    if not hasattr(source, 'read'):
+        source = _ChunkReader(source)
+    for event, elem in ElementTree.iterparse(source, events=('end',)):
+        if elem.tag != 'Job':
+            continue
+        record = JobRecord(elem.findtext('Job_Id', '').strip())
+        for key, field in _FULL_ATTRIBUTES.items():
+            value = elem.findtext(key.replace('.', '/'))
+            if value is not None:
+                record._set(field, value.strip())
+        yield record
+        # free the parsed job
+        elem.clear()
+
+
+def parse_queue_summary(lines):
+    """
+    Parse 'qstat -Q' output, returns the job counts ('queued', 'running',
+    'held') keyed by queue name.
+    """
+    columns = None
+    queues = {}
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0].startswith('-'):
+            continue
+        if columns is None:
+            if fields[0] == 'Queue':
+                columns = fields
+            continue
+        if len(fields) != len(columns):
+            continue
+        row = dict(zip(columns, fields))
+        counts = {}
+        for column, name in (('Que', 'queued'), ('Run', 'running'),
+                             ('Hld', 'held')):
+            try:
+                counts[name] = int(row.get(column, 0))
+            except ValueError:
+                counts[name] = 0
+        queues[row['Queue']] = counts
+    return queues
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Shared, batched job state poller"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import threading
+
+from time import time
+
+from api.logger import getLogger
+from api.qstat_parser import strip_job_id, split_array_job_id, aggregate_array
+
+
+# all pollers of this process, keyed by the scheduler's poll key
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+class QstatPoller(object):
+    """
+    Polls the state of all tracked jobs with a single batch status query,
+    e.g. 'qstat -f' for Torque.
+
+    All callers share one state cache, a new qstat is only issued if the
+    cache is older than 'max_age' seconds or a job has not been seen yet.
+    The lock is not held during the query, callers arriving meanwhile wait
+    for its result instead of querying again.
+    """
+
+    def __init__(self, scheduler, max_age):
+        """Initialize the poller."""
+        self.logger = getLogger(__name__)
+        self.scheduler = scheduler
+        self.max_age = float(max_age)
+        self.tracked = set()
+        self.records = {}
+        # sub-job records of job arrays, keyed by array ID and index
+        self.array_records = {}
+        self.queries = 0
+        self._polled_ids = set()
+        self._last_poll = 0
+        self._lock = threading.Lock()
+        # notified when the query in flight has been applied
+        self._queried = threading.Condition(self._lock)
+        self._querying = False
+
+
+    def track(self, job_id):
+        """Include the given job in the following qstat calls."""
+        with self._lock:
+            self.tracked.add(job_id)
+
+
+    def untrack(self, job_id):
+        """Stop polling the given job."""
+        with self._lock:
+            self.tracked.discard(job_id)
+            self.records.pop(job_id, None)
+            self.array_records.pop(job_id, None)
+
+
+    def get_record(self, job_id):
+        """Get the cached job record, polls if the cache is outdated."""
+        with self._lock:
+            while self._querying:
+                self._queried.wait()
+            if (job_id not in self._polled_ids or
+                    time() - self._last_poll >= self.max_age):
+                self._poll()
+            return self.records.get(job_id)
+
+
+    def get_array_records(self, array_id):
+        """Last seen sub-job records of a job array, keyed by index."""
+        with self._lock:
+            return dict(self.array_records.get(array_id, {}))
+
+
+    def get_state(self, job_id):
+        """Get the cached job state, None if the job is unknown."""
+        record = self.get_record(job_id)
+        return record.state if record is not None else None
+
+
+    def _poll(self):
+        """
+        Query the state of all tracked jobs at once, called with the lock
+        held, which is released while the query runs.
+        """
+        if not self.tracked:
+            return
+        job_ids = sorted(self.tracked)
+        self.logger.debug('Polling state of {} job(s)'.format(len(job_ids)))
+        self._querying = True
+        self._lock.release()
+        try:
+            batch_records = list(self.scheduler.batch_status(job_ids))
+        finally:
+            self._lock.acquire()
+            self._querying = False
+            self._queried.notify_all()
+        self._apply(job_ids, batch_records)
+
+
+    def _apply(self, job_ids, batch_records):
+        """Replace the cached records by the ones of a batch status query."""
+        records = {}
+        array_records = {}
+        for record in batch_records:
+            job_id = strip_job_id(record.job_id)
+            array_job = split_array_job_id(job_id)
+            if job_id in self.tracked:
+                records[job_id] = record
+            elif array_job is not None and array_job[0] in self.tracked:
+                array_records.setdefault(array_job[0], {})[array_job[1]] = record
+        for array_id, sub_records in array_records.items():
+            records[array_id] = aggregate_array(array_id, sub_records)
+            # keep sub-jobs that have left the queue
+            self.array_records.setdefault(array_id, {}).update(sub_records)
+        self.queries += 1
+        self._last_poll = time()
+        self._polled_ids = set(job_ids)
+        self.records = records
+        self.logger.debug('qstat states: {}'.format(
+            dict((job_id, record.state) for (job_id, record) in records.items())))
+
+
+def get_poller(scheduler, max_age):
+    """Get the process-wide poller for the given scheduler."""
+    key = scheduler.get_poll_key()
+    with _pollers_lock:
+        if key not in _pollers:
+            _pollers[key] = QstatPoller(scheduler, max_age)
+        return _pollers[key]
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Memoization of experiment results"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from time import time
+
+from api.logger import getLogger
+from api.qstat_parser import JobRecord
+from api.stage_manifest import build_manifest
+
+
+# metadata of a cache entry, next to the cached result files
+META_FILE = 'result.json'
+
+# config keys that change what a job computes or where it runs
+CONFIG_KEYS = ('host', 'execution_dir', 'path_qsub', 'path_vsub')
+
+# counters of all caches of this process
+_totals = {
+    'hits': 0,
+    'misses': 0,
+    'stores': 0,
+    'evictions': 0
+}
+_totals_lock = threading.Lock()
+
+
+def get_totals():
+    """Accumulated cache statistics of this process."""
+    with _totals_lock:
+        return dict(_totals)
+
+
+def _count(key):
+    with _totals_lock:
+        _totals[key] += 1
+
+
+def _dir_size(path):
+    size = 0
+    for dir_path, dir_names, file_names in os.walk(path):
+        for file_name in file_names:
+            size += os.path.getsize(os.path.join(dir_path, file_name))
+    return size
+
+
+class ResultCache(object):
+    """
+    Results of finished experiments, keyed by a content hash of job
+    script, input data, qsub/vsub args and the relevant config.
+
+    An experiment with a cached, unexpired result is not submitted again,
+    the cached result files and job metadata are returned instead. Only
+    successful jobs (exit status 0) are cached, not those with an unknown
+    exit status. Entries expire 'ttl' seconds after they were stored, the
+    least recently used ones are evicted beyond 'max_bytes'.
+    """
+
+    def __init__(self, cache_dir, ttl, max_bytes, manifest_cache_dir):
+        """Initialize the cache."""
+        self.logger = getLogger(__name__)
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.manifest_cache_dir = manifest_cache_dir
+        self._lock = threading.Lock()
+
+
+    def get_key(self, experiment, hpcConfig):
+        """Content hash of everything the result depends on."""
+        key = {
+            'job_script': build_manifest(experiment.get_job_script(),
+                                         self.manifest_cache_dir),
+            'input_data': None,
+            'qsub_args': experiment.get_declared_qsub_args(),
+            'vsub_args': experiment.get_vsub_args(),
+            'array': experiment.get_array_request(),
+            'array_values': experiment.get_array_values(),
+            'sweep': experiment.get_sweep_point(),
+            'scheduler': hpcConfig.scheduler,
+            'config': dict((key, hpcConfig.config_dict.get(key))
+                           for key in CONFIG_KEYS)
+        }
+        if experiment.get_alternatives():
+            key['alternatives'] = experiment.get_alternatives()
+        if experiment.get_input_data():
+            key['input_data'] = build_manifest(experiment.get_input_data(),
+                                               self.manifest_cache_dir)
+        # mtimes differ between checkouts, the content does not
+        for manifest in (key['job_script'], key['input_data'] or {}):
+            for entry in manifest.values():
+                entry.pop('mtime', None)
+        return hashlib.sha1(
+            json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+    def _get_entry_dir(self, cache_key):
+        return os.path.join(self.cache_dir, cache_key[:2], cache_key)
+
+
+    def load(self, cache_key, experiment):
+        """Apply a cached result to the experiment, False if there is none."""
+        entry_dir = self._get_entry_dir(cache_key)
+        meta_path = os.path.join(entry_dir, META_FILE)
+        try:
+            with open(meta_path, 'r') as data_file:
+                meta = json.load(data_file)
+        except (IOError, ValueError):
+            meta = None
+        if meta is not None and time() - meta['created'] > self.ttl:
+            self.logger.debug("Cached result '{}' expired.".format(cache_key))
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            meta = None
+        if meta is None:
+            _count('misses')
+            self.logger.info("Result cache miss for '{}'.".format(
+                experiment.get_name()))
+            return False
+
+        # mark as recently used
+        os.utime(meta_path, None)
+        experiment.set_start_time(meta['start_time'])
+        experiment.set_job_id(meta['job_id'])
+        if meta['end_time'] is not None:
+            experiment.set_end_time(meta['end_time'])
+        if meta['job_record'] is not None:
+            experiment.set_job_record(JobRecord.from_dict(meta['job_record']))
+        experiment.set_array_records(dict(
+            (int(index), JobRecord.from_dict(record))
+            for (index, record) in meta['array_records'].items()))
+        experiment.set_result_files(dict(
+            (name, os.path.join(entry_dir, name))
+            for name in meta['result_files']))
+        _count('hits')
+        self.logger.info(
+            "Result cache hit for '{}', reusing job '{}' of {}.".format(
+                experiment.get_name(), meta['job_id'], meta['created']))
+        return True
+
+
+    def store(self, cache_key, experiment):
+        """Cache the result of a finished experiment."""
+        exit_status = experiment.get_exit_status()
+        array_records = experiment.get_array_records()
+        if exit_status != 0 or any(record.exit_status != 0
+                                   for record in array_records.values()):
+            self.logger.debug(
+                "Job '{}' failed or its exit status is unknown, not caching "
+                "it.".format(experiment.get_job_id()))
+            return
+        job_record = experiment.get_job_record()
+        meta = {
+            'created': time(),
+            'name': experiment.get_name(),
+            'job_id': experiment.get_job_id(),
+            'start_time': experiment.get_start_time(),
+            'end_time': experiment.get_end_time(),
+            'job_record': None if job_record is None else job_record.to_dict(),
+            'array_records': dict(
+                (str(index), record.to_dict())
+                for (index, record) in array_records.items()),
+            'result_files': sorted(experiment.get_result_files())
+        }
+        entry_dir = self._get_entry_dir(cache_key)
+        parent = os.path.dirname(entry_dir)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        # built aside and renamed, readers never see a partial entry
+        tmp_dir = tempfile.mkdtemp(prefix='.', dir=parent)
+        for name, local_path in experiment.get_result_files().items():
+            shutil.copyfile(local_path, os.path.join(tmp_dir, name))
+        with open(os.path.join(tmp_dir, META_FILE), 'w') as data_file:
+            json.dump(meta, data_file, sort_keys=True)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # stored concurrently by another workload
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        _count('stores')
+        self.evict()
+
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones."""
+        with self._lock:
+            entries = []
+            if not os.path.isdir(self.cache_dir):
+                return
+            for prefix in os.listdir(self.cache_dir):
+                prefix_dir = os.path.join(self.cache_dir, prefix)
+                if not os.path.isdir(prefix_dir):
+                    continue
+                for cache_key in os.listdir(prefix_dir):
+                    if cache_key.startswith('.'):
+                        # being stored
+                        continue
+                    entry_dir = os.path.join(prefix_dir, cache_key)
+                    meta_path = os.path.join(entry_dir, META_FILE)
+                    try:
+                        with open(meta_path, 'r') as data_file:
+                            created = json.load(data_file)['created']
+                        # the last load touches the metadata
+                        used = os.path.getmtime(meta_path)
+                    except (IOError, OSError, ValueError, KeyError):
+                        continue
+                    entries.append((used, created, entry_dir,
+                                    _dir_size(entry_dir)))
+            total = sum(entry[3] for entry in entries)
+            expired = time() - self.ttl
+            # expired as on load, then least recently used
+            for used, created, entry_dir, size in sorted(
+                    entries, key=lambda entry: (entry[1] >= expired, entry[0])):
+                if created >= expired and total <= self.max_bytes:
+                    break
+                self.logger.debug("Evicting cached result '{}'".format(
+                    os.path.basename(entry_dir)))
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+                _count('evictions')
+
+
+def get_result_cache(hpcConfig):
+    """Result cache of the config, None unless enabled."""
+    if not hpcConfig.result_cache:
+        return None
+    return ResultCache(hpcConfig.result_cache_dir,
+                       hpcConfig.result_cache_ttl,
+                       hpcConfig.result_cache_max_bytes,
+                       os.path.expanduser(hpcConfig.manifest_cache_dir))
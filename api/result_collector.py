@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Single round-trip collection of a job's result artifacts"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import shutil
+import tarfile
+import tempfile
+
+from api.logger import getLogger
+from api.log_stream import CHUNK_SIZE
+
+
+# artifacts cut to their last lines with 'log_tail_lines', by name prefix
+TAILED_ARTIFACTS = ('stdout', 'stderr')
+
+
+class ResultCollector(object):
+    """
+    Fetches all result artifacts of a job with one remote command.
+
+    The remote side links the artifacts into a temporary dir under their
+    artifact names and streams them as one gzipped tar archive, which is
+    unpacked into '<results_dir>/<experiment name>/<job id>/'. With
+    'tail_lines' set only the last lines of the stdout and stderr logs
+    are collected.
+    """
+
+    def __init__(self, channel, results_dir, tail_lines=None):
+        """Initialize the collector."""
+        self.logger = getLogger(__name__)
+        self.channel = channel
+        self.results_dir = os.path.expanduser(results_dir)
+        self.tail_lines = tail_lines
+
+
+    def _remote_cmd(self, artifacts):
+        """Shell command streaming the existing artifacts as tar.gz."""
+        cmd = 'd=$(mktemp -d) && '
+        for name, remote_path in sorted(artifacts.items()):
+            # paths are left unquoted for '~' expansion
+            if self.tail_lines is not None and name.startswith(TAILED_ARTIFACTS):
+                cmd += '{{ [ -e {0} ] && tail -n {2} {0} > "$d/{1}"; }}; '.format(
+                    remote_path, name, int(self.tail_lines))
+            else:
+                cmd += '{{ [ -e {0} ] && ln -s "$(readlink -f {0})" "$d/{1}"; }}; '.format(
+                    remote_path, name)
+        cmd += 'tar czhf - -C "$d" .; rc=$?; rm -rf "$d"; exit $rc'
+        return cmd
+
+
+    def get_job_dir(self, experiment):
+        """Local dir for the given experiment's results."""
+        return os.path.join(self.results_dir, experiment.get_name(),
+                            experiment.get_stripped_job_id())
+
+
+    def collect(self, experiment, artifacts):
+        """
+        Fetch the artifacts, a dict of name to remote path, returns a dict
+        of name to local path for each artifact that exists remotely.
+        """
+        job_dir = self.get_job_dir(experiment)
+        if not os.path.isdir(job_dir):
+            os.makedirs(job_dir)
+        self.logger.info("Collecting {} into '{}'".format(
+            ', '.join(sorted(artifacts)), job_dir))
+
+        # stream the archive to disk, never into memory
+        archive = tempfile.NamedTemporaryFile(suffix='.tar.gz', delete=False)
+        try:
+            with archive:
+                self.channel(self._remote_cmd(artifacts), _out=archive,
+                             _no_out=True, _tty_out=False)
+            result_files = self._unpack(archive.name, job_dir, artifacts)
+        finally:
+            os.remove(archive.name)
+
+        for name in sorted(set(artifacts) - set(result_files)):
+            self.logger.info("No '{}' found at '{}'".format(
+                name, artifacts[name]))
+        return result_files
+
+
+    def _unpack(self, archive_path, job_dir, artifacts):
+        """Extract the expected regular files only."""
+        result_files = {}
+        with tarfile.open(archive_path, 'r:gz') as archive:
+            for member in archive:
+                name = os.path.normpath(member.name)
+                if not member.isfile() or name not in artifacts:
+                    continue
+                local_path = os.path.join(job_dir, name)
+                source = archive.extractfile(member)
+                with open(local_path, 'wb') as local_file:
+                    shutil.copyfileobj(source, local_file, CHUNK_SIZE)
+                result_files[name] = local_path
+        return result_files
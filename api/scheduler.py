@@ -0,0 +1,895 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Batch system (scheduler) abstraction"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import re
+import sys
+import signal
+import threading
+import itertools
+import subprocess
+
+from time import time, mktime, strptime
+from sh import ErrorReturnCode
+
+from api.logger import getLogger
+from api.qstat_parser import (JobRecord, parse_full, parse_queue_summary,
+                              strip_job_id, split_array_job_id)
+from api.poll_strategy import parse_walltime
+
+
+# qstat's exit code if (some of) the requested job IDs are unknown
+QSTAT_UNKNOWN_JOB = 153
+
+# seconds finished local jobs are kept, as Torque's keep_completed
+KEEP_COMPLETED = 300
+
+# job IDs passed to one status query, more jobs are queried in chunks
+MAX_IDS_PER_QUERY = 50
+
+# Slurm job states mapped to Torque's state letters
+SLURM_STATES = {
+    'PENDING': 'Q',
+    'REQUEUED': 'Q',
+    'REQUEUE_HOLD': 'H',
+    'REQUEUE_FED': 'Q',
+    'RESV_DEL_HOLD': 'H',
+    'CONFIGURING': 'R',
+    'RUNNING': 'R',
+    'RESIZING': 'R',
+    'SUSPENDED': 'S',
+    'STOPPED': 'S',
+    'SIGNALING': 'E',
+    'STAGE_OUT': 'E',
+    'COMPLETING': 'E'
+}
+
+
+# start estimate of showstart, '[[[DD:]HH:]MM:]SS', negative if overdue
+SHOWSTART_ESTIMATE = re.compile(r'start in\s+(-?)(?:(\d+):(?=\d+:\d+:))?([\d:]+)')
+
+
+def _get_chunks(job_ids):
+    """The job IDs in chunks of at most MAX_IDS_PER_QUERY."""
+    return [job_ids[start:start + MAX_IDS_PER_QUERY]
+            for start in range(0, len(job_ids), MAX_IDS_PER_QUERY)]
+
+
+def get_proc_count(qsub_args):
+    """Processors requested by Torque qsub args ('nodes=N:ppn=P'), at least 1."""
+    match = re.search(r'nodes=(\d+)(?::ppn=(\d+))?', qsub_args or '')
+    if match is None:
+        return 1
+    return int(match.group(1)) * int(match.group(2) or 1)
+
+
+def _format_duration(seconds):
+    """Seconds as Torque style 'HH:MM:SS'."""
+    seconds = int(seconds)
+    return '{:02d}:{:02d}:{:02d}'.format(
+        seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def _quote_ids(job_ids):
+    # quoted, array brackets are shell patterns
+    return ["'{}'".format(job_id) for job_id in job_ids]
+
+
+class Scheduler(object):
+    """
+    Interface of a batch system: submit, batch status, cancel and the
+    location of a job's logs.
+
+    Job states are reported as Torque state letters, array jobs as
+    '<id>[]' with sub-jobs '<id>[<index>]', whatever the batch system.
+    """
+
+    name = None
+
+    def __init__(self, hpcConfig, channel):
+        """Initialize the scheduler."""
+        self.logger = getLogger(__name__)
+        self.hpcConfig = hpcConfig
+        self.channel = channel
+
+
+    def get_poll_key(self):
+        """Jobs of schedulers with equal keys are polled together."""
+        return (self.name, self.channel)
+
+
+    # exit codes of the status command that are no error
+    status_ok_codes = (0,)
+
+    # exit codes of the command querying unseen jobs that are no error
+    unseen_ok_codes = (0,)
+
+    # options of the submit command selecting a queue
+    queue_options = ()
+
+    def get_submit_command(self, experiment, depends_on=None):
+        """Remote command submitting the job, None if there is none."""
+        return None
+
+
+    def parse_submit_output(self, experiment, output):
+        """Job ID from the submit command's output, exits if there is none."""
+        raise NotImplementedError()
+
+
+    def get_status_command(self, job_ids):
+        """Remote command querying the jobs' state, None if there is none."""
+        return None
+
+
+    def get_status_commands(self, job_ids):
+        """
+        Remote commands querying the jobs' state, one per chunk of at most
+        MAX_IDS_PER_QUERY jobs, None if there are none.
+        """
+        commands = [self.get_status_command(chunk) for chunk in _get_chunks(job_ids)]
+        return None if None in commands else commands
+
+
+    def parse_status_output(self, lines):
+        """JobRecords from the lines of the status command's output."""
+        raise NotImplementedError()
+
+
+    def get_unseen_status_command(self, job_ids):
+        """
+        Remote command querying jobs the status command does not report
+        yet, e.g. due to accounting lag, None if there is none.
+        """
+        return None
+
+
+    def get_unseen_status_commands(self, job_ids):
+        """
+        Commands querying the jobs missing in the status command's
+        records, in chunks as get_status_commands, empty if there are none.
+        """
+        if not job_ids or self.get_unseen_status_command(job_ids[:1]) is None:
+            return []
+        return [self.get_unseen_status_command(chunk)
+                for chunk in _get_chunks(job_ids)]
+
+
+    def parse_unseen_status_output(self, lines):
+        """JobRecords from the output of the unseen jobs' command."""
+        raise NotImplementedError()
+
+
+    def get_unseen_ids(self, job_ids, records):
+        """The given job IDs without any of the records."""
+        seen = set()
+        for record in records:
+            job_id = strip_job_id(record.job_id)
+            seen.add(job_id)
+            array_job = split_array_job_id(job_id)
+            if array_job is not None:
+                seen.add(array_job[0])
+        return [job_id for job_id in job_ids if job_id not in seen]
+
+
+    def submit(self, experiment, depends_on=None):
+        """
+        Submit the experiment's job script, returns the job ID.
+
+        The job starts only after all jobs in 'depends_on' finished
+        successfully, it is removed (or never started) if one of them fails.
+        """
+        command = self.get_submit_command(experiment, depends_on)
+        try:
+            # qsub may have queued the job before the connection broke
+            ssh_output = self.channel(*command, _retry=False)
+        except ErrorReturnCode as e:
+            self.logger.error(
+                "Job failed. Error code '{}' for SSH cmd:\n {}\n{}".format(
+                    e.exit_code, e.full_cmd, e.stderr))
+            sys.exit(1)
+        self.logger.debug("SSH output:\n%s", ssh_output)
+        return self.parse_submit_output(experiment, str(ssh_output))
+
+
+    def batch_status(self, job_ids):
+        """Yield a JobRecord for each known job (and array sub-job)."""
+        records = []
+        for command in self.get_status_commands(job_ids):
+            ssh_output = self.channel(*command, _iter=True,
+                                      _ok_code=list(self.status_ok_codes))
+            for record in self.parse_status_output(ssh_output):
+                records.append(record)
+                yield record
+        for command in self.get_unseen_status_commands(
+                self.get_unseen_ids(job_ids, records)):
+            ssh_output = self.channel(*command, _iter=True,
+                                      _ok_code=list(self.unseen_ok_codes))
+            for record in self.parse_unseen_status_output(ssh_output):
+                yield record
+
+
+    def cancel(self, job_ids):
+        """Cancel all given jobs at once."""
+        raise NotImplementedError()
+
+
+    def get_queue(self, qsub_args):
+        """Queue (or partition) requested by the qsub args, None if none."""
+        qsub_args = (qsub_args or '').split()
+        for index, arg in enumerate(qsub_args):
+            for option in self.queue_options:
+                if arg == option and index + 1 < len(qsub_args):
+                    return qsub_args[index + 1].partition('@')[0]
+                if option.startswith('--') and arg.startswith(option + '='):
+                    return arg[len(option) + 1:]
+        return None
+
+
+    def get_queue_stats(self):
+        """Job counts ('queued', 'running', 'held') keyed by queue name."""
+        raise NotImplementedError()
+
+
+    def get_start_estimate(self, qsub_args):
+        """
+        Seconds until a job submitted with the qsub args would start, as
+        predicted by the batch system, None if it predicts nothing.
+        """
+        return None
+
+
+    def get_log_path(self, log_type, experiment, index=None):
+        """Path of the job's 'STDIN' or 'STDERR' log."""
+        raise NotImplementedError()
+
+
+    def get_result_artifacts(self, experiment):
+        """Paths of all result artifacts of the job, keyed by name."""
+        if experiment.is_array_job():
+            artifacts = {}
+            for index in experiment.get_array_indices():
+                artifacts['stdout-{}'.format(index)] = self.get_log_path(
+                    'STDIN', experiment, index)
+                artifacts['stderr-{}'.format(index)] = self.get_log_path(
+                    'STDERR', experiment, index)
+        else:
+            artifacts = {
+                'stdout': self.get_log_path('STDIN', experiment),
+                'stderr': self.get_log_path('STDERR', experiment)
+            }
+        return artifacts
+
+
+    def _log_type_string(self, log_type):
+        if log_type == 'STDIN':
+            return 'o'
+        elif log_type == 'STDERR':
+            return 'e'
+        self.logger.error('Unknown log type, {}'.format(log_type))
+        sys.exit(1)
+
+
+class TorqueScheduler(Scheduler):
+    """PBS Torque, and vTorque for VM jobs."""
+
+    name = 'torque'
+
+    status_ok_codes = (0, QSTAT_UNKNOWN_JOB)
+
+    queue_options = ('-q',)
+
+    def get_poll_key(self):
+        return (self.name, self.channel, self.hpcConfig.path_qstat)
+
+
+    def _build_args(self, experiment, depends_on=None):
+        """Build a list of arguments passed to qsub."""
+        arg_list = []
+        qsub_args = experiment.get_qsub_args()
+        if qsub_args is None:
+            self.logger.info("Parameter 'qsub_args' not found.")
+        else:
+            arg_list.append(qsub_args)
+
+        vsub_args = experiment.get_vsub_args()
+        if vsub_args is None:
+            self.logger.info("Parameter 'vsub_args' not found.")
+        else:
+            arg_list.append(vsub_args)
+
+        if experiment.is_array_job():
+            arg_list.append('-t {}'.format(experiment.get_array_request()))
+            if experiment.get_array_values() is not None:
+                # picked by the job script with $PBS_ARRAYID
+                arg_list.append("-v 'HPCWG_ARRAY_VALUES={}'".format(
+                    ' '.join(experiment.get_array_values())))
+
+        if depends_on:
+            # job arrays need their own dependency type
+            dependencies = []
+            jobs = [job_id for job_id in depends_on if '[]' not in job_id]
+            if jobs:
+                dependencies.append('afterok:' + ':'.join(jobs))
+            arrays = [job_id for job_id in depends_on if '[]' in job_id]
+            if arrays:
+                dependencies.append('afterokarray:' + ':'.join(arrays))
+            arg_list.append("-W 'depend={}'".format(','.join(dependencies)))
+        return arg_list
+
+
+    def get_submit_command(self, experiment, depends_on=None):
+        exec_dir = self.hpcConfig.get_value('execution_dir')
+        arg_list = self._build_args(experiment, depends_on)
+        arg_list.append(os.path.basename(experiment.get_job_script()))
+        self.logger.info('Batch-System arguments:\n {}'.format(arg_list))
+
+        # job submit depends on either vm job or not
+        submission_cmd = "cd {}; ".format(exec_dir)
+        if experiment.is_vm_job():
+            self.logger.info('VM job detected')
+            submission_cmd += self.hpcConfig.path_vsub
+        else:
+            submission_cmd += self.hpcConfig.path_qsub
+            self.logger.info('Bare-metal job detected.')
+        self.logger.info(
+            'using command \'{}\' for job submission.'.format(
+                submission_cmd))
+        return [submission_cmd, arg_list]
+
+
+    def parse_submit_output(self, experiment, ssh_output):
+        # searching job id
+        for line in ssh_output.splitlines():
+            self.logger.debug("searching for job id in \n{}".format(line))
+            # job failed ?
+            if "error" in line:
+                self.logger.info("Job submission failed!\n %s", line)
+                sys.exit(1)
+            elif self.hpcConfig.domain in line:
+                self.logger.debug('Job id found: {}'.format(line))
+                return line
+        # job ID not found in output
+        self.logger.error(
+            "No job id found in ssh-output:\n-----\n{}\n-----\nexiting!".format(ssh_output)
+        )
+        sys.exit(1)
+
+
+    def get_status_command(self, job_ids):
+        qstat_args = ['-f']
+        if any(job_id.endswith('[]') for job_id in job_ids):
+            # expand job arrays into their sub-jobs
+            qstat_args.append('-t')
+        qstat_args.extend(_quote_ids(job_ids))
+        return [self.hpcConfig.path_qstat, qstat_args]
+
+
+    def parse_status_output(self, lines):
+        return parse_full(lines)
+
+
+    def cancel(self, job_ids):
+        self.channel(self.hpcConfig.path_qdel, _quote_ids(job_ids),
+                     _ok_code=[0, QSTAT_UNKNOWN_JOB])
+
+
+    def get_queue_stats(self):
+        ssh_output = self.channel(self.hpcConfig.path_qstat, '-Q')
+        return parse_queue_summary(str(ssh_output).splitlines())
+
+
+    def get_start_estimate(self, qsub_args):
+        # Maui/Moab's estimate for the processor count and walltime, it
+        # does not consider the queue
+        if not self.hpcConfig.path_showstart or self.get_queue(qsub_args):
+            return None
+        request = str(get_proc_count(qsub_args))
+        walltime = parse_walltime(qsub_args)
+        if walltime is not None:
+            request += '@' + _format_duration(walltime)
+        ssh_output = self.channel(self.hpcConfig.path_showstart, request)
+        match = SHOWSTART_ESTIMATE.search(str(ssh_output))
+        if match is None:
+            self.logger.warning("No start estimate in showstart output:\n{}".format(
+                ssh_output))
+            return None
+        overdue, days, duration = match.groups()
+        if overdue:
+            return 0
+        seconds = 0
+        for part in duration.split(':'):
+            seconds = seconds * 60 + int(part or 0)
+        return int(days or 0) * 24 * 3600 + seconds
+
+
+    def get_log_path(self, log_type, experiment, index=None):
+        job_script = os.path.basename(experiment.get_job_script())
+        job_id = experiment.get_stripped_job_id()
+        if index is not None:
+            job_id = '{}-{}'.format(job_id, index)
+        return '~/{}.{}{}'.format(job_script,
+                                  self._log_type_string(log_type),
+                                  job_id)
+
+
+    def get_vsub_debug_log_path(self, experiment):
+        if experiment.is_vm_job():
+            return '{}/{}/debug.log'.format(
+                self.hpcConfig.get_value('path_vtorque_log'),
+                experiment.get_job_id()).replace('\n', '')
+
+
+    def get_result_artifacts(self, experiment):
+        artifacts = Scheduler.get_result_artifacts(self, experiment)
+        if experiment.is_vm_job():
+            artifacts['vtorque_log'] = self.get_vsub_debug_log_path(experiment)
+        return artifacts
+
+
+class SlurmScheduler(Scheduler):
+    """
+    Slurm, job states are taken from the accounting (sacct) thus
+    running and finished jobs are reported alike. Jobs not yet in the
+    accounting are looked up in the queue (squeue).
+    """
+
+    name = 'slurm'
+
+    SACCT_FIELDS = ('JobID,State,ExitCode,Partition,NodeList,'
+                    'TotalCPU,MaxRSS,MaxVMSize,Elapsed')
+
+    SQUEUE_FORMAT = '%i|%T|%P|%N'
+
+    # squeue fails if none of the jobs is known anymore
+    unseen_ok_codes = (0, 1)
+
+    queue_options = ('-p', '--partition')
+
+    def get_submit_command(self, experiment, depends_on=None):
+        if experiment.is_vm_job():
+            self.logger.error('VM jobs (vsub_args) are not supported by Slurm.')
+            sys.exit(1)
+        exec_dir = self.hpcConfig.get_value('execution_dir')
+        job_script = os.path.basename(experiment.get_job_script())
+        # logs named like Torque's, 'qsub_args' hold sbatch options
+        if experiment.is_array_job():
+            log_name = '{}.{{}}%A-%a'.format(job_script)
+        else:
+            log_name = '{}.{{}}%j'.format(job_script)
+        arg_list = ['--parsable',
+                    '--output={}'.format(log_name.format('o')),
+                    '--error={}'.format(log_name.format('e'))]
+        if experiment.get_qsub_args() is not None:
+            arg_list.append(experiment.get_qsub_args())
+        if experiment.is_array_job():
+            arg_list.append('--array={}'.format(experiment.get_array_request()))
+            if experiment.get_array_values() is not None:
+                arg_list.append("--export=ALL,'HPCWG_ARRAY_VALUES={}'".format(
+                    ' '.join(experiment.get_array_values())))
+        if depends_on:
+            # an array's ID stands for all of its tasks
+            arg_list.append('--kill-on-invalid-dep=yes')
+            arg_list.append('--dependency=afterok:{}'.format(':'.join(
+                job_id.replace('[]', '') for job_id in depends_on)))
+        arg_list.append(job_script)
+        self.logger.info('Batch-System arguments:\n {}'.format(arg_list))
+        return ['cd {};'.format(exec_dir), self.hpcConfig.path_sbatch, arg_list]
+
+
+    def parse_submit_output(self, experiment, ssh_output):
+        # '<job id>[;<cluster>]'
+        match = re.search(r'^(\d+)', ssh_output.strip())
+        if match is None:
+            self.logger.error(
+                "No job id found in ssh-output:\n-----\n{}\n-----\nexiting!".format(ssh_output))
+            sys.exit(1)
+        job_id = match.group(1)
+        return job_id + '[]' if experiment.is_array_job() else job_id
+
+
+    def _to_job_id(self, slurm_id):
+        """'123_4' to '123[4]', pending array '123_[1-5]' to '123[]'."""
+        job_id, sep, index = slurm_id.partition('_')
+        if not sep:
+            return job_id
+        if index.startswith('['):
+            return job_id + '[]'
+        return '{}[{}]'.format(job_id, index)
+
+
+    def _to_exit_status(self, exit_code):
+        """'<code>:<signal>' to a shell like exit status."""
+        code, _, sig = exit_code.partition(':')
+        try:
+            if sig and int(sig):
+                return 128 + int(sig)
+            return int(code)
+        except ValueError:
+            return None
+
+
+    def get_status_command(self, job_ids):
+        slurm_ids = [job_id.replace('[]', '') for job_id in job_ids]
+        return [self.hpcConfig.path_sacct, '-n', '-P', '-o', self.SACCT_FIELDS,
+                '-j', ','.join(slurm_ids)]
+
+
+    def parse_status_output(self, lines):
+        records = {}
+        for line in lines:
+            fields = line.strip().split('|')
+            if len(fields) != 9:
+                continue
+            (slurm_id, state, exit_code, partition, node_list,
+                total_cpu, max_rss, max_vmsize, elapsed) = fields
+            slurm_id, _, step = slurm_id.partition('.')
+            job_id = self._to_job_id(slurm_id)
+            if step:
+                # memory is accounted per step, keep the maximum
+                record = records.get(job_id)
+                if record is not None:
+                    if max_rss:
+                        record.resources_used['mem'] = max_rss
+                    if max_vmsize:
+                        record.resources_used['vmem'] = max_vmsize
+                continue
+            record = JobRecord(job_id)
+            state = state.split(' ')[0]
+            record.state = SLURM_STATES.get(state, 'C')
+            if record.state == 'C':
+                record.exit_status = self._to_exit_status(exit_code)
+            record.queue = partition
+            record.exec_host = node_list
+            record.resources_used = {'cput': total_cpu, 'walltime': elapsed}
+            records[job_id] = record
+        return records.values()
+
+
+    def get_unseen_status_command(self, job_ids):
+        # the accounting lags behind, the queue knows a job right away
+        slurm_ids = [job_id.replace('[]', '') for job_id in job_ids]
+        return [self.hpcConfig.path_squeue, '-h', '-o',
+                "'{}'".format(self.SQUEUE_FORMAT), '-j', ','.join(slurm_ids)]
+
+
+    def parse_unseen_status_output(self, lines):
+        records = []
+        for line in lines:
+            fields = line.strip().split('|')
+            if len(fields) != 4:
+                continue
+            slurm_id, state, partition, node_list = fields
+            record = JobRecord(self._to_job_id(slurm_id))
+            # finished, but not yet accounted with its exit code
+            record.state = SLURM_STATES.get(state, 'E')
+            record.queue = partition
+            record.exec_host = node_list or None
+            records.append(record)
+        return records
+
+
+    def cancel(self, job_ids):
+        self.channel(self.hpcConfig.path_scancel,
+                     [job_id.replace('[]', '') for job_id in job_ids])
+
+
+    def get_start_estimate(self, qsub_args):
+        # scheduling simulation of 'sbatch --test-only', reported on stderr
+        ssh_output = self.channel(
+            'cd {};'.format(self.hpcConfig.get_value('execution_dir')),
+            self.hpcConfig.path_sbatch, '--test-only', qsub_args or '',
+            '--wrap=true', '2>&1')
+        match = re.search(r'to start at (\S+)', str(ssh_output))
+        if match is None:
+            self.logger.warning("No start estimate in sbatch output:\n{}".format(
+                ssh_output))
+            return None
+        start = mktime(strptime(match.group(1), '%Y-%m-%dT%H:%M:%S'))
+        return max(0, start - time())
+
+
+    def get_queue_stats(self):
+        ssh_output = self.channel(self.hpcConfig.path_squeue, '-h', '-o', "'%P %T'")
+        queues = {}
+        for line in str(ssh_output).splitlines():
+            fields = line.split()
+            if len(fields) != 2:
+                continue
+            counts = queues.setdefault(fields[0].rstrip('*'), {
+                'queued': 0, 'running': 0, 'held': 0})
+            state = SLURM_STATES.get(fields[1])
+            if state == 'Q':
+                counts['queued'] += 1
+            elif state == 'H':
+                counts['held'] += 1
+            elif state == 'R':
+                counts['running'] += 1
+        return queues
+
+
+    def get_log_path(self, log_type, experiment, index=None):
+        job_script = os.path.basename(experiment.get_job_script())
+        job_id = experiment.get_stripped_job_id()
+        if index is not None:
+            job_id = '{}-{}'.format(job_id, index)
+        return '{}/{}.{}{}'.format(self.hpcConfig.get_value('execution_dir'),
+                                   job_script,
+                                   self._log_type_string(log_type),
+                                   job_id)
+
+
+class LocalScheduler(Scheduler):
+    """
+    Runs job scripts as local processes (fork-exec), without any queue.
+
+    Used to measure the generator's own overhead, qsub args other than
+    the environment ('-v') are ignored.
+    """
+
+    name = 'local'
+
+    # local jobs of this process, keyed by job ID, until their final
+    # state was polled
+    _jobs = {}
+    # jobs waiting for their dependencies, keyed by job ID
+    _waiting = {}
+    # jobs dropped KEEP_COMPLETED seconds after their final state was
+    # polled, or they were cancelled, keyed by job ID
+    _forgettable = {}
+    _jobs_lock = threading.Lock()
+    _job_numbers = itertools.count(1)
+
+    def _get_exec_dir(self):
+        return os.path.expanduser(self.hpcConfig.get_value('execution_dir'))
+
+
+    def submit(self, experiment, depends_on=None):
+        exec_dir = self._get_exec_dir()
+        job_script = os.path.join(exec_dir,
+                                  os.path.basename(experiment.get_job_script()))
+        dependencies = [dependency.replace('[]', '')
+                        for dependency in depends_on or []]
+        with self._jobs_lock:
+            unknown = [dependency for dependency in dependencies
+                       if not self._get_records(dependency)]
+        if unknown:
+            # like qsub, finished jobs are forgotten after KEEP_COMPLETED
+            self.logger.error("Unknown dependencies: {}".format(', '.join(unknown)))
+            sys.exit(1)
+        with self._jobs_lock:
+            # unique within this host
+            job_id = '{}{:04d}'.format(os.getpid(), next(self._job_numbers))
+        indices = experiment.get_array_indices() or [None]
+        array_values = experiment.get_array_values()
+        job_env = self._get_job_env(experiment.get_qsub_args())
+        for index in indices:
+            sub_job_id = job_id if index is None else '{}[{}]'.format(job_id, index)
+            record = JobRecord(sub_job_id)
+            record.state = 'W'
+            record.queue = self.name
+            with self._jobs_lock:
+                self._jobs[sub_job_id] = (None, None, record)
+        launch = lambda: self._launch(job_id, job_script, indices, array_values,
+                                      job_env)
+        if dependencies:
+            # started by batch_status once all dependencies succeeded
+            with self._jobs_lock:
+                self._waiting[job_id] = (launch, dependencies)
+        else:
+            launch()
+        return job_id + '[]' if experiment.is_array_job() else job_id
+
+
+    def _get_job_env(self, qsub_args):
+        """Variables passed with qsub's '-v A=1,B=2'."""
+        job_env = {}
+        for variables in re.findall(r'(?:^|\s)-v\s+(\S+)', qsub_args or ''):
+            for variable in variables.split(','):
+                name, equals, value = variable.partition('=')
+                # without a value it is taken from the submitting environment
+                job_env[name] = value if equals else os.environ.get(name, '')
+        return job_env
+
+
+    def _launch(self, job_id, job_script, indices, array_values, job_env):
+        """Start the (sub-)jobs of 'job_id' as local processes."""
+        exec_dir = self._get_exec_dir()
+        for index in indices:
+            env = dict(os.environ)
+            env.update(job_env)
+            env['PBS_JOBID'] = job_id
+            env['PBS_O_WORKDIR'] = exec_dir
+            sub_job_id = job_id
+            if index is not None:
+                sub_job_id = '{}[{}]'.format(job_id, index)
+                env['PBS_ARRAYID'] = str(index)
+                if array_values is not None:
+                    env['HPCWG_ARRAY_VALUES'] = ' '.join(array_values)
+            with open(self._get_log_file('STDIN', job_script, job_id, index), 'wb') as out, \
+                    open(self._get_log_file('STDERR', job_script, job_id, index), 'wb') as err:
+                process = subprocess.Popen(['/bin/bash', job_script],
+                                           cwd=exec_dir, env=env,
+                                           stdout=out, stderr=err)
+            with self._jobs_lock:
+                record = self._jobs[sub_job_id][2]
+                record.state = 'R'
+                record.exec_host = 'localhost'
+                self._jobs[sub_job_id] = (process, time(), record)
+
+
+    def _get_records(self, job_id):
+        return [record for (sub_job_id, (process, start_time, record))
+                in self._jobs.items() if sub_job_id.partition('[')[0] == job_id]
+
+
+    def _release_waiting(self):
+        """Start or drop waiting jobs whose dependencies finished."""
+        with self._jobs_lock:
+            waiting = list(self._waiting.items())
+        for job_id, (launch, depends_on) in waiting:
+            with self._jobs_lock:
+                records = [record for dependency in depends_on
+                           for record in self._get_records(dependency)]
+            if any(record.state == 'C' and record.exit_status != 0
+                   for record in records):
+                # like Torque, the job is removed
+                self.logger.info("Dependency of job '{}' failed.".format(job_id))
+                with self._jobs_lock:
+                    del self._waiting[job_id]
+                    for record in self._get_records(job_id):
+                        record.state = 'C'
+            elif all(record.state == 'C' for record in records):
+                with self._jobs_lock:
+                    del self._waiting[job_id]
+                launch()
+
+
+    def _update(self, process, start_time, record):
+        """Reap the process if it has finished."""
+        if process is None or record.state == 'C':
+            return
+        pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+        if pid == 0:
+            record.resources_used['walltime'] = _format_duration(time() - start_time)
+            return
+        if os.WIFSIGNALED(status):
+            process.returncode = 128 + os.WTERMSIG(status)
+        else:
+            process.returncode = os.WEXITSTATUS(status)
+        record.state = 'C'
+        record.exit_status = process.returncode
+        record.resources_used = {
+            'cput': _format_duration(rusage.ru_utime + rusage.ru_stime),
+            'mem': '{}kb'.format(rusage.ru_maxrss),
+            'walltime': _format_duration(time() - start_time)
+        }
+
+
+    def batch_status(self, job_ids):
+        wanted = set(job_id.replace('[]', '') for job_id in job_ids)
+        # update the dependencies first
+        with self._jobs_lock:
+            jobs = list(self._jobs.values())
+        for process, start_time, record in jobs:
+            self._update(process, start_time, record)
+        self._release_waiting()
+        with self._jobs_lock:
+            jobs = [(job_id, job) for (job_id, job) in self._jobs.items()
+                    if job_id.partition('[')[0] in wanted]
+        for job_id, (process, start_time, record) in jobs:
+            self._update(process, start_time, record)
+            yield record
+        self._forget_finished(wanted)
+
+
+    def _forget_finished(self, job_ids):
+        """
+        Drop the finished jobs a while after their final state was polled,
+        like Torque's keep_completed, unless a waiting job depends on them.
+        """
+        now = time()
+        with self._jobs_lock:
+            for job_id in job_ids:
+                if self._is_finished(job_id):
+                    self._forgettable.setdefault(job_id, now)
+            dependencies = set(dependency for (launch, depends_on)
+                               in self._waiting.values()
+                               for dependency in depends_on)
+            for job_id, since in list(self._forgettable.items()):
+                if (now - since < KEEP_COMPLETED or job_id in dependencies or
+                        not self._is_finished(job_id)):
+                    continue
+                for record in self._get_records(job_id):
+                    del self._jobs[record.job_id]
+                del self._forgettable[job_id]
+
+
+    def _is_finished(self, job_id):
+        records = self._get_records(job_id)
+        return all(record.state == 'C' for record in records)
+
+
+    def cancel(self, job_ids):
+        wanted = set(job_id.replace('[]', '') for job_id in job_ids)
+        with self._jobs_lock:
+            jobs = [job for (job_id, job) in self._jobs.items()
+                    if job_id.partition('[')[0] in wanted]
+        for process, start_time, record in jobs:
+            if process is None:
+                record.state = 'C'
+            elif record.state != 'C':
+                process.send_signal(signal.SIGTERM)
+        with self._jobs_lock:
+            for job_id in wanted:
+                self._waiting.pop(job_id, None)
+            # nobody polls them anymore
+            for job_id in wanted:
+                self._forgettable.setdefault(job_id, time())
+
+
+    def get_queue_stats(self):
+        # no queue, jobs wait only for their dependencies
+        with self._jobs_lock:
+            held = len(self._waiting)
+            running = sum(1 for (process, start_time, record)
+                          in self._jobs.values() if record.state == 'R')
+        return {'local': {'queued': 0, 'running': running, 'held': held}}
+
+
+    def get_start_estimate(self, qsub_args):
+        # started right away
+        return 0
+
+
+    def _get_log_file(self, log_type, job_script, job_id, index=None):
+        if index is not None:
+            job_id = '{}-{}'.format(job_id, index)
+        return os.path.join(self._get_exec_dir(), '{}.{}{}'.format(
+            os.path.basename(job_script), self._log_type_string(log_type),
+            job_id))
+
+
+    def get_log_path(self, log_type, experiment, index=None):
+        return self._get_log_file(log_type, experiment.get_job_script(),
+                                  experiment.get_stripped_job_id(), index)
+
+
+SCHEDULERS = {
+    TorqueScheduler.name: TorqueScheduler,
+    SlurmScheduler.name: SlurmScheduler,
+    LocalScheduler.name: LocalScheduler
+}
+
+
+def get_scheduler(hpcConfig, channel):
+    """Scheduler selected by the config's 'scheduler' key."""
+    name = hpcConfig.scheduler
+    if name not in SCHEDULERS:
+        getLogger(__name__).error(
+            "Unknown scheduler '{}', expected one of {}.".format(
+                name, ', '.join(sorted(SCHEDULERS))))
+        sys.exit(1)
+    return SCHEDULERS[name](hpcConfig, channel)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Persistent, multiplexed SSH channel to the HPC front-end"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import getpass
+import hashlib
+import tempfile
+import threading
+
+from time import time
+from sh import ssh, bash, ErrorReturnCode
+
+from api.logger import getLogger, muteSH
+
+
+# exit code used by ssh itself for connection errors
+SSH_CONNECTION_ERROR = 255
+
+# seconds the master connection stays alive when idle
+CONTROL_PERSIST = 600
+
+# seconds between two health checks of the master connection
+HEALTH_CHECK_INTERVAL = 30
+
+
+# all open channels of this process, keyed by (host, user, port, key)
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def _flatten(args):
+    """Words of a command given as sh arguments, lists included."""
+    words = []
+    for arg in args:
+        if isinstance(arg, (list, tuple)):
+            words.extend(str(word) for word in arg)
+        else:
+            words.append(str(arg))
+    return words
+
+
+class SSHChannel(object):
+    """
+    One long-lived OpenSSH master connection (ControlMaster), shared by
+    all commands sent to the same host/user/port/key.
+
+    Commands are sent through the master's control socket, thus only the
+    first command (and reconnects) pay for the TCP and key handshake.
+    """
+
+    def __init__(self, host, user_name, ssh_port, ssh_key):
+        """Initialize the channel, the connection is opened lazily."""
+        self.logger = getLogger(__name__)
+        muteSH()
+        self.host = host
+        self.user_name = user_name
+        self.ssh_port = str(ssh_port)
+        self.ssh_key = ssh_key
+        # control socket, unix sockets are limited to ~100 chars
+        digest = hashlib.sha1('{}@{}:{}:{}'.format(
+            user_name, host, ssh_port, ssh_key).encode('utf-8')).hexdigest()
+        self.control_path = os.path.join(
+            tempfile.gettempdir(), 'hpcwg-{}.sock'.format(digest[:16]))
+        self.ssh_options = [
+            '-o', 'ControlMaster=auto',
+            '-o', 'ControlPath={}'.format(self.control_path),
+            '-o', 'ControlPersist={}'.format(CONTROL_PERSIST),
+            '-o', 'BatchMode=yes',
+            '-l', self.user_name,
+            '-p', self.ssh_port,
+            '-i', self.ssh_key]
+        # statistics
+        self.handshakes = 0
+        self.commands = 0
+        self.reconnects = 0
+        self._last_check = 0
+        self._lock = threading.Lock()
+        # the channel is shared by all threads of the process
+        self._stats_lock = threading.Lock()
+
+
+    def count_command(self):
+        with self._stats_lock:
+            self.commands += 1
+
+
+    def _is_alive(self):
+        """Ask the local master process if it is still connected."""
+        try:
+            ssh(self.ssh_options, '-O', 'check', self.host)
+            return True
+        except ErrorReturnCode:
+            return False
+
+
+    def _connect(self):
+        """Open the master connection in the background."""
+        self.logger.debug("Opening SSH master connection to '%s@%s:%s'",
+                          self.user_name, self.host, self.ssh_port)
+        try:
+            ssh(self.ssh_options, '-M', '-N', '-f', self.host)
+        except ErrorReturnCode as e:
+            self.logger.error('SSH initialization failed:\n{}'.format(e.stderr))
+            raise e
+        self.handshakes += 1
+        self._last_check = time()
+
+
+    def is_connected(self):
+        """Check the master connection now, without reconnecting."""
+        with self._lock:
+            return self._is_alive()
+
+
+    def ensure_connected(self, force_check=False):
+        """Health check, reconnects if the master connection is gone."""
+        with self._lock:
+            if not force_check and time() - self._last_check < HEALTH_CHECK_INTERVAL:
+                return
+            if self._is_alive():
+                self._last_check = time()
+            else:
+                if self.handshakes > 0:
+                    self.reconnects += 1
+                    self.logger.warning(
+                        "SSH master connection to '%s' lost, reconnecting.",
+                        self.host)
+                self._connect()
+
+
+    def __call__(self, *args, **kwargs):
+        """
+        Execute a remote command, signature equals a baked sh.ssh.
+
+        A command exiting with ssh's connection error is run once more if
+        the master connection turns out to be lost, unless '_retry' is
+        False, e.g. for job submissions that must never run twice. With
+        the master still alive the exit code is the remote command's own.
+        """
+        retry = kwargs.pop('_retry', True)
+        self.ensure_connected()
+        self.count_command()
+        try:
+            return ssh(self.ssh_options, '-n', self.host, *args, **kwargs)
+        except ErrorReturnCode as e:
+            if (not retry or e.exit_code != SSH_CONNECTION_ERROR or
+                    self.is_connected()):
+                raise e
+            # connection broke, retry once with a fresh master
+            self.logger.debug("SSH command failed with code '%s', retrying.",
+                              e.exit_code)
+            self.ensure_connected(force_check=True)
+            self.count_command()
+            return ssh(self.ssh_options, '-n', self.host, *args, **kwargs)
+
+
+    def get_process_args(self, *args):
+        """
+        Argument vector, working dir and environment of a local process
+        running the remote command, e.g. for asyncio subprocesses.
+        """
+        return ['ssh'] + self.ssh_options + ['-n', self.host] + _flatten(args), \
+            None, None
+
+
+    def rsync_shell(self):
+        """Remote shell for 'rsync -e', reuses the master connection."""
+        self.ensure_connected()
+        self.count_command()
+        return 'ssh {}'.format(' '.join(
+            "'{}'".format(opt) if ' ' in opt else opt
+            for opt in self.ssh_options))
+
+
+    def rsync_args(self):
+        """Arguments for rsync to use this channel."""
+        return ['-e', self.rsync_shell()]
+
+
+    def rsync_target(self, remote_path):
+        """Destination argument for rsync."""
+        return '{}@{}:{}'.format(self.user_name, self.host, remote_path)
+
+
+    def close(self):
+        """Terminate the master connection."""
+        with self._lock:
+            if self.handshakes == 0 or not self._is_alive():
+                return
+            self.logger.debug("Closing SSH master connection to '%s'", self.host)
+            try:
+                ssh(self.ssh_options, '-O', 'exit', self.host)
+            except ErrorReturnCode as e:
+                self.logger.warning(
+                    'Closing SSH connection failed:\n{}'.format(e.stderr))
+            self._last_check = 0
+        self.logger.info(
+            "SSH channel '%s': %s handshake(s) for %s command(s).",
+            self.host, self.handshakes, self.commands)
+
+
+    def get_stats(self):
+        return {
+            'handshakes': self.handshakes,
+            'reconnects': self.reconnects,
+            'commands': self.commands
+        }
+
+
+class LocalChannel(object):
+    """
+    Runs 'remote' commands in a local shell, same interface as
+    SSHChannel, used by the local scheduler.
+    """
+
+    user_name = getpass.getuser()
+    host = 'localhost'
+
+    def __init__(self, home=None, env=None):
+        """Initialize the channel, 'home' is the commands' working dir."""
+        self.logger = getLogger(__name__)
+        self.home = home or os.path.expanduser('~')
+        self.env = env
+        self.commands = 0
+        self._stats_lock = threading.Lock()
+
+
+    def count_command(self):
+        with self._stats_lock:
+            self.commands += 1
+
+
+    def is_connected(self):
+        return True
+
+
+    def ensure_connected(self, force_check=False):
+        pass
+
+
+    def _join(self, args):
+        return ' '.join(_flatten(args))
+
+
+    def __call__(self, *args, **kwargs):
+        """Execute the command with bash in the home dir, like ssh does."""
+        kwargs.pop('_retry', None)
+        self.count_command()
+        if self.env is not None:
+            kwargs.setdefault('_env', self.env)
+        return bash('-c', self._join(args), _cwd=self.home, **kwargs)
+
+
+    def get_process_args(self, *args):
+        return ['bash', '-c', self._join(args)], self.home, self.env
+
+
+    def rsync_args(self):
+        return []
+
+
+    def rsync_target(self, remote_path):
+        if remote_path.startswith('~'):
+            remote_path = remote_path[1:].lstrip('/')
+        return os.path.join(self.home, remote_path)
+
+
+    def close(self):
+        pass
+
+
+    def get_stats(self):
+        return {
+            'handshakes': 0,
+            'reconnects': 0,
+            'commands': self.commands
+        }
+
+
+def get_channel(hpcConfig):
+    """Get the process-wide channel for the given HPC back-end config."""
+    if hpcConfig.scheduler == 'local':
+        key = ('localhost',)
+        with _channels_lock:
+            if key not in _channels:
+                _channels[key] = LocalChannel()
+            return _channels[key]
+    key = (hpcConfig.get_value('host'),
+           hpcConfig.get_value('user_name'),
+           str(hpcConfig.get_value('ssh_port')),
+           hpcConfig.get_value('ssh_key'))
+    with _channels_lock:
+        if key not in _channels:
+            _channels[key] = SSHChannel(*key)
+        return _channels[key]
+
+
+def close_all():
+    """Close all channels opened by this process."""
+    with _channels_lock:
+        channels = list(_channels.values())
+        _channels.clear()
+    for channel in channels:
+        channel.close()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Content-addressed, incremental stage-in"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import json
+import hashlib
+import tempfile
+import posixpath
+
+from timeit import default_timer
+from sh import ErrorReturnCode, rsync
+
+from api.logger import getLogger
+
+
+# name of the remote manifest, placed next to the staged file or dir
+REMOTE_MANIFEST = '.hpcwg_manifest_{}.json'
+
+# read buffer for hashing
+CHUNK_SIZE = 1024 * 1024
+
+
+
+def file_hash(path):
+    """SHA-1 of a file's content."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as data_file:
+        for chunk in iter(lambda: data_file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_manifest(local_path, cache_dir):
+    """
+    Manifest of all files, keyed by path relative to the parent.
+
+    Entries of unchanged files (size, mtime) are taken from the cache in
+    'cache_dir' instead of hashing the files again.
+    """
+    parent = os.path.dirname(local_path)
+    cache_file = os.path.join(cache_dir, '{}.json'.format(
+        hashlib.sha1(local_path.encode('utf-8')).hexdigest()))
+    try:
+        with open(cache_file, 'r') as data_file:
+            cached = json.load(data_file)
+    except (IOError, ValueError):
+        cached = {}
+
+    if os.path.isdir(local_path):
+        paths = []
+        for dir_path, dir_names, file_names in os.walk(local_path):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                paths.append(os.path.join(dir_path, file_name))
+    else:
+        paths = [local_path]
+
+    manifest = {}
+    for path in paths:
+        rel_path = os.path.relpath(path, parent)
+        stat = os.stat(path)
+        entry = cached.get(rel_path)
+        if (entry is None or entry['size'] != stat.st_size or
+                entry['mtime'] != stat.st_mtime):
+            entry = {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'sha1': file_hash(path)
+            }
+        manifest[rel_path] = entry
+
+    # update the local cache
+    if manifest != cached:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(cache_file, 'w') as data_file:
+            json.dump(manifest, data_file, sort_keys=True)
+    return manifest
+
+
+class IncrementalStager(object):
+    """
+    Stages a file or directory to the execution dir, sending only what
+    changed since the last stage-in.
+
+    A local manifest (path, size, mtime, content hash) is cached per staged
+    path, thus unchanged files are not re-hashed. The remote manifest in
+    the execution dir records what has been staged; if it equals the local
+    one the transfer is skipped entirely.
+    """
+
+    def __init__(self, channel, execution_dir, cache_dir):
+        """Initialize the stager."""
+        self.logger = getLogger(__name__)
+        self.channel = channel
+        self.execution_dir = execution_dir
+        self.cache_dir = os.path.expanduser(cache_dir)
+
+
+    def stage(self, local_path):
+        """Stage the given file or directory, returns the statistics."""
+        local_path = local_path.rstrip('/')
+        name = os.path.basename(local_path)
+        parent = os.path.dirname(local_path)
+        stats = {'stage_ins': 1}
+
+        # local manifest
+        start = default_timer()
+        manifest = self._build_manifest(local_path)
+        stats['seconds_hashing'] = default_timer() - start
+        stats['files_total'] = len(manifest)
+        stats['bytes_total'] = sum(entry['size'] for entry in manifest.values())
+
+        # compare against the remote manifest
+        remote_manifest_path = posixpath.join(
+            self.execution_dir, REMOTE_MANIFEST.format(name))
+        remote_manifest = self._get_remote_manifest(remote_manifest_path)
+        changed = sorted(
+            path for (path, entry) in manifest.items()
+            if remote_manifest.get(path, {}).get('sha1') != entry['sha1'])
+        stats['files_sent'] = len(changed)
+        stats['bytes_sent'] = sum(manifest[path]['size'] for path in changed)
+        stats['bytes_saved'] = stats['bytes_total'] - stats['bytes_sent']
+
+        start = default_timer()
+        if not changed:
+            stats['skipped'] = 1
+            self.logger.info("'{}' unchanged, skipping stage-in.".format(name))
+        else:
+            self.logger.debug("Staging {} of {} file(s) of '{}'".format(
+                len(changed), len(manifest), name))
+            self._transfer(parent, changed)
+            self._put_remote_manifest(name, manifest)
+        stats['seconds_transfer'] = default_timer() - start
+
+        self.logger.info(
+            "Stage-in of '{}': {} of {} file(s), {} byte(s) sent, {} byte(s) "
+            "saved, {:.2f}s hashing, {:.2f}s transfer.".format(
+                name, stats['files_sent'], stats['files_total'],
+                stats['bytes_sent'], stats['bytes_saved'],
+                stats['seconds_hashing'], stats['seconds_transfer']))
+        return stats
+
+
+    def _build_manifest(self, local_path):
+        """Manifest of all files, keyed by path relative to the parent."""
+        return build_manifest(local_path, self.cache_dir)
+
+
+    def _get_remote_manifest(self, remote_path):
+        """Manifest of the last stage-in, empty if there is none."""
+        try:
+            remote_manifest = self.channel('cat', remote_path, _ok_code=[0, 1])
+            return json.loads(str(remote_manifest) or '{}')
+        except (ErrorReturnCode, ValueError) as e:
+            self.logger.debug(
+                "No usable remote manifest '{}': {}".format(remote_path, e))
+            return {}
+
+
+    def _transfer(self, parent, rel_paths):
+        """Send the given files, relative to 'parent'."""
+        files_from = tempfile.NamedTemporaryFile(
+            mode='w', suffix='.files', delete=False)
+        try:
+            with files_from:
+                files_from.write('\n'.join(rel_paths) + '\n')
+            rsync_output = rsync(
+                '-pzv', self.channel.rsync_args(),
+                '--files-from={}'.format(files_from.name),
+                parent + '/', self.channel.rsync_target(self.execution_dir))
+            self.logger.debug("rsync output:\n{}".format(rsync_output))
+        finally:
+            os.remove(files_from.name)
+
+
+    def _put_remote_manifest(self, name, manifest):
+        """Record the staged state next to the staged data."""
+        manifest_dir = tempfile.mkdtemp()
+        manifest_path = os.path.join(manifest_dir, REMOTE_MANIFEST.format(name))
+        try:
+            with open(manifest_path, 'w') as data_file:
+                json.dump(manifest, data_file, sort_keys=True)
+            rsync('-p', self.channel.rsync_args(), manifest_path,
+                  self.channel.rsync_target(self.execution_dir))
+        finally:
+            os.remove(manifest_path)
+            os.rmdir(manifest_dir)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Choice of the qsub args with the earliest predicted completion"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import threading
+
+from sh import ErrorReturnCode
+
+from api.logger import getLogger
+from api.poll_strategy import parse_walltime
+
+
+# weight of the latest measured wait in the moving average
+QUEUED_JOB_TIME_WEIGHT = 0.3
+
+# measured wait per queued job, keyed by (scheduler poll key, queue)
+_queued_job_times = {}
+_times_lock = threading.Lock()
+
+
+class SubmitPlanner(object):
+    """
+    Picks the declared qsub args or one of the workload's alternatives,
+    the one with the earliest predicted completion (start plus walltime).
+
+    The start is predicted by the batch system if it can ('showstart',
+    'sbatch --test-only'), else from the jobs queued in the requested
+    queue ('qstat -Q'), each assumed to delay the start by
+    'planner_queued_job_time' seconds until waits were measured.
+    """
+
+    def __init__(self, scheduler):
+        """Initialize the planner for the scheduler's batch system."""
+        self.logger = getLogger(__name__)
+        self.scheduler = scheduler
+        self.default_job_time = float(
+            scheduler.hpcConfig.planner_queued_job_time)
+
+
+    def _get_job_time_key(self, queue):
+        return (self.scheduler.get_poll_key(), queue)
+
+
+    def _get_queued_job_time(self, queue):
+        with _times_lock:
+            return _queued_job_times.get(self._get_job_time_key(queue),
+                                         self.default_job_time)
+
+
+    def _predict_start(self, qsub_args, queue_stats):
+        """Predicted seconds until the start, its source and the queued jobs."""
+        try:
+            estimate = self.scheduler.get_start_estimate(qsub_args)
+        except ErrorReturnCode as e:
+            self.logger.warning('Start estimate failed:\n{}'.format(e.stderr))
+            estimate = None
+        if estimate is not None:
+            return estimate, 'estimate', None
+        if queue_stats is None:
+            return None, None, None
+        queue = self.scheduler.get_queue(qsub_args)
+        if queue in queue_stats:
+            queued = queue_stats[queue]['queued']
+        else:
+            queued = sum(counts['queued'] for counts in queue_stats.values())
+        return ((queued + 1) * self._get_queued_job_time(queue), 'queue',
+                queued)
+
+
+    def plan(self, experiment):
+        """Set the experiment's plan, the qsub args it is submitted with."""
+        candidates = experiment.get_alternatives()
+        if experiment.get_declared_qsub_args() is not None:
+            candidates = [experiment.get_declared_qsub_args()] + candidates
+        try:
+            queue_stats = self.scheduler.get_queue_stats()
+        except (ErrorReturnCode, NotImplementedError) as e:
+            self.logger.warning('Queue state unknown: {}'.format(
+                getattr(e, 'stderr', e)))
+            queue_stats = None
+        predictions = []
+        for qsub_args in candidates:
+            start, source, queued = self._predict_start(qsub_args, queue_stats)
+            completion = None
+            if start is not None:
+                completion = start + (parse_walltime(qsub_args) or 0)
+            predictions.append({
+                'qsub_args': qsub_args,
+                'queue': self.scheduler.get_queue(qsub_args),
+                'queued': queued,
+                'source': source,
+                'predicted_start': start,
+                'predicted_completion': completion
+            })
+        predicted = [prediction for prediction in predictions
+                     if prediction['predicted_completion'] is not None]
+        # without any prediction the declared args are kept
+        chosen = min(predicted, key=lambda prediction: (
+            prediction['predicted_completion'])) if predicted else predictions[0]
+        plan = dict(chosen)
+        plan['alternatives'] = predictions
+        plan['actual_start'] = None
+        experiment.set_plan(plan)
+        self.logger.info(
+            "Workload '{}' planned with qsub args '{}', predicted start in {} "
+            "({}), completion in {}; alternatives: {}".format(
+                experiment.get_name(), chosen['qsub_args'],
+                _format_seconds(chosen['predicted_start']), chosen['source'],
+                _format_seconds(chosen['predicted_completion']),
+                '; '.join("'{}' {}".format(
+                    prediction['qsub_args'],
+                    _format_seconds(prediction['predicted_completion']))
+                    for prediction in predictions)))
+
+
+    def report(self, experiment):
+        """Log the predicted next to the actual start of a finished job."""
+        plan = experiment.get_plan()
+        if plan is None:
+            return
+        timer = experiment.get_phase_timer()
+        running = timer.events.get('running')
+        submitted = timer.started.get('submit')
+        if running is None or submitted is None:
+            self.logger.info(
+                "Workload '{}' was never seen running, predicted start in "
+                "{}.".format(experiment.get_name(),
+                             _format_seconds(plan['predicted_start'])))
+            return
+        plan['actual_start'] = running - submitted
+        self.logger.info(
+            "Workload '{}' started after {}, predicted {} ({}).".format(
+                experiment.get_name(), _format_seconds(plan['actual_start']),
+                _format_seconds(plan['predicted_start']), plan['source']))
+        if plan['source'] == 'queue':
+            # learn the queue's wait per queued job
+            key = self._get_job_time_key(plan['queue'])
+            job_time = plan['actual_start'] / (plan['queued'] + 1)
+            with _times_lock:
+                if key in _queued_job_times:
+                    job_time = _queued_job_times[key] + QUEUED_JOB_TIME_WEIGHT * (
+                        job_time - _queued_job_times[key])
+                _queued_job_times[key] = job_time
+
+
+def _format_seconds(seconds):
+    return 'unknown' if seconds is None else '{:.0f}s'.format(seconds)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Lazy parameter sweep expansion"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import re
+import sys
+import json
+import random
+import hashlib
+import itertools
+
+from api.logger import getLogger
+from api.experiment_config import ExperimentConfig
+
+
+# lazy range and zip for python 2 and 3
+try:
+    _range = xrange
+    _zip = itertools.izip
+except NameError:
+    _range = range
+    _zip = zip
+
+
+# keys of the sweep definition that are no sweep axes
+SWEEP_OPTIONS = ('mode', 'samples', 'seed')
+
+# supported expansion modes
+SWEEP_MODES = ('product', 'zip', 'sample')
+
+logger = getLogger(__name__)
+
+
+class SweepWorkload(object):
+    """Workload definition of one sweep point, as scotty would pass it."""
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+
+
+def _axis_values(values):
+    """Indexable, lazy values of one sweep axis."""
+    if isinstance(values, dict) and 'range' in values:
+        # [start, stop] or [start, stop, step], stop inclusive
+        bounds = [int(bound) for bound in values['range']]
+        step = bounds[2] if len(bounds) > 2 else 1
+        return _range(bounds[0], bounds[1] + (1 if step > 0 else -1), step)
+    if isinstance(values, (list, tuple)):
+        return values
+    # a single fixed value
+    return [values]
+
+
+def _get_axes(sweepCfg):
+    """List of (axis, values), environment variables as 'env.<name>'."""
+    axes = []
+    for key in sorted(sweepCfg):
+        if key in SWEEP_OPTIONS:
+            continue
+        if key == 'env':
+            for var in sorted(sweepCfg['env']):
+                axes.append(('env.' + var, _axis_values(sweepCfg['env'][var])))
+        else:
+            axes.append((key, _axis_values(sweepCfg[key])))
+    return axes
+
+
+def _iter_points(sweepCfg):
+    """Generate the sweep points as dicts of axis to value."""
+    mode = sweepCfg.get('mode', 'product')
+    if mode not in SWEEP_MODES:
+        logger.error("Unknown sweep mode '{}', expected one of {}.".format(
+            mode, ', '.join(SWEEP_MODES)))
+        sys.exit(1)
+    axes = _get_axes(sweepCfg)
+    names = [name for (name, values) in axes]
+    values = [values for (name, values) in axes]
+
+    if mode == 'product':
+        combinations = itertools.product(*values)
+    elif mode == 'zip':
+        # axes of a single value, e.g. a fixed walltime, apply to all points
+        lengths = set(len(axis) for axis in values if len(axis) != 1)
+        if len(lengths) > 1:
+            raise ValueError(
+                "Sweep axes of mode 'zip' differ in length: {}.".format(
+                    ', '.join('{} ({})'.format(name, len(axis))
+                              for (name, axis) in axes)))
+        length = lengths.pop() if lengths else 1
+        combinations = _zip(*[
+            itertools.repeat(axis[0], length) if len(axis) == 1 else axis
+            for axis in values])
+    else:
+        # sample from the cartesian product without materializing it
+        sizes = [len(axis) for axis in values]
+        total = 1
+        for size in sizes:
+            total *= size
+        samples = min(int(sweepCfg.get('samples', total)), total)
+        rand = random.Random(sweepCfg.get('seed'))
+        combinations = (
+            _decode_index(index, values, sizes)
+            for index in rand.sample(_range(total), samples))
+
+    for combination in combinations:
+        yield dict(_zip(names, combination))
+
+
+def _decode_index(index, values, sizes):
+    """Point of the cartesian product with the given flat index."""
+    point = []
+    for axis, size in reversed(list(_zip(values, sizes))):
+        index, offset = divmod(index, size)
+        point.append(axis[offset])
+    return tuple(reversed(point))
+
+
+def get_sweep_id(point):
+    """Stable ID derived from the point's parameters."""
+    return hashlib.sha1(
+        json.dumps(point, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def _set_arg(args, flag, key, value):
+    """Replace 'key=...' in args or append '<flag> key=value'."""
+    args = args or ''
+    # 'nodes=1:ppn=4' ends at the colon, 'walltime=01:00:00' does not
+    value_chars = r'[^,\s]+' if key == 'walltime' else r'[^:,\s]+'
+    pattern = r'(?<![\w.]){}={}'.format(re.escape(key), value_chars)
+    if re.search(pattern, args):
+        return re.sub(pattern, '{}={}'.format(key, value), args)
+    return '{} {} {}={}'.format(args, flag, key, value).strip()
+
+
+def _set_env(args, env):
+    """Add the (name, value) pairs to the '-v' list of args or append one."""
+    args = args or ''
+    # qsub takes the last '-v' only, thus there must be only one
+    match = re.search(r'(?<!\S)-v\s+(\S+)', args)
+    assignments = ['{}={}'.format(name, value) for (name, value) in env]
+    if match is None:
+        return '{} -v {}'.format(args, ','.join(assignments)).strip()
+    names = set(name for (name, value) in env)
+    kept = [assignment for assignment in match.group(1).split(',')
+            if assignment.split('=', 1)[0] not in names]
+    return '{}{}{}'.format(args[:match.start(1)], ','.join(kept + assignments),
+                           args[match.end(1):])
+
+
+def render_point(params, point):
+    """Workload params with the sweep point applied to qsub/vsub args."""
+    params = dict((key, value) for (key, value) in params.items()
+                  if key != 'sweep')
+    qsub_args = params.get('qsub_args')
+    vsub_args = params.get('vsub_args')
+    env = []
+    for key in sorted(point):
+        value = point[key]
+        if key == 'nodes':
+            qsub_args = _set_arg(qsub_args, '-l', 'nodes', value)
+        elif key == 'walltime':
+            qsub_args = _set_arg(qsub_args, '-l', 'walltime', value)
+        elif key in ('vcpus', 'ram'):
+            vsub_args = _set_arg(vsub_args, '-vm', key, value)
+        elif key.startswith('env.'):
+            env.append((key[len('env.'):], value))
+        else:
+            logger.error("Unknown sweep parameter '{}'.".format(key))
+            sys.exit(1)
+    if env:
+        qsub_args = _set_env(qsub_args, env)
+    if qsub_args is not None:
+        params['qsub_args'] = qsub_args
+    if vsub_args is not None:
+        params['vsub_args'] = vsub_args
+    return params
+
+
+def is_sweep(workloadDef):
+    return 'sweep' in workloadDef.params
+
+
+def iter_experiment_configs(workloadDef):
+    """
+    Lazily generate one ExperimentConfig per sweep point.
+
+    The HPC back-end config is loaded once and shared by all generated
+    configs, only the current point is held in memory.
+    """
+    sweepCfg = workloadDef.params['sweep']
+    hpcConfig = None
+    count = 0
+    for point in _iter_points(sweepCfg):
+        sweepId = get_sweep_id(point)
+        experimentCfg = ExperimentConfig(
+            SweepWorkload('{}-{}'.format(workloadDef.name, sweepId),
+                          render_point(workloadDef.params, point)),
+            hpcConfig=hpcConfig)
+        experimentCfg.set_sweep_point(sweepId, point)
+        hpcConfig = experimentCfg.get_base_hpc_config()
+        count += 1
+        yield experimentCfg
+    logger.info("Sweep '{}' expanded into {} experiment(s).".format(
+        workloadDef.name, count))
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Selection of the least loaded submission target"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import threading
+
+from time import time
+from sh import ErrorReturnCode
+
+from api.logger import getLogger
+from api.ssh_channel import get_channel
+from api.scheduler import get_scheduler
+
+
+# weight of the latest turnaround in the moving average
+TURNAROUND_WEIGHT = 0.3
+
+# selectors keyed by the id of their HPC config
+_selectors = {}
+# selected target of each unfinished experiment
+_selections = {}
+_registry_lock = threading.Lock()
+
+
+class TargetStats(object):
+    """Load and history of one submission target."""
+
+    def __init__(self, target):
+        self.target = target
+        self.scheduler = get_scheduler(target, get_channel(target))
+        # last 'qstat -Q' (or equivalent) result and its time
+        self.queue_stats = None
+        self.queue_time = None
+        self.reachable = True
+        self.selected = 0
+        self.in_flight = 0
+        self.finished = 0
+        # exponential moving average of the turnaround in seconds
+        self.turnaround = None
+
+
+    def get_queued(self, queue):
+        """Jobs waiting in the queue, in all queues if none is given."""
+        if not self.queue_stats:
+            return 0
+        if queue is not None and queue in self.queue_stats:
+            return self.queue_stats[queue]['queued']
+        return sum(counts['queued'] for counts in self.queue_stats.values())
+
+
+    def to_dict(self):
+        return {
+            'reachable': self.reachable,
+            'queued': self.get_queued(None),
+            'in_flight': self.in_flight,
+            'selected': self.selected,
+            'finished': self.finished,
+            'turnaround': self.turnaround
+        }
+
+
+class TargetSelector(object):
+    """
+    Picks one of the submission targets of an HPC config for each
+    workload, the one with the least expected time to completion.
+
+    A target's score is the number of jobs ahead of a new one (queued in
+    the batch system plus submitted by this process but not finished yet)
+    times its average turnaround. Queue depths are queried at most every
+    'target_load_max_age' seconds per target, unreachable targets are
+    only used if no target is reachable.
+    """
+
+    def __init__(self, hpcConfig):
+        """Initialize the selector of the config's targets."""
+        self.logger = getLogger(__name__)
+        self.max_age = hpcConfig.target_load_max_age
+        self.stats = [TargetStats(target) for target in hpcConfig.targets]
+        self._lock = threading.Lock()
+
+
+    def _update_queue_stats(self, stats):
+        now = time()
+        if stats.queue_time is not None and now - stats.queue_time < self.max_age:
+            return
+        stats.queue_time = now
+        try:
+            stats.queue_stats = stats.scheduler.get_queue_stats()
+            stats.reachable = True
+        except (ErrorReturnCode, NotImplementedError) as e:
+            self.logger.warning("Queue state of target '{}' unknown: {}".format(
+                stats.target.target_name, getattr(e, 'stderr', e)))
+            stats.queue_stats = None
+            stats.reachable = False
+
+
+    def _get_score(self, stats, queue, default_turnaround):
+        turnaround = stats.turnaround
+        if turnaround is None:
+            turnaround = default_turnaround
+        return (stats.get_queued(queue) + stats.in_flight + 1) * turnaround
+
+
+    def select(self, experiment, target=None):
+        """Target for the experiment, or count it for the given target."""
+        with self._lock:
+            for stats in self.stats:
+                self._update_queue_stats(stats)
+            if target is not None:
+                chosen = [stats for stats in self.stats
+                          if stats.target is target][0]
+            else:
+                # unmeasured targets are assumed to be average
+                known = [stats.turnaround for stats in self.stats
+                         if stats.turnaround is not None]
+                default_turnaround = sum(known) / len(known) if known else 1.0
+                candidates = ([stats for stats in self.stats if stats.reachable]
+                              or self.stats)
+                chosen = min(candidates, key=lambda stats: self._get_score(
+                    stats, stats.scheduler.get_queue(experiment.get_qsub_args()),
+                    default_turnaround))
+            chosen.selected += 1
+            chosen.in_flight += 1
+            self._log_stats("Workload '{}' assigned to target '{}'".format(
+                experiment.get_name(), chosen.target.target_name))
+        return chosen.target
+
+
+    def release(self, target, turnaround=None):
+        """Count a finished job of the target, with its turnaround in seconds."""
+        with self._lock:
+            for stats in self.stats:
+                if stats.target is not target:
+                    continue
+                stats.in_flight -= 1
+                stats.finished += 1
+                if turnaround is not None:
+                    if stats.turnaround is None:
+                        stats.turnaround = float(turnaround)
+                    else:
+                        stats.turnaround += TURNAROUND_WEIGHT * (
+                            turnaround - stats.turnaround)
+                self._log_stats("Job finished on target '{}'".format(
+                    target.target_name))
+
+
+    def get_stats(self):
+        """Statistics of all targets, keyed by target name."""
+        with self._lock:
+            return dict((stats.target.target_name, stats.to_dict())
+                        for stats in self.stats)
+
+
+    def _log_stats(self, message):
+        self.logger.info('{}, targets: {}'.format(message, '; '.join(
+            "{} (queued {}, in flight {}, selected {}, finished {}, "
+            "turnaround {}{})".format(
+                stats.target.target_name, stats.get_queued(None),
+                stats.in_flight, stats.selected, stats.finished,
+                '{:.0f}s'.format(stats.turnaround)
+                if stats.turnaround is not None else 'unknown',
+                '' if stats.reachable else ', unreachable')
+            for stats in self.stats)))
+
+
+def get_target_selector(hpcConfig):
+    """Get the selector of the config's targets, one per config."""
+    with _registry_lock:
+        if id(hpcConfig) not in _selectors:
+            _selectors[id(hpcConfig)] = TargetSelector(hpcConfig)
+        return _selectors[id(hpcConfig)]
+
+
+def select_target(hpcConfig, experiment, target=None):
+    """Select the submission target of the experiment, see TargetSelector."""
+    selector = get_target_selector(hpcConfig)
+    target = selector.select(experiment, target)
+    with _registry_lock:
+        _selections[experiment] = (selector, target)
+    return target
+
+
+def release_target(experiment):
+    """Count the experiment's job as finished on its target, only once."""
+    with _registry_lock:
+        selection = _selections.pop(experiment, None)
+    if selection is None:
+        return
+    selector, target = selection
+    turnaround = None
+    if experiment.get_start_time() and experiment.get_end_time():
+        turnaround = (experiment.get_end_time() - experiment.get_start_time()) / 1000.0
+    selector.release(target, turnaround)
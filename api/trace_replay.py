@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Replay of workload traces (SWF or CSV) with synthetic jobs"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import sys
+import csv
+import json
+import math
+import tempfile
+import threading
+
+from time import sleep
+
+from api.logger import getLogger
+from api.experiment_config import ExperimentConfig
+from api.hpc_config import load_hpc_config
+from api.hpc_backend import HPCBackend
+from api.phase_timer import monotonic
+from api.scheduler import _format_duration
+from api.sweep import _set_arg
+
+
+# supported trace formats
+TRACE_FORMATS = ('swf', 'csv')
+
+# SWF fields (0-based) as defined by the Parallel Workloads Archive
+SWF_JOB_NUMBER = 0
+SWF_SUBMIT_TIME = 1
+SWF_RUN_TIME = 3
+SWF_ALLOCATED_PROCESSORS = 4
+SWF_USED_MEMORY = 6
+SWF_REQUESTED_PROCESSORS = 7
+SWF_REQUESTED_TIME = 8
+SWF_REQUESTED_MEMORY = 9
+
+# arrivals later than this are reported, the cluster is not loaded as traced
+MAX_LAG = 5.0
+
+SYNTHETIC_JOB_SCRIPT = '''#!/bin/bash
+# Synthetic job of the HPC workload generator's trace replay.
+echo "trace job ${HPCWG_TRACE_JOB} on $(hostname), running ${HPCWG_RUNTIME:-0}s"
+sleep "${HPCWG_RUNTIME:-0}"
+'''
+
+logger = getLogger(__name__)
+
+
+class TraceWorkload(object):
+    """Workload definition of one trace job, as scotty would pass it."""
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+
+
+class TraceRecord(object):
+    """One job of a trace, times in seconds, memory in KB."""
+
+    __slots__ = ('job_id', 'arrival', 'nodes', 'runtime', 'walltime', 'memory')
+
+    def __init__(self, job_id, arrival, nodes, runtime, walltime=None,
+                 memory=None):
+        self.job_id = job_id
+        self.arrival = arrival
+        self.nodes = nodes
+        self.runtime = runtime
+        self.walltime = walltime
+        self.memory = memory
+
+
+def _swf_value(fields, index):
+    """Value of an SWF field, None if unknown (-1)."""
+    try:
+        value = float(fields[index])
+    except (IndexError, ValueError):
+        return None
+    return None if value < 0 else value
+
+
+def _iter_swf(trace_file, procs_per_node):
+    for line in trace_file:
+        line = line.strip()
+        if not line or line.startswith(';'):
+            # header comments
+            continue
+        fields = line.split()
+        arrival = _swf_value(fields, SWF_SUBMIT_TIME)
+        runtime = _swf_value(fields, SWF_RUN_TIME)
+        procs = (_swf_value(fields, SWF_REQUESTED_PROCESSORS)
+                 or _swf_value(fields, SWF_ALLOCATED_PROCESSORS))
+        if arrival is None or runtime is None or not procs:
+            logger.debug("Skipping incomplete SWF record '{}'.".format(line))
+            continue
+        memory = (_swf_value(fields, SWF_REQUESTED_MEMORY)
+                  or _swf_value(fields, SWF_USED_MEMORY))
+        yield TraceRecord(
+            fields[SWF_JOB_NUMBER], arrival,
+            int(math.ceil(procs / procs_per_node)), runtime,
+            _swf_value(fields, SWF_REQUESTED_TIME),
+            # per processor in SWF
+            None if memory is None else memory * procs)
+
+
+def _iter_csv(trace_file):
+    reader = csv.DictReader(trace_file)
+    for number, row in enumerate(reader, 1):
+        try:
+            memory = row.get('memory')
+            walltime = row.get('walltime')
+            yield TraceRecord(
+                row.get('job_id') or str(number), float(row['arrival']),
+                int(row['nodes']), float(row['runtime']),
+                float(walltime) if walltime else None,
+                # in MB in CSV traces
+                float(memory) * 1024 if memory else None)
+        except (KeyError, ValueError) as e:
+            logger.error("Invalid CSV trace record {}: {}".format(number, e))
+            sys.exit(1)
+
+
+def iter_trace_records(path, trace_format=None, procs_per_node=1):
+    """
+    Generate the records of a trace file, one line at a time, thus traces
+    of any size are replayed in constant memory. The format defaults to
+    the file's extension.
+    """
+    if trace_format is None:
+        trace_format = os.path.splitext(path)[1].lstrip('.').lower()
+    if trace_format not in TRACE_FORMATS:
+        logger.error("Unknown trace format '{}', expected one of {}.".format(
+            trace_format, ', '.join(TRACE_FORMATS)))
+        sys.exit(1)
+    with open(path, 'r') as trace_file:
+        if trace_format == 'swf':
+            records = _iter_swf(trace_file, float(procs_per_node))
+        else:
+            records = _iter_csv(trace_file)
+        for record in records:
+            yield record
+
+
+def render_record(params, record, time_scale, scheduler):
+    """Workload params of a trace job, its resources as submit args."""
+    params = dict((key, value) for (key, value) in params.items()
+                  if key != 'trace')
+    runtime = record.runtime / time_scale
+    walltime = max(record.walltime or 0, record.runtime) / time_scale
+    # some slack for starting and stopping the synthetic job
+    walltime = int(math.ceil(walltime)) + 60
+    env = 'HPCWG_TRACE_JOB={},HPCWG_RUNTIME={:.3f}'.format(
+        record.job_id, runtime)
+    args = params.get('qsub_args')
+    if scheduler == 'slurm':
+        args = '{} --nodes={} --time={}'.format(
+            args or '', record.nodes, int(math.ceil(walltime / 60.0))).strip()
+        if record.memory:
+            args += ' --mem={}K'.format(int(record.memory))
+        args += ' --export=ALL,{}'.format(env)
+    else:
+        args = _set_arg(args, '-l', 'nodes', record.nodes)
+        args = _set_arg(args, '-l', 'walltime', _format_duration(walltime))
+        if record.memory:
+            args = _set_arg(args, '-l', 'mem', '{}kb'.format(int(record.memory)))
+        args += ' -v {}'.format(env)
+    params['qsub_args'] = args
+    return params
+
+
+def is_trace(workloadDef):
+    return 'trace' in workloadDef.params
+
+
+class _TraceBackend(HPCBackend):
+    """HPCBackend for trace jobs, the shared job script is staged once."""
+
+    submitted = None
+
+    def __init__(self, hpcCfg, channel=None):
+        HPCBackend.__init__(self, hpcCfg, channel)
+        # synthetic jobs are meant to be run again
+        self.result_cache = None
+
+
+    def _stage_in_data(self, experimentCfg):
+        pass
+
+
+    def _submit_job(self, experiment, depends_on=None):
+        started = monotonic()
+        HPCBackend._submit_job(self, experiment, depends_on)
+        # only set if the job was submitted
+        self.submitted = started
+
+
+class TraceReplayer(object):
+    """
+    Replays a trace open-loop: each job is submitted at its arrival time,
+    scaled by 'time_scale', whether or not earlier jobs finished.
+
+    Jobs are synthetic, by default a job script sleeping the traced
+    runtime on the traced number of nodes with the traced memory, a
+    workload's own job script gets the runtime as $HPCWG_RUNTIME.
+    Results are not kept in memory, each job's outcome is appended to
+    the trace's 'output' file, if any.
+    """
+
+    def __init__(self, workloadDef):
+        """Initialize the replayer of the workload's trace."""
+        self.logger = getLogger(__name__)
+        self.workloadDef = workloadDef
+        self.traceCfg = workloadDef.params['trace']
+        if not isinstance(self.traceCfg, dict):
+            self.traceCfg = {'path': self.traceCfg}
+        self.time_scale = float(self.traceCfg.get('time_scale', 1.0))
+        if self.time_scale <= 0:
+            self.logger.error('Trace time_scale must be positive.')
+            sys.exit(1)
+        self.max_jobs = self.traceCfg.get('max_jobs')
+        self.collect = self.traceCfg.get('collect', False)
+        self.output = self.traceCfg.get('output')
+        self._workers = threading.BoundedSemaphore(
+            int(self.traceCfg.get('max_workers', 1000)))
+        self._lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'submit_failed': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'max_lag': 0.0
+        }
+
+
+    def _get_params(self):
+        """Workload params with the synthetic job script, if none given."""
+        params = dict(self.workloadDef.params)
+        if 'job_script' not in params:
+            path = os.path.join(tempfile.gettempdir(), 'hpcwg_trace_job.sh')
+            with open(path, 'w') as script_file:
+                script_file.write(SYNTHETIC_JOB_SCRIPT)
+            params['job_script'] = path
+        return params
+
+
+    def run(self):
+        """Replay the trace, returns the replay statistics."""
+        params = self._get_params()
+        if 'hpc_config' not in params:
+            self.logger.error("HPC back-end configuration file not found.")
+            sys.exit(1)
+        # shared by all trace jobs
+        hpcConfig = load_hpc_config(os.path.abspath(params['hpc_config']))
+        records = iter_trace_records(self.traceCfg['path'],
+                                     self.traceCfg.get('format'),
+                                     self.traceCfg.get('procs_per_node', 1))
+        threads = []
+        first_arrival = None
+        start = monotonic()
+        for count, record in enumerate(records):
+            if self.max_jobs is not None and count >= self.max_jobs:
+                break
+            experimentCfg = ExperimentConfig(
+                TraceWorkload('{}-{}'.format(self.workloadDef.name, record.job_id),
+                              render_record(params, record, self.time_scale,
+                                            hpcConfig.scheduler)),
+                hpcConfig=hpcConfig)
+            if first_arrival is None:
+                # input data and job script are shared by all trace jobs
+                for target in hpcConfig.targets or [hpcConfig]:
+                    HPCBackend(target)._stage_in_data(experimentCfg)
+                first_arrival = record.arrival
+                start = monotonic()
+            due = start + (record.arrival - first_arrival) / self.time_scale
+            delay = due - monotonic()
+            if delay > 0:
+                sleep(delay)
+            self._workers.acquire()
+            thread = threading.Thread(target=self._run_job,
+                                      args=(experimentCfg, record, due),
+                                      name='trace-{}'.format(record.job_id))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+            # keep finished threads from piling up
+            threads = [thread for thread in threads if thread.is_alive()]
+        for thread in threads:
+            thread.join()
+        self.stats['duration'] = monotonic() - start
+        if self.stats['max_lag'] > MAX_LAG:
+            self.logger.warning(
+                'Submissions lagged up to {:.1f}s behind the trace, raise '
+                'max_jobs_in_flight or max_workers.'.format(self.stats['max_lag']))
+        self.logger.info("Trace '{}' replayed: {}".format(
+            self.traceCfg['path'], json.dumps(self.stats, sort_keys=True)))
+        return self.stats
+
+
+    def _run_job(self, experimentCfg, record, due):
+        """Thread body, runs one trace job."""
+        outcome = {
+            'trace_job': record.job_id,
+            'arrival': record.arrival
+        }
+        hpcBackend = None
+        try:
+            hpcBackend = _TraceBackend(experimentCfg.getHPCConfig())
+            if not self.collect:
+                hpcBackend._collect_output = lambda experiment: None
+            hpcBackend.run_experiment(experimentCfg)
+            outcome.update({
+                'target': hpcBackend.hpcConfig.target_name,
+                'exit_status': experimentCfg.get_exit_status(),
+                'timings': experimentCfg.get_timings()
+            })
+            succeeded = experimentCfg.get_exit_status() in (0, None)
+        except (Exception, SystemExit) as e:
+            # sys.exit() in a thread only ends this job
+            self.logger.error("Trace job '{}' failed: {}".format(
+                record.job_id, e))
+            outcome['error'] = str(e)
+            succeeded = False
+        finally:
+            self._workers.release()
+        submitted = hpcBackend is not None and hpcBackend.submitted is not None
+        if submitted:
+            outcome.update({
+                'lag': hpcBackend.submitted - due,
+                'job_id': experimentCfg.get_job_id()
+            })
+        with self._lock:
+            if not submitted:
+                # succeeded and failed count the submitted jobs only
+                self.stats['submit_failed'] += 1
+            else:
+                self.stats['submitted'] += 1
+                self.stats['max_lag'] = max(self.stats['max_lag'], outcome['lag'])
+                self.stats['succeeded' if succeeded else 'failed'] += 1
+            if self.output:
+                with open(os.path.expanduser(self.output), 'a') as out_file:
+                    out_file.write(json.dumps(outcome, sort_keys=True) + '\n')
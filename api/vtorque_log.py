@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""VM provisioning phases from the vTorque debug log"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import re
+import sys
+import time
+import threading
+
+from datetime import datetime
+
+from api.logger import getLogger
+from api.phase_timer import get_distribution
+
+
+# The default line format and event messages are those written by the
+# simulated cluster in bench/fake_pbs.py, not taken from a vTorque release;
+# 'vtorque_log_line' and 'vtorque_log_events' adapt them to a real log.
+
+# '[2018-01-31T12:00:00] node001 Booting VMs', lines need the named groups
+# 'date', 'time' and 'message', 'fraction' (of a second) and 'node' are
+# optional
+LOG_LINE = re.compile(
+    r'^\[(?P<date>\d{4}-\d{2}-\d{2})[T ](?P<time>\d{2}:\d{2}:\d{2})'
+    r'(?P<fraction>\.\d+)?\]\s+(?P<node>\S+)\s+(?P<message>.*)$')
+
+# node of lines without one
+DEFAULT_NODE = 'vm'
+
+# events marking the phase boundaries, first matching message per node
+EVENTS = (
+    ('image_staging', re.compile(r'stag\w* .*image', re.I)),
+    ('vm_boot', re.compile(r'booting', re.I)),
+    ('vms_ready', re.compile(r'\bready\b', re.I)),
+    ('job_start', re.compile(r'executing job script', re.I)),
+    ('job_end', re.compile(r'job script finished', re.I)),
+    ('teardown', re.compile(r'tearing down', re.I)),
+    ('vms_destroyed', re.compile(r'destroyed', re.I))
+)
+
+# phases in execution order, as the events they span
+PHASES = (
+    ('image_staging', 'image_staging', 'vm_boot'),
+    ('vm_boot', 'vm_boot', 'vms_ready'),
+    ('guest_ready', 'vms_ready', 'job_start'),
+    ('job_run', 'job_start', 'job_end'),
+    ('teardown', 'teardown', 'vms_destroyed')
+)
+
+# VM timings of all parsed logs, aggregated per phase
+_samples = {}
+_samples_lock = threading.Lock()
+
+
+def _parse_time(date, clock, fraction):
+    """Local time of the log as epoch seconds."""
+    stamp = datetime.strptime('{} {}'.format(date, clock), '%Y-%m-%d %H:%M:%S')
+    if fraction:
+        # '.5' or ',500', with or without the separator
+        return time.mktime(stamp.timetuple()) + float('0.' + fraction.lstrip('.,'))
+    return time.mktime(stamp.timetuple())
+
+
+def get_log_format(hpcConfig):
+    """
+    Line pattern and events of the vTorque debug log, the defaults
+    overridden by the config's 'vtorque_log_line' and 'vtorque_log_events'.
+    """
+    logger = getLogger(__name__)
+    line_pattern = LOG_LINE
+    events = EVENTS
+    try:
+        if hpcConfig.vtorque_log_line:
+            line_pattern = re.compile(hpcConfig.vtorque_log_line)
+        custom_events = hpcConfig.vtorque_log_events or {}
+        events = tuple(
+            (event, re.compile(custom_events[event], re.I)
+             if event in custom_events else pattern)
+            for (event, pattern) in EVENTS)
+    except re.error as e:
+        logger.error('Invalid vTorque log pattern: {}'.format(e))
+        sys.exit(1)
+    missing = set(('date', 'time', 'message')) - set(line_pattern.groupindex)
+    if missing:
+        logger.error("'vtorque_log_line' lacks the named group(s) {}.".format(
+            ', '.join(sorted(missing))))
+        sys.exit(1)
+    unknown = set(hpcConfig.vtorque_log_events or {}) - set(
+        event for (event, pattern) in EVENTS)
+    if unknown:
+        logger.error("Unknown event(s) in 'vtorque_log_events': {}, expected "
+                     "{}.".format(', '.join(sorted(unknown)), ', '.join(
+                         event for (event, pattern) in EVENTS)))
+        sys.exit(1)
+    return line_pattern, events
+
+
+def parse_events(lines, line_pattern=LOG_LINE, events=EVENTS):
+    """Time of each event, keyed by node and event name."""
+    nodes = {}
+    for line in lines:
+        match = line_pattern.match(line.strip())
+        if match is None:
+            continue
+        fields = match.groupdict()
+        for event, pattern in events:
+            if pattern.search(fields['message']):
+                nodes.setdefault(fields.get('node') or DEFAULT_NODE, {}).setdefault(
+                    event, _parse_time(fields['date'], fields['time'],
+                                       fields.get('fraction')))
+                break
+    return nodes
+
+
+def get_vm_timings(lines, line_pattern=LOG_LINE, events=EVENTS):
+    """
+    Seconds per VM phase and node of a vTorque debug log, None if it
+    contains no phase at all.
+
+    The job's phases are those of its slowest node, the overhead is the
+    time from staging the image until the VMs are destroyed minus the
+    execution of the job script.
+    """
+    events = parse_events(lines, line_pattern, events)
+    nodes = {}
+    for node, node_events in events.items():
+        nodes[node] = dict(
+            (phase, node_events[end] - node_events[begin])
+            for (phase, begin, end) in PHASES
+            if begin in node_events and end in node_events)
+    if not any(nodes.values()):
+        return None
+    timings = {'nodes': nodes}
+    for phase, _, _ in PHASES:
+        durations = [phases[phase] for phases in nodes.values() if phase in phases]
+        timings[phase] = max(durations) if durations else None
+    starts = [node_events['image_staging'] for node_events in events.values()
+              if 'image_staging' in node_events]
+    ends = [node_events['vms_destroyed'] for node_events in events.values()
+            if 'vms_destroyed' in node_events]
+    timings['total'] = max(ends) - min(starts) if starts and ends else None
+    timings['overhead'] = None
+    if timings['total'] is not None and timings['job_run'] is not None:
+        timings['overhead'] = timings['total'] - timings['job_run']
+    return timings
+
+
+def read_vm_timings(log_path, line_pattern=LOG_LINE, events=EVENTS):
+    """VM timings of a collected vTorque debug log, None if unreadable."""
+    try:
+        with open(log_path) as log_file:
+            return get_vm_timings(log_file, line_pattern, events)
+    except (IOError, OSError) as e:
+        getLogger(__name__).warning(
+            'Reading the vTorque debug log failed: {}'.format(e))
+        return None
+
+
+def record_vm_timings(timings):
+    """Add the timings of one job to the aggregated statistics."""
+    with _samples_lock:
+        for phase in [phase for phase, _, _ in PHASES] + ['total', 'overhead']:
+            if timings.get(phase) is not None:
+                _samples.setdefault(phase, []).append(timings[phase])
+
+
+def get_vm_timing_stats():
+    """Distribution of each VM phase over all jobs of this process."""
+    with _samples_lock:
+        return dict((phase, get_distribution(values))
+                    for (phase, values) in _samples.items())
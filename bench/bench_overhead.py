@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""End-to-end overhead of the generator against a simulated PBS cluster.
+
+Drives HPCBackend.run_experiment for 1, 10, 100 and 1000 concurrent jobs
+and prints one JSON line per job count: the experiments' phase timings
+(stage-in, submit, queue wait, execution, collect), the time between
+a job's simulated end and the generator noticing it, remote command counts
+and peak memory.
+
+Usage:
+    python bench/bench_overhead.py [--jobs 1,10,100,1000] [--queue-delay 1,5]
+        [--run-time 1,5] [--failure-rate 0] [--qstat-latency 0.05]
+        [--output results.jsonl]
+"""
+
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import print_function, with_statement
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+import tracemalloc
+
+from timeit import default_timer
+from time import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('log_level', 'WARNING')
+
+from fake_pbs import FakeCluster, FakeChannel
+from api.hpc_config import HPCBackendConfiguration
+from api.experiment_config import ExperimentConfig
+from api.hpc_backend import HPCBackend
+from api.phase_timer import PHASES
+
+
+class Workload(object):
+    """Workload definition as provided by scotty."""
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+
+
+class TimedBackend(HPCBackend):
+    """HPCBackend recording how late the end of each job is noticed."""
+
+    def __init__(self, hpcCfg, channel, timings):
+        HPCBackend.__init__(self, hpcCfg, channel)
+        self.timings = timings
+
+
+    def _wait_for_job(self, experiment):
+        result = HPCBackend._wait_for_job(self, experiment)
+        # time between the simulated end and noticing it
+        end = self.ssh_conn.cluster.get_job_end(experiment.get_job_id())
+        self.timings.setdefault('detect', []).append(time() - end)
+        return result
+
+
+def _summary(values):
+    if not values:
+        return None
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values),
+        'p50': values[len(values) // 2],
+        'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+        'max': values[-1]
+    }
+
+
+def _write_config(root, cluster):
+    """HPC back-end config pointing to the fake cluster."""
+    config = {
+        'domain': cluster.settings['domain'],
+        'host': FakeChannel.host,
+        'user_name': FakeChannel.user_name,
+        'ssh_port': '22',
+        'ssh_key': 'none',
+        'grafana': False,
+        'grafana_dashbord_name': 'none',
+        'grafana_host': 'none',
+        'grafana_dashboard_url': 'none',
+        'path_qstat': 'qstat',
+        'path_qsub': 'qsub',
+        'path_vsub': 'vsub',
+        'path_qdel': 'qdel',
+        'path_vtorque_log': cluster.settings['path_vtorque_log'],
+        'execution_dir': 'exec',
+        'poll_time_qstat': 1,
+        'poll_time_min': 0.2,
+        'poll_time_max': 2,
+        'poll_fast_period': 5,
+        'max_jobs_in_flight': 100000,
+        'manifest_cache_dir': os.path.join(root, 'manifests'),
+        'journal_path': os.path.join(root, 'journal.sqlite'),
+        'results_dir': os.path.join(root, 'results')
+    }
+    path = os.path.join(root, 'hpc_backend.cfg')
+    with open(path, 'w') as data_file:
+        json.dump(config, data_file, sort_keys=True, indent=4)
+    return path
+
+
+def _write_experiment(root):
+    job_script = os.path.join(root, 'job_script.sh')
+    with open(job_script, 'w') as script_file:
+        script_file.write('#!/bin/bash\necho "hello from $PBS_JOBID"\n')
+    input_data = os.path.join(root, 'input_data')
+    os.makedirs(input_data)
+    for i in range(10):
+        with open(os.path.join(input_data, 'input{}.dat'.format(i)), 'w') as data_file:
+            data_file.write('x' * 1024 * (i + 1))
+    return job_script, input_data
+
+
+def run(job_count, settings, max_workers):
+    """Run 'job_count' workloads at once, returns the measurements."""
+    root = tempfile.mkdtemp(prefix='hpcwg-bench-')
+    try:
+        cluster = FakeCluster(os.path.join(root, 'cluster'), **settings)
+        os.makedirs(os.path.join(cluster.home, 'exec'))
+        channel = FakeChannel(cluster)
+        hpcConfig = HPCBackendConfiguration(_write_config(root, cluster))
+        job_script, input_data = _write_experiment(root)
+        experiments = [ExperimentConfig(Workload(
+            'bench_{}'.format(i),
+            {'job_script': job_script, 'input_data': input_data,
+             'qsub_args': '-l nodes=1'}), hpcConfig)
+            for i in range(job_count)]
+
+        timings = {}
+        failures = []
+        workers = threading.BoundedSemaphore(max_workers)
+
+        def _run(experimentCfg):
+            try:
+                TimedBackend(hpcConfig, channel, timings).run_experiment(
+                    experimentCfg)
+                for phase, seconds in experimentCfg.get_timings().items():
+                    if phase in PHASES and seconds is not None:
+                        timings.setdefault(phase, []).append(seconds)
+            except (Exception, SystemExit) as e:
+                failures.append(str(e))
+            finally:
+                workers.release()
+
+        tracemalloc.start()
+        start = default_timer()
+        threads = []
+        for experimentCfg in experiments:
+            workers.acquire()
+            thread = threading.Thread(target=_run, args=(experimentCfg,))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        wall_time = default_timer() - start
+        peak_traced = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        jobs = cluster.get_jobs()
+        simulated = [job['queue_delay'] + job['run_time'] for job in jobs]
+        return {
+            'jobs': job_count,
+            'failures': len(failures),
+            'wall_time': wall_time,
+            'simulated_job_time': _summary(simulated),
+            'phases': dict((phase, _summary(timings.get(phase, [])))
+                           for phase in PHASES + ('detect',)),
+            'commands': channel.get_stats(),
+            'commands_per_job': float(channel.get_stats()['commands']) / job_count,
+            'peak_traced_bytes': peak_traced,
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--jobs', default='1,10,100,1000')
+    parser.add_argument('--queue-delay', default='1,5')
+    parser.add_argument('--run-time', default='1,5')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--qstat-latency', type=float, default=0.05)
+    parser.add_argument('--max-workers', type=int, default=1000)
+    parser.add_argument('--output', default=None,
+                        help='append the JSON lines to this file')
+    args = parser.parse_args(argv[1:])
+
+    settings = {
+        'queue_delay': [float(v) for v in args.queue_delay.split(',')],
+        'run_time': [float(v) for v in args.run_time.split(',')],
+        'failure_rate': args.failure_rate,
+        'qstat_latency': args.qstat_latency
+    }
+    for job_count in [int(v) for v in args.jobs.split(',')]:
+        result = run(job_count, settings, args.max_workers)
+        result['settings'] = settings
+        result['python'] = platform.python_version()
+        line = json.dumps(result, sort_keys=True)
+        print(line)
+        sys.stdout.flush()
+        if args.output:
+            with open(args.output, 'a') as out_file:
+                out_file.write(line + '\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
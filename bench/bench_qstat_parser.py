@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Benchmark of the qstat parser over a generated 10k-job dump.
+
+Usage:
+    python bench/bench_qstat_parser.py [job count] [repetitions]
+"""
+
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import print_function
+import io
+import os
+import sys
+import json
+
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from api.qstat_parser import parse_full, parse_xml
+
+
+STATES = 'QRCEH'
+
+
+def full_dump(job_count):
+    """Generate 'qstat -f' output, continuation lines included."""
+    out = io.StringIO()
+    for i in range(job_count):
+        out.write(u'Job Id: {}.frontend.mydomain\n'.format(i))
+        out.write(u'    Job_Name = a_rather_long_job_name_for_the_table_{}.sh\n'.format(i))
+        out.write(u'    Job_Owner = ci@frontend.mydomain\n')
+        out.write(u'    resources_used.cput = 00:{:02d}:17\n'.format(i % 60))
+        out.write(u'    resources_used.mem = {}kb\n'.format(1024 + i))
+        out.write(u'    resources_used.vmem = {}kb\n'.format(4096 + i))
+        out.write(u'    resources_used.walltime = 00:01:{:02d}\n'.format(i % 60))
+        out.write(u'    job_state = {}\n'.format(STATES[i % len(STATES)]))
+        out.write(u'    queue = batch\n')
+        out.write(u'    exec_host = node{:03d}/0-15+node{:03d}/0-15+node{:03d}\n'
+                  u'\t/0-15\n'.format(i % 100, (i + 1) % 100, (i + 2) % 100))
+        out.write(u'    Variable_List = PBS_O_QUEUE=batch,PBS_O_HOME=/home/ci,\n'
+                  u'\tPBS_O_LOGNAME=ci,PBS_O_PATH=/usr/bin:/bin\n')
+        out.write(u'    exit_status = {}\n\n'.format(i % 3))
+    return out.getvalue()
+
+
+def xml_dump(job_count):
+    """Generate 'qstat -x' output."""
+    out = io.StringIO()
+    out.write(u'<Data>')
+    for i in range(job_count):
+        out.write(
+            u'<Job><Job_Id>{0}.frontend.mydomain</Job_Id>'
+            u'<Job_Name>job_{0}.sh</Job_Name>'
+            u'<job_state>{1}</job_state><queue>batch</queue>'
+            u'<exec_host>node{2:03d}/0-15</exec_host>'
+            u'<resources_used><cput>00:00:17</cput><mem>{3}kb</mem>'
+            u'<vmem>{4}kb</vmem><walltime>00:01:00</walltime></resources_used>'
+            u'<exit_status>{5}</exit_status></Job>'.format(
+                i, STATES[i % len(STATES)], i % 100, 1024 + i, 4096 + i, i % 3))
+    out.write(u'</Data>\n')
+    return out.getvalue()
+
+
+def bench(name, parse, make_source, job_count, repetitions):
+    timings = []
+    for _ in range(repetitions):
+        source = make_source()
+        start = default_timer()
+        parsed = sum(1 for _ in parse(source))
+        timings.append(default_timer() - start)
+        assert parsed == job_count
+    best = min(timings)
+    return {
+        'format': name,
+        'jobs': job_count,
+        'repetitions': repetitions,
+        'best_s': round(best, 4),
+        'mean_s': round(sum(timings) / len(timings), 4),
+        'jobs_per_s': int(job_count / best)
+    }
+
+
+def main():
+    job_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    full = full_dump(job_count)
+    xml = xml_dump(job_count)
+    results = [
+        bench('qstat -f', parse_full, lambda: io.StringIO(full),
+              job_count, repetitions),
+        bench('qstat -x', parse_xml, lambda: io.BytesIO(xml.encode('utf-8')),
+              job_count, repetitions)
+    ]
+    for result in results:
+        print(json.dumps(result, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,469 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+"""Simulated PBS Torque front-end, stands in for ssh and the batch tools.
+
+Jobs are not executed, their state is derived from the submission time
+and the queue delay and run time drawn for each job. The 'remote' side is
+a local dir, commands are run there by a FakeChannel.
+
+Usage (as called by the generated wrappers in <root>/bin):
+    python bench/fake_pbs.py qsub|vsub|qstat|qdel|showstart [args]
+"""
+
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import print_function, with_statement
+import os
+import re
+import sys
+import json
+import stat
+import fcntl
+import random
+
+from time import time, sleep, strftime, localtime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from api.ssh_channel import LocalChannel
+
+
+# env var pointing the wrappers to the cluster's root dir
+ROOT_ENV = 'FAKE_PBS_ROOT'
+
+# qstat's exit code for unknown job IDs
+UNKNOWN_JOB = 153
+
+# exit status of jobs deleted with qdel
+DELETED_EXIT_STATUS = 271
+
+DEFAULTS = {
+    'domain': 'frontend.mydomain',
+    'queue_delay': [1.0, 5.0],
+    # queues besides 'batch', each with its own queue delay range
+    'queues': {},
+    'run_time': [1.0, 5.0],
+    'failure_rate': 0.0,
+    'submit_failure_rate': 0.0,
+    'qstat_latency': 0.05,
+    'keep_completed': 300,
+    'log_size': 4096,
+    'path_vtorque_log': '~/.vtorque',
+    'seed': 0
+}
+
+_WRAPPER = '''#!/bin/sh
+exec "{python}" "{script}" {command} "$@"
+'''
+
+
+class FakeCluster(object):
+    """
+    Creates the cluster's root dir: 'home' (the remote home dir), 'bin'
+    (qsub, vsub, qstat and qdel wrappers) and 'jobs' (one file per job).
+    """
+
+    def __init__(self, root, **settings):
+        """Initialize the cluster, 'settings' override DEFAULTS."""
+        self.root = os.path.abspath(root)
+        self.home = os.path.join(self.root, 'home')
+        self.bin_dir = os.path.join(self.root, 'bin')
+        self.settings = dict(DEFAULTS)
+        self.settings.update(settings)
+        for path in (self.home, self.bin_dir, os.path.join(self.root, 'jobs')):
+            if not os.path.isdir(path):
+                os.makedirs(path)
+        with open(os.path.join(self.root, 'cluster.json'), 'w') as data_file:
+            json.dump(self.settings, data_file, sort_keys=True, indent=4)
+        for command in ('qsub', 'vsub', 'qstat', 'qdel', 'showstart'):
+            self._write_wrapper(command)
+
+
+    def _write_wrapper(self, command):
+        path = os.path.join(self.bin_dir, command)
+        with open(path, 'w') as wrapper:
+            wrapper.write(_WRAPPER.format(python=sys.executable,
+                                          script=os.path.abspath(__file__),
+                                          command=command))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP)
+
+
+    def get_env(self):
+        """Environment of the commands run on the cluster."""
+        env = dict(os.environ)
+        env['HOME'] = self.home
+        env['PATH'] = '{}:{}'.format(self.bin_dir, env.get('PATH', ''))
+        env[ROOT_ENV] = self.root
+        return env
+
+
+    def get_jobs(self):
+        """All jobs ever submitted, as stored by qsub."""
+        return _load_jobs(self.root)
+
+
+    def get_job_end(self, job_id):
+        """Simulated end time of the given job."""
+        job = _load_job(self.root, re.findall(r'^\d+', job_id)[0])
+        return None if job is None else job['end']
+
+
+class FakeChannel(LocalChannel):
+    """Channel to a FakeCluster, counts the commands by program."""
+
+    host = 'fake-frontend'
+
+    def __init__(self, cluster):
+        """Initialize the channel."""
+        LocalChannel.__init__(self, cluster.home, cluster.get_env())
+        self.cluster = cluster
+        self.command_counts = {}
+
+
+    def __call__(self, *args, **kwargs):
+        cmd = self._join(args)
+        # 'cd <dir>; qsub ...' counts as qsub
+        if cmd.startswith('cd '):
+            cmd_body = cmd.partition('; ')[2]
+        else:
+            cmd_body = cmd
+        program = os.path.basename(cmd_body.split(' ', 1)[0])
+        if not program or '=' in program:
+            # inline script, e.g. the result collection
+            program = 'sh'
+        self.command_counts[program] = self.command_counts.get(program, 0) + 1
+        return LocalChannel.__call__(self, cmd, **kwargs)
+
+
+    def rsync_args(self):
+        self.command_counts['rsync'] = self.command_counts.get('rsync', 0) + 1
+        return LocalChannel.rsync_args(self)
+
+
+    def get_stats(self):
+        stats = LocalChannel.get_stats(self)
+        stats['by_program'] = dict(self.command_counts)
+        return stats
+
+
+#
+# the simulated batch system, run in a separate process per command
+#
+
+def _load_settings(root):
+    with open(os.path.join(root, 'cluster.json'), 'r') as data_file:
+        return json.load(data_file)
+
+
+def _job_file(root, number):
+    return os.path.join(root, 'jobs', '{}.json'.format(number))
+
+
+def _load_job(root, number):
+    try:
+        with open(_job_file(root, number), 'r') as data_file:
+            return json.load(data_file)
+    except IOError:
+        return None
+
+
+def _store_job(root, job):
+    path = _job_file(root, job['number'])
+    with open(path + '.tmp', 'w') as data_file:
+        json.dump(job, data_file)
+    os.rename(path + '.tmp', path)
+
+
+def _load_jobs(root):
+    jobs = []
+    for name in os.listdir(os.path.join(root, 'jobs')):
+        if name.endswith('.json'):
+            job = _load_job(root, name[:-len('.json')])
+            if job is not None:
+                jobs.append(job)
+    return sorted(jobs, key=lambda job: job['number'])
+
+
+def _next_number(root):
+    """Next job number, unique across concurrent qsub processes."""
+    with open(os.path.join(root, 'seq'), 'a+') as seq_file:
+        fcntl.flock(seq_file, fcntl.LOCK_EX)
+        seq_file.seek(0)
+        number = int(seq_file.read() or 0) + 1
+        seq_file.seek(0)
+        seq_file.truncate()
+        seq_file.write(str(number))
+    return number
+
+
+def _parse_array(request):
+    """Indices of a '-t' request like '1-10%4' or '1,3,5'."""
+    indices = []
+    for part in request.split('%')[0].split(','):
+        first, sep, last = part.partition('-')
+        if sep:
+            indices.extend(range(int(first), int(last) + 1))
+        else:
+            indices.append(int(first))
+    return indices
+
+
+def _duration(value):
+    return '{:02d}:{:02d}:{:02d}'.format(
+        int(value) // 3600, int(value) // 60 % 60, int(value) % 60)
+
+
+def _write_log(path, size, header):
+    with open(path, 'w') as log_file:
+        log_file.write(header + '\n')
+        line = 'x' * 63 + '\n'
+        for i in range(max(0, size - len(header)) // len(line)):
+            log_file.write(line)
+
+
+def _write_vtorque_log(path, job, settings):
+    """Debug log as written by vTorque, timestamps of each phase."""
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    start = job['submit'] + job['queue_delay']
+    phases = [(0.0, 'Staging VM image'), (0.1, 'Booting VMs'),
+              (0.3, 'VMs ready'), (0.4, 'Executing job script'),
+              (0.9, 'Job script finished'), (0.95, 'Tearing down VMs'),
+              (1.0, 'VMs destroyed')]
+    with open(path, 'w') as log_file:
+        for fraction, phase in phases:
+            log_file.write('[{}] node001 {}\n'.format(
+                strftime('%Y-%m-%dT%H:%M:%S',
+                         localtime(start + fraction * job['run_time'])),
+                phase))
+
+
+def qsub(root, args, vm_job=False):
+    """Queue a job, prints its ID."""
+    settings = _load_settings(root)
+    array_request = None
+    job_script = None
+    queue = 'batch'
+    args = iter(args)
+    for arg in args:
+        if arg == '-t':
+            array_request = next(args)
+        elif arg == '-q':
+            queue = next(args).partition('@')[0]
+        elif arg.startswith('-'):
+            # all other options take a value, e.g. '-l nodes=1'
+            next(args, None)
+        else:
+            job_script = arg
+    if job_script is None or not os.path.isfile(job_script):
+        print("qsub: script file '{}' cannot be loaded".format(job_script),
+              file=sys.stderr)
+        return 1
+    queue_delay = _get_queue_delays(settings).get(queue)
+    if queue_delay is None:
+        print('qsub: submit error (Unknown queue MSG=requested queue not found)',
+              file=sys.stderr)
+        return 1
+
+    number = _next_number(root)
+    rnd = random.Random('{}-{}'.format(settings['seed'], number))
+    if rnd.random() < settings['submit_failure_rate']:
+        print('qsub: submit error (simulated)', file=sys.stderr)
+        return 1
+    now = time()
+    indices = _parse_array(array_request) if array_request else None
+    job = {
+        'number': number,
+        'name': os.path.basename(job_script),
+        'submit': now,
+        'queue': queue,
+        'queue_delay': rnd.uniform(*queue_delay),
+        'run_time': rnd.uniform(*settings['run_time']),
+        'exit_status': 1 if rnd.random() < settings['failure_rate'] else 0,
+        'indices': indices,
+        'deleted': None
+    }
+    job['end'] = job['submit'] + job['queue_delay'] + job['run_time']
+    job_id = '{}{}.{}'.format(number, '[]' if indices else '',
+                              settings['domain'])
+
+    # logs are written right away, they are read only after completion
+    home = os.environ.get('HOME', root)
+    for index in indices or [None]:
+        suffix = str(number) if index is None else '{}-{}'.format(number, index)
+        for log_type in ('o', 'e'):
+            _write_log(os.path.join(home, '{}.{}{}'.format(
+                job['name'], log_type, suffix)),
+                settings['log_size'] if log_type == 'o' else 0,
+                'job {} index {}'.format(job_id, index))
+    if vm_job:
+        vtorque_dir = settings['path_vtorque_log'].replace('~', home, 1)
+        _write_vtorque_log(os.path.join(vtorque_dir, job_id, 'debug.log'),
+                           job, settings)
+    _store_job(root, job)
+    print(job_id)
+    return 0
+
+
+def _get_state(job, now, settings):
+    """Torque state letter, None if the job is no longer known."""
+    end = job['end'] if job['deleted'] is None else min(job['end'], job['deleted'])
+    if now >= end + settings['keep_completed']:
+        return None
+    if now >= end:
+        return 'C'
+    if now >= job['submit'] + job['queue_delay']:
+        return 'R'
+    return 'Q'
+
+
+def _print_full(job_id, job, state, settings, now):
+    print('Job Id: {}'.format(job_id))
+    print('    Job_Name = {}'.format(job['name']))
+    print('    job_state = {}'.format(state))
+    print('    queue = {}'.format(job.get('queue', 'batch')))
+    if state != 'Q':
+        started = job['submit'] + job['queue_delay']
+        walltime = min(now, job['end']) - started
+        print('    exec_host = node001/0-15')
+        print('    resources_used.cput = {}'.format(_duration(walltime)))
+        print('    resources_used.mem = 1024kb')
+        print('    resources_used.walltime = {}'.format(_duration(walltime)))
+    if state == 'C':
+        print('    exit_status = {}'.format(
+            DELETED_EXIT_STATUS if job['deleted'] is not None
+            else job['exit_status']))
+    print('')
+
+
+def _get_queue_delays(settings):
+    queue_delays = dict(settings['queues'])
+    queue_delays['batch'] = settings['queue_delay']
+    return queue_delays
+
+
+def _print_queues(root, settings):
+    """Job counts per queue, like 'qstat -Q'."""
+    now = time()
+    jobs = _load_jobs(root)
+    print('Queue              Max    Tot   Ena   Str   Que   Run   Hld   Wat   Trn   Ext T   Cpt')
+    print('----------------   ---   ----    --    --   ---   ---   ---   ---   ---   --- -   ---')
+    for queue in sorted(_get_queue_delays(settings)):
+        states = [_get_state(job, now, settings) for job in jobs
+                  if job.get('queue', 'batch') == queue]
+        counts = dict((state, states.count(state)) for state in 'QRC')
+        print('{:<16}     0 {:6d}   yes   yes {:5d} {:5d}     0     0     0     0 E {:5d}'.format(
+            queue, counts['Q'] + counts['R'], counts['Q'], counts['R'],
+            counts['C']))
+    return 0
+
+
+def qstat(root, args):
+    """Print the state of the requested (or all) jobs, like 'qstat -f'."""
+    settings = _load_settings(root)
+    sleep(settings['qstat_latency'])
+    if '-Q' in args:
+        return _print_queues(root, settings)
+    expand = '-t' in args
+    wanted = [arg.strip("'") for arg in args if not arg.startswith('-')]
+    now = time()
+    if wanted:
+        jobs = [_load_job(root, re.findall(r'^\d+', job_id)[0])
+                for job_id in wanted]
+    else:
+        jobs = _load_jobs(root)
+    exit_code = 0
+    for wanted_id, job in zip(wanted or [None] * len(jobs), jobs):
+        state = None if job is None else _get_state(job, now, settings)
+        if state is None:
+            if wanted_id is not None:
+                print('qstat: Unknown Job Id {}'.format(wanted_id),
+                      file=sys.stderr)
+                exit_code = UNKNOWN_JOB
+            continue
+        if job['indices'] and expand:
+            for index in job['indices']:
+                _print_full('{}[{}].{}'.format(job['number'], index,
+                                               settings['domain']),
+                            job, state, settings, now)
+        else:
+            _print_full('{}{}.{}'.format(job['number'],
+                                         '[]' if job['indices'] else '',
+                                         settings['domain']),
+                        job, state, settings, now)
+    return exit_code
+
+
+def showstart(root, args):
+    """
+    Estimated start of a job in queue 'batch', like Moab's
+    'showstart <procs>[@<duration>]': after the last queued job started.
+    """
+    settings = _load_settings(root)
+    sleep(settings['qstat_latency'])
+    request = args[0] if args else '1'
+    procs, _, duration = request.partition('@')
+    now = time()
+    starts = [job['submit'] + job['queue_delay'] for job in _load_jobs(root)
+              if job.get('queue', 'batch') == 'batch'
+              and _get_state(job, now, settings) == 'Q']
+    start = max(starts) if starts else now + settings['queue_delay'][0]
+    print('job {} requires {} procs for {}\n'.format(
+        request, procs, duration or '99:23:59:59'))
+    print('Estimated Rsv based start in {} on {}'.format(
+        _duration(max(0, start - now)),
+        strftime('%a %b %d %H:%M:%S', localtime(start))))
+    print('\nBest Partition: base')
+    return 0
+
+
+def qdel(root, args):
+    """Delete the given jobs."""
+    exit_code = 0
+    for job_id in args:
+        number = re.findall(r'^\d+', job_id.strip("'"))[0]
+        job = _load_job(root, number)
+        if job is None:
+            exit_code = UNKNOWN_JOB
+        elif job['deleted'] is None:
+            job['deleted'] = time()
+            _store_job(root, job)
+    return exit_code
+
+
+def main(argv):
+    root = os.environ[ROOT_ENV]
+    command, args = argv[1], argv[2:]
+    if command == 'qsub':
+        return qsub(root, args)
+    elif command == 'vsub':
+        return qsub(root, args, vm_job=True)
+    elif command == 'qstat':
+        return qstat(root, args)
+    elif command == 'qdel':
+        return qdel(root, args)
+    elif command == 'showstart':
+        return showstart(root, args)
+    print('Unknown command {}'.format(command), file=sys.stderr)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
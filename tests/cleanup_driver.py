@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""
+Runs one long workload against the fake PBS cluster, for the signal
+tests. Usage:
+
+    python tests/cleanup_driver.py <root> backend|dag|workload_gen
+"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import sys
+
+import helpers
+from fake_pbs import FakeCluster, FakeChannel
+from api import ssh_channel
+from api.hpc_config import load_hpc_config
+from api.experiment_config import ExperimentConfig
+from api.hpc_backend import HPCBackend
+from api.dag import DAGExecutor
+
+
+# the job runs until it is cancelled
+SETTINGS = {
+    'queue_delay': [0.0, 0.0],
+    'run_time': [600.0, 600.0],
+    'qstat_latency': 0.0
+}
+
+
+class _V1(object):
+
+    def __init__(self, workload):
+        self.workload = workload
+
+
+class _Context(object):
+    """Context as scotty passes it to run()."""
+
+    def __init__(self, workload):
+        self.v1 = _V1(workload)
+
+
+def main(root, mode):
+    cluster = FakeCluster(os.path.join(root, 'cluster'), **SETTINGS)
+    if not os.path.isdir(os.path.join(cluster.home, 'exec')):
+        os.makedirs(os.path.join(cluster.home, 'exec'))
+    hpcConfigPath = helpers.write_hpc_config(
+        root, host=FakeChannel.host, user_name=FakeChannel.user_name,
+        domain=cluster.settings['domain'], cancel_on_exit=True,
+        journal_path=os.path.join(root, 'journal.sqlite'),
+        journal_reattach=True,
+        poll_time_min=0.1, poll_time_max=0.5)
+    hpcConfig = load_hpc_config(hpcConfigPath)
+    # the back-ends of the workload use the fake cluster's channel
+    channel = FakeChannel(cluster)
+    ssh_channel._channels[(
+        hpcConfig.get_value('host'), hpcConfig.get_value('user_name'),
+        str(hpcConfig.get_value('ssh_port')),
+        hpcConfig.get_value('ssh_key'))] = channel
+    workload = helpers.Workload('sleeper', {
+        'job_script': helpers.write_job_script(root),
+        'hpc_config': hpcConfigPath})
+
+    if mode == 'workload_gen':
+        import workload_gen
+        workload_gen.run(_Context(workload))
+    elif mode == 'dag':
+        DAGExecutor().run([ExperimentConfig(workload)])
+    else:
+        experiment = ExperimentConfig(workload)
+        HPCBackend(experiment.getHPCConfig()).run_experiment(experiment)
+    # the signal has to end the process before
+    sys.exit(3)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Shared fixtures of the unit tests"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bench'))
+
+
+class Workload(object):
+    """Workload definition as provided by scotty."""
+
+    def __init__(self, name, params):
+        self.name = name
+        self.params = params
+
+
+def write_hpc_config(root, **overrides):
+    """Minimal HPC back-end config in 'root', keys overridden by 'overrides'."""
+    config = {
+        'domain': 'frontend.mydomain',
+        'host': 'localhost',
+        'user_name': 'user',
+        'ssh_port': '22',
+        'ssh_key': 'none',
+        'grafana': False,
+        'grafana_dashbord_name': 'none',
+        'grafana_host': 'none',
+        'grafana_dashboard_url': 'none',
+        'path_qstat': 'qstat',
+        'path_qsub': 'qsub',
+        'path_vsub': 'vsub',
+        'path_qdel': 'qdel',
+        'path_vtorque_log': '~/.vtorque',
+        'execution_dir': 'exec',
+        'poll_time_qstat': 1,
+        'cancel_on_exit': False,
+        'manifest_cache_dir': os.path.join(root, 'manifests'),
+        'journal_path': None,
+        'results_dir': os.path.join(root, 'results')
+    }
+    config.update(overrides)
+    path = os.path.join(root, 'hpc_backend.cfg')
+    with open(path, 'w') as data_file:
+        json.dump(config, data_file, sort_keys=True, indent=4)
+    return path
+
+
+def write_job_script(root, name='job_script.sh'):
+    path = os.path.join(root, name)
+    with open(path, 'w') as script_file:
+        script_file.write('#!/bin/bash\necho "hello from $PBS_JOBID"\n')
+    return path
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the asyncio back-end against the simulated Torque cluster"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+
+import helpers
+from fake_pbs import FakeCluster, FakeChannel
+from api import async_backend
+from api.hpc_config import load_hpc_config
+from api.experiment_config import ExperimentConfig
+from api.async_backend import AsyncHPCBackend, AsyncPoller
+
+
+SETTINGS = {
+    'queue_delay': [0.1, 0.3],
+    'run_time': [0.2, 0.4],
+    'qstat_latency': 0.0,
+    'log_size': 256
+}
+
+
+class AsyncHPCBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _setup_cluster(self, **settings):
+        settings = dict(SETTINGS, **settings)
+        self.cluster = FakeCluster(os.path.join(self.root, 'cluster'), **settings)
+        os.makedirs(os.path.join(self.cluster.home, 'exec'))
+        self.channel = FakeChannel(self.cluster)
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(
+            self.root, host=FakeChannel.host, user_name=FakeChannel.user_name,
+            domain=self.cluster.settings['domain'],
+            path_vtorque_log=self.cluster.settings['path_vtorque_log'],
+            poll_time_min=0.1, poll_time_max=0.5, poll_fast_period=5))
+        self.job_script = helpers.write_job_script(self.root)
+
+    def _experiment(self, name):
+        return ExperimentConfig(helpers.Workload(name, {
+            'job_script': self.job_script, 'qsub_args': '-l nodes=1'}),
+            self.hpcConfig)
+
+    def _run(self, *experiments):
+        backends = [AsyncHPCBackend(self.hpcConfig, self.channel)
+                    for experiment in experiments]
+        self.loop.run_until_complete(asyncio.gather(*[
+            backend.run_experiment_async(experiment)
+            for (backend, experiment) in zip(backends, experiments)]))
+        return backends
+
+    def test_concurrent_jobs(self):
+        self._setup_cluster()
+        experiments = [self._experiment('job{}'.format(i)) for i in range(3)]
+        backends = self._run(*experiments)
+        for experiment in experiments:
+            self.assertEqual(experiment.get_job_state(), 'C')
+            self.assertEqual(experiment.get_exit_status(), 0)
+        self.assertIsInstance(backends[0].poller, AsyncPoller)
+        # one poller for all jobs of the loop
+        self.assertIs(backends[0].poller, backends[2].poller)
+
+    def test_registries_dropped_after_run(self):
+        self._setup_cluster()
+        self._run(self._experiment('job'))
+        self.assertEqual(async_backend._pollers, {})
+        self.assertEqual(async_backend._limits, {})
+        self.assertEqual(async_backend._running, {})
+
+    def test_vanished_job_not_polled_blocking(self):
+        # completed jobs vanish at once, thus the job is seen in state None
+        self._setup_cluster(keep_completed=0, run_time=[0.0, 0.0])
+        experiment = self._experiment('vanishing')
+        backend = AsyncHPCBackend(self.hpcConfig, self.channel)
+
+        def batch_status(job_ids):
+            raise AssertionError('blocking status query in the event loop')
+        backend.scheduler.batch_status = batch_status
+        self.loop.run_until_complete(backend.run_experiment_async(experiment))
+        self.assertIsNotNone(experiment.get_job_id())
+        self.assertFalse(experiment.get_timings()['running_observed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the workload dependency order"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import unittest
+
+import helpers
+from api.dag import has_dependencies, sort_experiments
+
+
+class _Experiment(object):
+    """Name and dependencies of an experiment, as ExperimentConfig."""
+
+    def __init__(self, name, depends_on=()):
+        self.name = name
+        self.depends_on = list(depends_on)
+
+    def get_name(self):
+        return self.name
+
+    def get_depends_on(self):
+        return self.depends_on
+
+
+def _names(experiments):
+    return [experiment.get_name() for experiment in experiments]
+
+
+class SortExperimentsTest(unittest.TestCase):
+
+    def test_dependencies_first(self):
+        experiments = [_Experiment('report', ['solve', 'mesh']),
+                       _Experiment('solve', ['mesh']),
+                       _Experiment('mesh'),
+                       _Experiment('other')]
+        ordered = _names(sort_experiments(experiments))
+        self.assertEqual(sorted(ordered), ['mesh', 'other', 'report', 'solve'])
+        self.assertLess(ordered.index('mesh'), ordered.index('solve'))
+        self.assertLess(ordered.index('solve'), ordered.index('report'))
+
+    def test_independent_order_is_kept(self):
+        experiments = [_Experiment(name) for name in ('c', 'a', 'b')]
+        self.assertEqual(_names(sort_experiments(experiments)), ['c', 'a', 'b'])
+
+    def test_deep_chain(self):
+        # deeper than the recursion limit
+        experiments = [_Experiment(str(i), [str(i + 1)]) for i in range(5000)]
+        experiments.append(_Experiment('5000'))
+        ordered = _names(sort_experiments(experiments))
+        self.assertEqual(ordered, [str(i) for i in range(5000, -1, -1)])
+
+    def test_cycle(self):
+        experiments = [_Experiment('a', ['b']), _Experiment('b', ['c']),
+                       _Experiment('c', ['a'])]
+        self.assertRaises(SystemExit, sort_experiments, experiments)
+
+    def test_self_dependency(self):
+        self.assertRaises(SystemExit, sort_experiments, [_Experiment('a', ['a'])])
+
+    def test_unknown_dependency(self):
+        self.assertRaises(SystemExit, sort_experiments,
+                          [_Experiment('a', ['missing'])])
+
+    def test_duplicate_name(self):
+        self.assertRaises(SystemExit, sort_experiments,
+                          [_Experiment('a'), _Experiment('a')])
+
+    def test_has_dependencies(self):
+        self.assertFalse(has_dependencies([_Experiment('a'), _Experiment('b')]))
+        self.assertTrue(has_dependencies([_Experiment('a'),
+                                          _Experiment('b', ['a'])]))
+
+
+if __name__ == '__main__':
+    unittest.main()
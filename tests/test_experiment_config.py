@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the experiment configuration"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from api.hpc_config import load_hpc_config
+from api.experiment_config import ExperimentConfig
+
+
+class ArrayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(self.root))
+        self.job_script = helpers.write_job_script(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _load(self, array):
+        return ExperimentConfig(helpers.Workload(
+            'array', {'job_script': self.job_script, 'array': array}),
+            self.hpcConfig)
+
+    def test_no_array(self):
+        experiment = ExperimentConfig(helpers.Workload(
+            'single', {'job_script': self.job_script}), self.hpcConfig)
+        self.assertIsNone(experiment.get_array_request())
+        self.assertIsNone(experiment.get_array_indices())
+
+    def test_range_with_slots(self):
+        experiment = self._load('1-3,8%2')
+        self.assertEqual(experiment.get_array_request(), '1-3,8%2')
+        self.assertEqual(experiment.get_array_indices(), [1, 2, 3, 8])
+        self.assertIsNone(experiment.get_array_values())
+
+    def test_count(self):
+        experiment = self._load(3)
+        self.assertEqual(experiment.get_array_request(), '0-2')
+        self.assertEqual(experiment.get_array_indices(), [0, 1, 2])
+
+    def test_values(self):
+        experiment = self._load({'values': ['a', 2, 'c'], 'slots': 1})
+        self.assertEqual(experiment.get_array_request(), '0-2%1')
+        self.assertEqual(experiment.get_array_indices(), [0, 1, 2])
+        self.assertEqual(experiment.get_array_values(), ['a', '2', 'c'])
+
+    def test_indices(self):
+        experiment = self._load({'indices': '5, 7-8'})
+        self.assertEqual(experiment.get_array_request(), '5,7-8')
+        self.assertEqual(experiment.get_array_indices(), [5, 7, 8])
+
+    def test_invalid(self):
+        self.assertRaises(SystemExit, self._load, '1-x')
+        self.assertRaises(SystemExit, self._load, 0)
+        self.assertRaises(SystemExit, self._load, {'values': ['a b']})
+        self.assertRaises(SystemExit, self._load, {'values': ['a,b', 'c']})
+
+
+class NameListTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(self.root))
+        self.job_script = helpers.write_job_script(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _load(self, **params):
+        params['job_script'] = self.job_script
+        return ExperimentConfig(helpers.Workload('names', params),
+                                self.hpcConfig)
+
+    def test_single_names(self):
+        # YAML loads non-ASCII strings as unicode in python 2
+        experiment = self._load(depends_on=u'build', alternatives=u'small')
+        self.assertEqual(experiment.get_depends_on(), [u'build'])
+        self.assertEqual(experiment.get_alternatives(), [u'small'])
+
+    def test_lists(self):
+        experiment = self._load(depends_on=['a', 'b'], alternatives=('c',))
+        self.assertEqual(experiment.get_depends_on(), ['a', 'b'])
+        self.assertEqual(experiment.get_alternatives(), ['c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
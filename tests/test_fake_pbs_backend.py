@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of whole experiment runs against the fake PBS cluster"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from fake_pbs import FakeCluster, FakeChannel
+from api.hpc_config import load_hpc_config
+from api.experiment_config import ExperimentConfig
+from api.hpc_backend import HPCBackend
+
+
+# fast jobs, the tests wait for them to finish
+SETTINGS = {
+    'queue_delay': [0.1, 0.3],
+    'run_time': [0.2, 0.4],
+    'qstat_latency': 0.0,
+    'log_size': 256
+}
+
+
+class FakePBSBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.cluster = FakeCluster(os.path.join(self.root, 'cluster'), **SETTINGS)
+        os.makedirs(os.path.join(self.cluster.home, 'exec'))
+        self.channel = FakeChannel(self.cluster)
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(
+            self.root, host=FakeChannel.host, user_name=FakeChannel.user_name,
+            domain=self.cluster.settings['domain'],
+            path_vtorque_log=self.cluster.settings['path_vtorque_log'],
+            poll_time_min=0.1, poll_time_max=0.5, poll_fast_period=5))
+        self.job_script = helpers.write_job_script(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _run(self, name, **params):
+        params['job_script'] = self.job_script
+        experiment = ExperimentConfig(helpers.Workload(name, params),
+                                      self.hpcConfig)
+        HPCBackend(self.hpcConfig, self.channel).run_experiment(experiment)
+        return experiment
+
+    def test_job(self):
+        experiment = self._run('job', qsub_args='-l nodes=1')
+        self.assertEqual(experiment.get_job_state(), 'C')
+        self.assertEqual(experiment.get_exit_status(), 0)
+        self.assertIsNone(experiment.get_vm_timings())
+        timings = experiment.get_timings()
+        for phase in ('stage_in', 'submit', 'queue_wait', 'execution', 'collect'):
+            self.assertIsNotNone(timings[phase])
+        stdout = experiment.get_result_files()['stdout']
+        with open(stdout) as log_file:
+            self.assertIn(experiment.get_job_id(), log_file.readline())
+        by_program = self.channel.get_stats()['by_program']
+        self.assertEqual(by_program['qsub'], 1)
+        self.assertNotIn('vsub', by_program)
+
+    def test_vm_job(self):
+        experiment = self._run('vm_job', vsub_args='-vm vcpus=2')
+        self.assertEqual(experiment.get_exit_status(), 0)
+        vm_timings = experiment.get_vm_timings()
+        self.assertEqual(list(vm_timings['nodes']), ['node001'])
+        for phase in ('image_staging', 'vm_boot', 'guest_ready', 'job_run',
+                      'teardown', 'total', 'overhead'):
+            self.assertIsNotNone(vm_timings[phase])
+        self.assertEqual(self.channel.get_stats()['by_program']['vsub'], 1)
+
+    def test_job_array(self):
+        experiment = self._run('array', array='1-3')
+        self.assertEqual(experiment.get_job_state(), 'C')
+        self.assertEqual(experiment.get_exit_status(), 0)
+        self.assertEqual(sorted(experiment.get_array_records()), [1, 2, 3])
+
+    def test_failed_job(self):
+        self.cluster.settings['failure_rate'] = 1.0
+        FakeCluster(self.cluster.root, **self.cluster.settings)
+        experiment = self._run('failing')
+        self.assertEqual(experiment.get_job_state(), 'C')
+        self.assertEqual(experiment.get_exit_status(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
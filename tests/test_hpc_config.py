@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the shared, cached HPC back-end configuration"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from api import hpc_config
+from api.hpc_config import load_hpc_config
+from api.experiment_config import ExperimentConfig
+
+
+class LoadHPCConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.host = os.environ.pop('host', None)
+
+    def tearDown(self):
+        if self.host is None:
+            os.environ.pop('host', None)
+        else:
+            os.environ['host'] = self.host
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write(self, mtime, **overrides):
+        path = helpers.write_hpc_config(self.root, **overrides)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_parsed_once(self):
+        path = self._write(1000)
+        hpcConfig = load_hpc_config(path)
+        self.assertIs(load_hpc_config(path), hpcConfig)
+        # relative and absolute paths share the entry
+        self.assertIs(load_hpc_config(os.path.relpath(path)), hpcConfig)
+
+    def test_reloaded_on_change(self):
+        path = self._write(1000, host='frontend1')
+        hpcConfig = load_hpc_config(path)
+        path = self._write(2000, host='frontend2')
+        reloaded = load_hpc_config(path)
+        self.assertIsNot(reloaded, hpcConfig)
+        self.assertEqual(reloaded.get_value('host'), 'frontend2')
+        # outdated versions are dropped
+        self.assertEqual(len([key for key in hpc_config._configs
+                              if key[0] == os.path.abspath(path)]), 1)
+
+    def test_reloaded_on_env_change(self):
+        os.environ['host'] = 'frontend1'
+        path = self._write(1000, host='__host__')
+        self.assertEqual(load_hpc_config(path).get_value('host'), 'frontend1')
+        os.environ['host'] = 'frontend2'
+        self.assertEqual(load_hpc_config(path).get_value('host'), 'frontend2')
+        # the template is left untouched
+        with open(path) as config_file:
+            self.assertIn('__host__', config_file.read())
+
+    def test_missing_env_var(self):
+        path = self._write(1000, host='__host__')
+        self.assertRaises(SystemExit, load_hpc_config, path)
+
+    def test_missing_file(self):
+        self.assertRaises(SystemExit, load_hpc_config,
+                          os.path.join(self.root, 'missing.cfg'))
+
+    def test_shared_by_experiments(self):
+        path = self._write(1000)
+        job_script = helpers.write_job_script(self.root)
+        experiments = [ExperimentConfig(helpers.Workload(name, {
+            'job_script': job_script, 'hpc_config': path}))
+            for name in ('a', 'b')]
+        self.assertIs(experiments[0].get_base_hpc_config(),
+                      experiments[1].get_base_hpc_config())
+
+
+if __name__ == '__main__':
+    unittest.main()
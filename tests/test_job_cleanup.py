@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the cancellation of outstanding jobs on signals"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import sys
+import time
+import signal
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+import helpers
+import fake_pbs
+
+
+DRIVER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'cleanup_driver.py')
+
+# seconds to wait for the driver to submit, reattach or exit
+TIMEOUT = 30
+
+try:
+    import scotty
+except ImportError:
+    scotty = None
+
+
+class SignalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.log_path = os.path.join(self.root, 'driver.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _start(self, mode):
+        env = dict(os.environ, log_file=self.log_path, log_level='INFO')
+        return subprocess.Popen([sys.executable, DRIVER, self.root, mode],
+                                env=env)
+
+    def _get_jobs(self):
+        cluster_root = os.path.join(self.root, 'cluster')
+        if not os.path.isdir(os.path.join(cluster_root, 'jobs')):
+            return []
+        return fake_pbs._load_jobs(cluster_root)
+
+    def _read_log(self):
+        if not os.path.isfile(self.log_path):
+            return ''
+        with open(self.log_path) as log_file:
+            return log_file.read()
+
+    def _wait_for(self, process, condition):
+        deadline = time.time() + TIMEOUT
+        while not condition():
+            self.assertIsNone(process.poll(), 'driver exited early')
+            self.assertLess(time.time(), deadline, 'driver timed out')
+            time.sleep(0.1)
+        # the driver polls the job by now
+        time.sleep(0.5)
+
+    def _terminate(self, process):
+        process.send_signal(signal.SIGTERM)
+        deadline = time.time() + TIMEOUT
+        while process.poll() is None and time.time() < deadline:
+            time.sleep(0.1)
+        if process.poll() is None:
+            process.kill()
+        return process.wait()
+
+    def _assert_cancelled_on_signal(self, mode):
+        process = self._start(mode)
+        self._wait_for(process, self._get_jobs)
+        self.assertEqual(self._terminate(process), 128 + signal.SIGTERM)
+        jobs = self._get_jobs()
+        self.assertEqual(len(jobs), 1)
+        self.assertIsNotNone(jobs[0]['deleted'])
+        self.assertIn('Cancelling 1 outstanding job(s), signal {}'.format(
+            int(signal.SIGTERM)), self._read_log())
+
+    def test_backend(self):
+        self._assert_cancelled_on_signal('backend')
+
+    def test_dag(self):
+        self._assert_cancelled_on_signal('dag')
+
+    @unittest.skipIf(scotty is None, 'scotty is not installed')
+    def test_workload_gen(self):
+        self._assert_cancelled_on_signal('workload_gen')
+
+    def test_reattached_job(self):
+        # killed without cleanup, the job stays queued
+        process = self._start('backend')
+        self._wait_for(process, self._get_jobs)
+        process.kill()
+        process.wait()
+        self.assertIsNone(self._get_jobs()[0]['deleted'])
+
+        process = self._start('backend')
+        self._wait_for(process, lambda: 'Reattaching' in self._read_log())
+        self.assertEqual(self._terminate(process), 128 + signal.SIGTERM)
+        jobs = self._get_jobs()
+        self.assertEqual(len(jobs), 1)
+        self.assertIsNotNone(jobs[0]['deleted'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the job journal"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import subprocess
+
+import helpers
+from api.hpc_config import load_hpc_config
+from api.experiment_config import ExperimentConfig
+from api.job_journal import JobJournal, get_workload_key
+
+
+def _dead_pid():
+    """PID of a process that has exited."""
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class JobJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(self.root))
+        self.manifests = os.path.join(self.root, 'manifests')
+        self.job_script = helpers.write_job_script(self.root)
+        self.input_data = os.path.join(self.root, 'input')
+        os.makedirs(self.input_data)
+        self._write(os.path.join(self.input_data, 'a.dat'), 'a')
+        self.experiment = self._experiment()
+        self.journal = JobJournal(os.path.join(self.root, 'journal.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write(self, path, content):
+        with open(path, 'w') as data_file:
+            data_file.write(content)
+
+    def _experiment(self):
+        return ExperimentConfig(helpers.Workload('journaled', {
+            'job_script': self.job_script, 'input_data': self.input_data,
+            'qsub_args': '-l nodes=1'}), self.hpcConfig)
+
+    def _key(self):
+        return get_workload_key(self._experiment(), 'frontend', self.manifests)
+
+    def _submit(self, key):
+        self.journal.record_stage_in(key, self.experiment, 'frontend')
+        self.journal.record_submit(key, '1.frontend', 1000)
+
+    def _set_owner(self, key, pid):
+        connection = sqlite3.connect(self.journal.path)
+        with connection:
+            connection.execute('UPDATE jobs SET owner_pid = ? WHERE workload_key = ?',
+                               (pid, key))
+        connection.close()
+
+    def test_key_follows_the_content(self):
+        key = self._key()
+        self.assertEqual(self._key(), key)
+        # touched, but unchanged
+        os.utime(self.job_script, (time.time() + 10, time.time() + 10))
+        self.assertEqual(self._key(), key)
+        self._write(self.job_script, '#!/bin/bash\necho changed\n')
+        self.assertNotEqual(self._key(), key)
+        key = self._key()
+        self._write(os.path.join(self.input_data, 'b.dat'), 'b')
+        self.assertNotEqual(self._key(), key)
+
+    def test_key_follows_the_definition(self):
+        key = self._key()
+        self.assertNotEqual(
+            get_workload_key(self._experiment(), 'other', self.manifests), key)
+        self.experiment.qsub_args = '-l nodes=2'
+        self.assertNotEqual(
+            get_workload_key(self.experiment, 'frontend', self.manifests), key)
+
+    def test_run_lifecycle(self):
+        key = self._key()
+        self.assertIsNone(self.journal.get_unfinished(key))
+        self._submit(key)
+        self.journal.record_state(key, 'R')
+        entry = self.journal.get_unfinished(key)
+        self.assertEqual(entry['job_id'], '1.frontend')
+        self.assertEqual(entry['state'], 'R')
+        self.assertEqual(entry['owner_pid'], os.getpid())
+        self.assertEqual([row['workload_key'] for row in self.journal.get_in_flight()],
+                         [key])
+        self.journal.record_finished(key)
+        self.assertIsNone(self.journal.get_unfinished(key))
+
+    def test_live_owner_is_not_taken_over(self):
+        key = self._key()
+        self._submit(key)
+        entry = self.journal.get_unfinished(key)
+        self.assertTrue(self.journal.is_owner_alive(entry))
+        self.assertFalse(self.journal.claim(entry))
+
+    def test_owner_on_other_host_counts_as_alive(self):
+        key = self._key()
+        self._submit(key)
+        entry = self.journal.get_unfinished(key)
+        entry['owner_host'] = 'other-host'
+        entry['owner_pid'] = _dead_pid()
+        self.assertTrue(self.journal.is_owner_alive(entry))
+
+    def test_dead_owner_is_taken_over_once(self):
+        key = self._key()
+        self._submit(key)
+        self._set_owner(key, _dead_pid())
+        entry = self.journal.get_unfinished(key)
+        self.assertFalse(self.journal.is_owner_alive(entry))
+        self.assertTrue(self.journal.claim(entry))
+        self.assertEqual(self.journal.get_unfinished(key)['owner_pid'], os.getpid())
+        # a second process with the same stale entry
+        self.assertFalse(self.journal.claim(entry))
+
+    def test_only_the_owner_updates(self):
+        key = self._key()
+        self._submit(key)
+        self._set_owner(key, _dead_pid())
+        self.journal.record_state(key, 'C')
+        self.journal.record_finished(key)
+        entry = self.journal.get_unfinished(key)
+        self.assertIsNotNone(entry)
+        self.assertIsNone(entry['state'])
+
+    def test_journal_without_owners(self):
+        path = os.path.join(self.root, 'old.sqlite')
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.execute(
+                'CREATE TABLE jobs (workload_key TEXT PRIMARY KEY, name TEXT NOT NULL, '
+                'sweep_id TEXT, host TEXT, job_id TEXT, state TEXT, '
+                'stage_in_time REAL, submit_time INTEGER, updated REAL NOT NULL, '
+                'finished INTEGER NOT NULL DEFAULT 0)')
+            connection.execute(
+                "INSERT INTO jobs (workload_key, name, job_id, updated) "
+                "VALUES ('old', 'journaled', '7.frontend', 0)")
+        connection.close()
+        journal = JobJournal(path)
+        entry = journal.get_unfinished('old')
+        self.assertIsNone(entry['owner_pid'])
+        self.assertTrue(journal.claim(entry))
+
+
+class ReattachTest(unittest.TestCase):
+    """Reattaching of the back-end, on the fake PBS cluster."""
+
+    def setUp(self):
+        from fake_pbs import FakeCluster, FakeChannel
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        cluster = FakeCluster(os.path.join(self.root, 'cluster'),
+                              queue_delay=[0.1, 0.2], run_time=[0.2, 0.3],
+                              qstat_latency=0.0)
+        os.makedirs(os.path.join(cluster.home, 'exec'))
+        self.channel = FakeChannel(cluster)
+        self.job_script = helpers.write_job_script(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _run(self, reattach, owner_pid):
+        from api.hpc_backend import HPCBackend
+        from fake_pbs import FakeChannel
+        hpcConfig = load_hpc_config(helpers.write_hpc_config(
+            self.root, host=FakeChannel.host, user_name=FakeChannel.user_name,
+            journal_path=os.path.join(self.root, 'journal.sqlite'),
+            journal_reattach=reattach, poll_time_min=0.1, poll_time_max=0.5))
+        backend = HPCBackend(hpcConfig, self.channel)
+        experiment = ExperimentConfig(helpers.Workload(
+            'reattached', {'job_script': self.job_script}), hpcConfig)
+        # a job left by an earlier run
+        key = backend._get_journal_key(experiment)
+        backend.journal.record_stage_in(key, experiment, FakeChannel.host)
+        backend.journal.record_submit(
+            key, self.channel('cd exec; qsub job_script.sh').strip(), 1000)
+        connection = sqlite3.connect(backend.journal.path)
+        with connection:
+            connection.execute('UPDATE jobs SET owner_pid = ?', (owner_pid,))
+        connection.close()
+        backend.run_experiment(experiment)
+        return experiment
+
+    def _stage_job_script(self):
+        shutil.copy(self.job_script, os.path.join(
+            self.channel.cluster.home, 'exec'))
+
+    def test_reattach_to_dead_run(self):
+        self._stage_job_script()
+        experiment = self._run(True, _dead_pid())
+        self.assertEqual(experiment.get_job_id(), '1.frontend.mydomain')
+        self.assertEqual(self.channel.get_stats()['by_program']['qsub'], 1)
+
+    def test_opt_in(self):
+        self._stage_job_script()
+        experiment = self._run(False, _dead_pid())
+        self.assertEqual(experiment.get_job_id(), '2.frontend.mydomain')
+
+    def test_live_run_is_not_reattached_to(self):
+        self._stage_job_script()
+        experiment = self._run(True, os.getpid())
+        self.assertEqual(experiment.get_job_id(), '2.frontend.mydomain')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the load generator against the simulated Torque cluster"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import shutil
+import tempfile
+import unittest
+import itertools
+
+import helpers
+from fake_pbs import FakeCluster, FakeChannel
+from api import ssh_channel
+from api.load_generator import iter_arrivals, LoadGenerator
+
+
+class IterArrivalsTest(unittest.TestCase):
+
+    def _first(self, count, *args, **kwargs):
+        return list(itertools.islice(iter_arrivals(*args, **kwargs), count))
+
+    def test_constant(self):
+        self.assertEqual(self._first(4, 'constant', 2), [0.0, 0.5, 1.0, 1.5])
+
+    def test_burst(self):
+        self.assertEqual(self._first(5, 'burst', 2, burst_size=2),
+                         [0.0, 0.0, 1.0, 1.0, 2.0])
+
+    def test_poisson(self):
+        arrivals = self._first(10000, 'poisson', 5, seed=1)
+        self.assertEqual(arrivals, self._first(10000, 'poisson', 5, seed=1))
+        self.assertTrue(all(a <= b for (a, b) in zip(arrivals, arrivals[1:])))
+        # 5 jobs per second on average
+        self.assertAlmostEqual(len(arrivals) / arrivals[-1], 5, delta=0.25)
+
+
+class LoadGeneratorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.cluster = FakeCluster(os.path.join(self.root, 'cluster'),
+                                   queue_delay=[0.0, 0.1], run_time=[0.1, 0.2],
+                                   qstat_latency=0.0)
+        os.makedirs(os.path.join(self.cluster.home, 'exec'))
+        self.hpc_config = helpers.write_hpc_config(
+            self.root, host=FakeChannel.host, user_name=FakeChannel.user_name,
+            domain=self.cluster.settings['domain'],
+            poll_time_min=0.1, poll_time_max=0.5, poll_fast_period=5)
+        # the back-end of the generator uses the fake cluster's channel
+        self.channel_key = (FakeChannel.host, FakeChannel.user_name, '22', 'none')
+        ssh_channel._channels[self.channel_key] = FakeChannel(self.cluster)
+        self.job_script = helpers.write_job_script(self.root)
+
+    def tearDown(self):
+        ssh_channel._channels.pop(self.channel_key, None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _generator(self, **loadCfg):
+        return LoadGenerator(helpers.Workload('load', {
+            'job_script': self.job_script, 'hpc_config': self.hpc_config,
+            'load': loadCfg}))
+
+    def _set(self, **settings):
+        self.cluster.settings.update(settings)
+        FakeCluster(self.cluster.root, **self.cluster.settings)
+
+    def test_invalid_load(self):
+        self.assertRaises(SystemExit, self._generator, rate=1)
+        self.assertRaises(SystemExit, self._generator, rate=0, jobs=1)
+        self.assertRaises(SystemExit, self._generator, arrival='wave', jobs=1)
+
+    def test_load(self):
+        result = self._generator(rate=20, jobs=4).run()
+        self.assertEqual((result['submitted'], result['completed'],
+                          result['failed'], result['cancelled']), (4, 4, 0, 0))
+        self.assertTrue(result['complete'])
+        self.assertEqual(result['turnaround']['count'], 4)
+        self.assertEqual(len(self.cluster.get_jobs()), 4)
+
+    def test_cancel_without_drain(self):
+        self._set(queue_delay=[60.0, 60.0])
+        result = self._generator(rate=20, jobs=3, drain=False).run()
+        self.assertEqual((result['submitted'], result['completed'],
+                          result['cancelled']), (3, 0, 3))
+        for job in self.cluster.get_jobs():
+            self.assertTrue(job['deleted'])
+
+    def test_submit_errors(self):
+        self._set(submit_failure_rate=1.0)
+        result = self._generator(rate=20, jobs=2).run()
+        self.assertEqual((result['submitted'], result['submit_errors']), (0, 2))
+        self.assertEqual(self.cluster.get_jobs(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
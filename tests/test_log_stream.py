@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the chunked remote log streaming"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import io
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from api.ssh_channel import LocalChannel
+from api.log_stream import LogFetcher, _ChunkWriter
+
+
+class _Sink(object):
+    """Binary file-like, records the size of each write."""
+
+    def __init__(self):
+        self.data = io.BytesIO()
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(len(data))
+        self.data.write(data)
+
+
+class ChunkWriterTest(unittest.TestCase):
+
+    def test_plain(self):
+        sink = _Sink()
+        writer = _ChunkWriter(sink, False, 16)
+        writer.write(b'abc')
+        writer.write(u'dé')
+        writer.finish()
+        self.assertEqual(sink.data.getvalue(), u'abcdé'.encode('utf-8'))
+        self.assertEqual(writer.bytes_received, writer.bytes_written)
+
+    def test_inflate_chunk_by_chunk(self):
+        payload = b'0' * (1024 * 1024)
+        compressed = io.BytesIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as gzip_file:
+            gzip_file.write(payload)
+        compressed = compressed.getvalue()
+        sink = _Sink()
+        writer = _ChunkWriter(sink, True, 4096)
+        for start in range(0, len(compressed), 100):
+            writer.write(compressed[start:start + 100])
+        writer.finish()
+        self.assertEqual(sink.data.getvalue(), payload)
+        self.assertEqual(writer.bytes_received, len(compressed))
+        self.assertEqual(writer.bytes_written, len(payload))
+        # a small compressed chunk never inflates into one large buffer
+        self.assertLessEqual(max(sink.writes), 4096)
+
+
+class LogFetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.log_path = os.path.join(self.root, 'job.log')
+        self.lines = ['line {}\n'.format(i) for i in range(1000)]
+        self._append(''.join(self.lines))
+        self.content = ''.join(self.lines).encode('utf-8')
+        self.fetcher = LogFetcher(LocalChannel(self.root), chunk_size=1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _append(self, text):
+        with open(self.log_path, 'a') as log_file:
+            log_file.write(text)
+
+    def _fetch(self, **kwargs):
+        out = io.BytesIO()
+        written = self.fetcher.fetch(self.log_path, out, **kwargs)
+        self.assertEqual(written, len(out.getvalue()))
+        return out.getvalue()
+
+    def test_whole_file(self):
+        self.assertEqual(self._fetch(), self.content)
+        self.assertEqual(self._fetch(compress=True), self.content)
+
+    def test_byte_range(self):
+        self.assertEqual(self._fetch(offset=100, length=50),
+                         self.content[100:150])
+        self.assertEqual(self._fetch(offset=100, length=50, compress=True),
+                         self.content[100:150])
+
+    def test_tail_lines(self):
+        self.assertEqual(self._fetch(tail_lines=3),
+                         ''.join(self.lines[-3:]).encode('utf-8'))
+
+    def test_live_tail(self):
+        out = io.BytesIO()
+        self.assertEqual(self.fetcher.fetch_new(self.log_path, out),
+                         len(self.content))
+        self._append('new line\n')
+        self.assertEqual(self.fetcher.fetch_new(self.log_path, out), 9)
+        self.assertEqual(self.fetcher.fetch_new(self.log_path, out), 0)
+        self.assertEqual(out.getvalue(), self.content + b'new line\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the grouping and the wrapper job script of packed workloads"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+import helpers
+from fake_pbs import FakeCluster, FakeChannel
+from api.hpc_config import load_hpc_config
+from api.experiment_config import ExperimentConfig
+from api.packing import get_pack_groups, get_pbs_directives, PackBackend
+
+
+class GetPackGroupsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(
+            self.root, pack_max_workloads=3))
+        os.makedirs(os.path.join(self.root, 'other'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _experiment(self, name, pack=True, qsub_args='-l nodes=1', script=None,
+                    directives=''):
+        job_script = helpers.write_job_script(
+            self.root, script or '{}.sh'.format(name))
+        if directives:
+            with open(job_script, 'w') as script_file:
+                script_file.write('#!/bin/bash\n' + directives + 'echo hi\n')
+        return ExperimentConfig(helpers.Workload(name, {
+            'job_script': job_script, 'qsub_args': qsub_args, 'pack': pack}),
+            self.hpcConfig)
+
+    def test_groups_by_qsub_args(self):
+        experiments = [self._experiment('a'), self._experiment('b'),
+                       self._experiment('c', qsub_args='-l nodes=2'),
+                       self._experiment('d'),
+                       self._experiment('e', qsub_args='-l nodes=2')]
+        self.assertEqual(get_pack_groups(experiments), ([[0, 1, 3], [2, 4]], []))
+
+    def test_unpackable_and_alone(self):
+        experiments = [self._experiment('a', pack=False), self._experiment('b'),
+                       self._experiment('c', qsub_args='-l nodes=2')]
+        self.assertEqual(get_pack_groups(experiments), ([], [0, 1, 2]))
+
+    def test_max_workloads(self):
+        experiments = [self._experiment(name) for name in 'abcde']
+        self.assertEqual(get_pack_groups(experiments), ([[0, 1, 2], [3, 4]], []))
+
+    def test_same_job_script_name(self):
+        experiments = [self._experiment('a', script='job.sh'),
+                       self._experiment('b', script='other/job.sh'),
+                       self._experiment('c')]
+        self.assertEqual(get_pack_groups(experiments), ([[0, 2]], [1]))
+
+    def test_groups_by_directives(self):
+        walltime = '#PBS -l walltime=00:10:00\n'
+        experiments = [self._experiment('a', directives=walltime),
+                       self._experiment('b', directives='#PBS -q fast\n'),
+                       self._experiment('c', directives=walltime),
+                       self._experiment('d')]
+        self.assertEqual(get_pack_groups(experiments), ([[0, 2]], [1, 3]))
+
+    def test_missing_job_script(self):
+        experiments = [self._experiment(name) for name in 'abc']
+        os.remove(experiments[1].get_job_script())
+        self.assertEqual(get_pack_groups(experiments), ([[0, 2]], [1]))
+
+
+class GetPBSDirectivesTest(unittest.TestCase):
+
+    def test_directives_until_first_command(self):
+        root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        path = os.path.join(root, 'job.sh')
+        with open(path, 'w') as script_file:
+            script_file.write('#!/bin/bash\n#PBS  -N  job\n\n# comment\n'
+                              '#PBS -l nodes=2\necho hi\n#PBS -q late\n')
+        self.assertEqual(get_pbs_directives(path),
+                         ('#PBS -N job', '#PBS -l nodes=2'))
+
+
+class PackWrapperTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        cluster = FakeCluster(os.path.join(self.root, 'cluster'))
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(
+            self.root, host=FakeChannel.host, user_name=FakeChannel.user_name))
+        self.channel = FakeChannel(cluster)
+        self.job_dir = os.path.join(self.root, 'exec')
+        os.makedirs(self.job_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _member(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as script_file:
+            script_file.write(content)
+        shutil.copy(path, self.job_dir)
+        return ExperimentConfig(helpers.Workload(name, {'job_script': path}),
+                                self.hpcConfig)
+
+    def test_members_run_by_their_interpreter(self):
+        members = [
+            self._member('a.sh', '#!/bin/bash\n#PBS -l walltime=60\n'
+                         'echo "$BASH_VERSION" | cut -c1\nexit 3\n'),
+            self._member('b.py', '#!{}\n#PBS -l walltime=60\n'
+                         'import sys\nprint(sys.version_info[0])\n'.format(
+                             sys.executable))]
+        hpcBackend = PackBackend(self.hpcConfig, members, self.channel)
+        wrapper = hpcBackend.experiment.get_job_script()
+        with open(wrapper) as wrapper_file:
+            self.assertEqual(wrapper_file.read().splitlines()[:2],
+                             ['#!/bin/bash', '#PBS -l walltime=60'])
+        env = dict(os.environ, PBS_O_WORKDIR=self.job_dir)
+        subprocess.check_call(['bash', wrapper], env=env)
+        pack_dir = os.path.join(self.job_dir, hpcBackend.pack_name)
+        outputs = []
+        for name in ('0.rc', '0.o', '1.rc', '1.o'):
+            with open(os.path.join(pack_dir, name)) as output_file:
+                outputs.append(output_file.read().strip())
+        self.assertEqual(outputs[0], '3')
+        self.assertTrue(outputs[1].isdigit())
+        self.assertEqual(outputs[2:], ['0', str(sys.version_info[0])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the phase timings"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from api.phase_timer import PhaseTimer, get_distribution
+from api.qstat_parser import JobRecord
+from api.ssh_channel import LocalChannel
+from api.hpc_config import load_hpc_config
+from api.experiment_config import ExperimentConfig
+from api.hpc_backend import HPCBackend
+
+
+class GetDistributionTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertIsNone(get_distribution([]))
+
+    def test_single_value(self):
+        self.assertEqual(get_distribution([3.0]), {
+            'count': 1, 'mean': 3.0, 'max': 3.0,
+            'p50': 3.0, 'p95': 3.0, 'p99': 3.0})
+
+    def test_nearest_rank(self):
+        distribution = get_distribution([float(value) for value in range(100, 0, -1)])
+        self.assertEqual(distribution['count'], 100)
+        self.assertEqual(distribution['mean'], 50.5)
+        self.assertEqual(distribution['max'], 100.0)
+        self.assertEqual(distribution['p50'], 50.0)
+        self.assertEqual(distribution['p95'], 95.0)
+        self.assertEqual(distribution['p99'], 99.0)
+
+    def test_small_sample(self):
+        distribution = get_distribution([4.0, 1.0, 3.0, 2.0])
+        self.assertEqual(distribution['p50'], 2.0)
+        self.assertEqual(distribution['p95'], 4.0)
+
+
+class PhaseTimerTest(unittest.TestCase):
+
+    def test_phases_not_passed(self):
+        timings = PhaseTimer().get_timings()
+        self.assertIsNone(timings['stage_in'])
+        self.assertIsNone(timings['total'])
+        self.assertFalse(timings['running_observed'])
+
+    def test_wait_split_at_running(self):
+        timer = PhaseTimer()
+        timer.started['wait'] = 10.0
+        timer.durations['wait'] = 5.0
+        timer.events['running'] = 12.0
+        timings = timer.get_timings()
+        self.assertEqual(timings['queue_wait'], 2.0)
+        self.assertEqual(timings['execution'], 3.0)
+        self.assertTrue(timings['running_observed'])
+        self.assertEqual(timings['total'], 5.0)
+
+    def test_never_seen_running(self):
+        timer = PhaseTimer()
+        with timer.phase('wait'):
+            pass
+        timings = timer.get_timings()
+        self.assertEqual(timings['queue_wait'], timer.durations['wait'])
+        self.assertEqual(timings['execution'], 0.0)
+        self.assertFalse(timings['running_observed'])
+
+    def test_first_mark_counts(self):
+        timer = PhaseTimer()
+        timer.mark('running')
+        first = timer.events['running']
+        timer.mark('running')
+        self.assertEqual(timer.events['running'], first)
+
+
+class ObservedStatesTest(unittest.TestCase):
+    """Queue wait and execution split by the polled job states."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        hpcConfig = load_hpc_config(helpers.write_hpc_config(self.root))
+        self.backend = HPCBackend(hpcConfig, LocalChannel(self.root))
+        self.experiment = ExperimentConfig(helpers.Workload(
+            'timed', {'job_script': helpers.write_job_script(self.root)}),
+            hpcConfig)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _poll(self, *states):
+        timer = self.experiment.get_phase_timer()
+        with timer.phase('wait'):
+            for state in states:
+                record = JobRecord('1.frontend')
+                record.state = state
+                self.backend._apply_job_record(self.experiment, record)
+        return self.experiment.get_timings()
+
+    def test_seen_running(self):
+        timings = self._poll('Q', 'R', 'C')
+        self.assertTrue(timings['running_observed'])
+
+    def test_first_seen_finished(self):
+        for state in ('C', 'E'):
+            self.experiment.phase_timer = PhaseTimer()
+            timings = self._poll('Q', state)
+            self.assertFalse(timings['running_observed'])
+            self.assertEqual(timings['execution'], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the adaptive poll interval"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import unittest
+
+import helpers
+from api import poll_strategy
+from api.poll_strategy import AdaptivePolling, parse_walltime
+
+
+class _Config(object):
+
+    poll_time_qstat = 10
+    poll_time_min = 1
+    poll_time_max = 60
+    poll_backoff = 2
+    poll_jitter = 0
+    poll_fast_period = 5
+
+
+class _Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ParseWalltimeTest(unittest.TestCase):
+
+    def test_walltime(self):
+        self.assertEqual(parse_walltime('-l nodes=1,walltime=01:02:03'), 3723)
+        self.assertEqual(parse_walltime('-l walltime=90'), 90)
+        self.assertIsNone(parse_walltime('-l nodes=1'))
+        self.assertIsNone(parse_walltime(None))
+
+
+class AdaptivePollingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = _Clock()
+        self._time = poll_strategy.time
+        poll_strategy.time = self.clock
+
+    def tearDown(self):
+        poll_strategy.time = self._time
+
+    def _polling(self, walltime=None):
+        polling = AdaptivePolling(_Config(), walltime)
+        # past the fast polling after submit
+        self.clock.now += 10
+        return polling
+
+    def test_fast_after_submit(self):
+        polling = AdaptivePolling(_Config())
+        self.assertEqual(polling.next_interval('Q'), 1)
+        self.assertEqual(polling.next_interval('R'), 1)
+
+    def test_backoff_while_queued(self):
+        polling = self._polling()
+        intervals = [polling.next_interval('Q') for i in range(5)]
+        self.assertEqual(intervals, [20, 40, 60, 60, 60])
+
+    def test_running(self):
+        polling = self._polling()
+        polling.next_interval('Q')
+        self.assertEqual(polling.next_interval('R'), 10)
+
+    def test_shrinks_towards_walltime_end(self):
+        polling = self._polling(walltime=100)
+        self.assertEqual(polling.next_interval('R'), 10)
+        self.clock.now += 90
+        self.assertEqual(polling.next_interval('R'), 5)
+        self.clock.now += 9
+        self.assertEqual(polling.next_interval('R'), 1)
+
+    def test_unknown_and_finishing(self):
+        polling = self._polling()
+        self.assertEqual(polling.next_interval(None), 1)
+        self.assertEqual(polling.next_interval('E'), 1)
+
+    def test_jitter(self):
+        config = _Config()
+        config.poll_jitter = 0.1
+        polling = AdaptivePolling(config)
+        self.clock.now += 10
+        for i in range(20):
+            self.assertTrue(9 <= polling.next_interval('R') <= 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
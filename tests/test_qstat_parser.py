@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the qstat output parser"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import unittest
+
+import helpers
+from api import qstat_parser
+
+
+FULL_OUTPUT = '''Job Id: 12.frontend.mydomain
+    Job_Name = job_script.sh
+    job_state = C
+    queue = batch
+    exec_host = node001/0+node001/1+node002/0+
+\tnode002/1
+    exit_status = 0
+    resources_used.cput = 00:00:02
+    resources_used.mem = 3412kb
+    resources_used.walltime = 00:00:05
+    Variable_List = PBS_O_QUEUE=batch,
+\tPBS_O_WORKDIR=/home/user/exec
+
+Job Id: 13[].frontend.mydomain
+    job_state = R
+    queue = express
+    exit_status = unknown
+'''
+
+
+class ParseFullTest(unittest.TestCase):
+
+    def setUp(self):
+        self.records = list(qstat_parser.parse_full(FULL_OUTPUT.splitlines()))
+
+    def test_one_record_per_job(self):
+        self.assertEqual([record.job_id for record in self.records],
+                         ['12.frontend.mydomain', '13[].frontend.mydomain'])
+
+    def test_attributes(self):
+        record = self.records[0]
+        self.assertEqual(record.state, 'C')
+        self.assertEqual(record.queue, 'batch')
+        self.assertEqual(record.exit_status, 0)
+        self.assertEqual(record.resources_used, {
+            'cput': '00:00:02', 'mem': '3412kb', 'walltime': '00:00:05'})
+
+    def test_continuation_lines(self):
+        self.assertEqual(self.records[0].exec_host,
+                         'node001/0+node001/1+node002/0+node002/1')
+
+    def test_invalid_exit_status(self):
+        self.assertEqual(self.records[1].state, 'R')
+        self.assertIsNone(self.records[1].exit_status)
+
+    def test_lines_before_first_job_are_skipped(self):
+        lines = ['qstat: garbage', ''] + FULL_OUTPUT.splitlines()
+        self.assertEqual(len(list(qstat_parser.parse_full(lines))), 2)
+
+    def test_empty_output(self):
+        self.assertEqual(list(qstat_parser.parse_full([])), [])
+
+
+class AggregateArrayTest(unittest.TestCase):
+
+    def _record(self, state, exit_status=None, queue=None):
+        record = qstat_parser.JobRecord('13[]')
+        record.state = state
+        record.exit_status = exit_status
+        record.queue = queue
+        return record
+
+    def test_most_active_state(self):
+        record = qstat_parser.aggregate_array('13[]', {
+            1: self._record('C', 0), 2: self._record('Q'), 3: self._record('R')})
+        self.assertEqual(record.job_id, '13[]')
+        self.assertEqual(record.state, 'R')
+
+    def test_first_non_zero_exit_status(self):
+        record = qstat_parser.aggregate_array('13[]', {
+            3: self._record('C', 1), 1: self._record('C', 0),
+            2: self._record('C', 2)})
+        self.assertEqual(record.state, 'C')
+        self.assertEqual(record.exit_status, 2)
+
+    def test_all_succeeded(self):
+        record = qstat_parser.aggregate_array('13[]', {
+            1: self._record('C', 0, 'batch'), 2: self._record('C', 0)})
+        self.assertEqual(record.exit_status, 0)
+        self.assertEqual(record.queue, 'batch')
+
+    def test_no_exit_status_while_running(self):
+        record = qstat_parser.aggregate_array('13[]', {
+            1: self._record('R'), 2: self._record('Q')})
+        self.assertIsNone(record.exit_status)
+
+
+class JobIdTest(unittest.TestCase):
+
+    def test_strip_job_id(self):
+        self.assertEqual(qstat_parser.strip_job_id('123.host.domain'), '123')
+        self.assertEqual(qstat_parser.strip_job_id('123[].host'), '123[]')
+        self.assertEqual(qstat_parser.strip_job_id('123[4].host'), '123[4]')
+
+    def test_split_array_job_id(self):
+        self.assertEqual(qstat_parser.split_array_job_id('123[4]'), ('123[]', 4))
+        self.assertIsNone(qstat_parser.split_array_job_id('123[]'))
+        self.assertIsNone(qstat_parser.split_array_job_id('123'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the shared job state poller"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import time
+import threading
+import unittest
+
+import helpers
+from api.qstat_parser import JobRecord
+from api.qstat_poller import QstatPoller
+
+
+class _Scheduler(object):
+    """Batch status of fixed job states, each query takes 'latency' seconds."""
+
+    def __init__(self, states, latency=0.0):
+        self.states = states
+        self.latency = latency
+        self.queries = []
+
+    def batch_status(self, job_ids):
+        self.queries.append(list(job_ids))
+        time.sleep(self.latency)
+        for job_id, state in sorted(self.states.items()):
+            record = JobRecord('{}.frontend'.format(job_id))
+            record.state = state
+            yield record
+
+
+class QstatPollerTest(unittest.TestCase):
+
+    def test_one_query_for_all_jobs(self):
+        scheduler = _Scheduler({'1': 'R', '2': 'Q', '3': 'C'})
+        poller = QstatPoller(scheduler, 60)
+        for job_id in ('1', '2', '3'):
+            poller.track(job_id)
+        self.assertEqual(poller.get_state('1'), 'R')
+        self.assertEqual(poller.get_state('2'), 'Q')
+        self.assertEqual(poller.get_state('3'), 'C')
+        self.assertEqual(scheduler.queries, [['1', '2', '3']])
+
+    def test_outdated_cache(self):
+        scheduler = _Scheduler({'1': 'Q'})
+        poller = QstatPoller(scheduler, 0.1)
+        poller.track('1')
+        poller.get_state('1')
+        scheduler.states['1'] = 'R'
+        self.assertEqual(poller.get_state('1'), 'Q')
+        time.sleep(0.15)
+        self.assertEqual(poller.get_state('1'), 'R')
+        self.assertEqual(len(scheduler.queries), 2)
+
+    def test_new_job_is_queried(self):
+        scheduler = _Scheduler({'1': 'R', '2': 'Q'})
+        poller = QstatPoller(scheduler, 60)
+        poller.track('1')
+        poller.get_state('1')
+        poller.track('2')
+        self.assertEqual(poller.get_state('2'), 'Q')
+        self.assertEqual(scheduler.queries, [['1'], ['1', '2']])
+
+    def test_unknown_and_untracked_jobs(self):
+        scheduler = _Scheduler({'1': 'R', '9': 'R'})
+        poller = QstatPoller(scheduler, 60)
+        poller.track('1')
+        poller.track('2')
+        self.assertIsNone(poller.get_state('2'))
+        self.assertIsNone(poller.get_state('9'))
+        poller.untrack('1')
+        self.assertIsNone(poller.get_record('1'))
+
+    def test_job_array(self):
+        scheduler = _Scheduler({'5[1]': 'C', '5[2]': 'R'})
+        poller = QstatPoller(scheduler, 60)
+        poller.track('5[]')
+        self.assertEqual(poller.get_state('5[]'), 'R')
+        self.assertEqual(sorted(poller.get_array_records('5[]')), [1, 2])
+
+    def test_concurrent_callers_share_the_query(self):
+        scheduler = _Scheduler(dict((str(i), 'R') for i in range(10)), 0.5)
+        poller = QstatPoller(scheduler, 60)
+        for i in range(10):
+            poller.track(str(i))
+        states = {}
+        threads = [threading.Thread(target=lambda job_id=str(i):
+                                    states.update({job_id: poller.get_state(job_id)}))
+                   for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(scheduler.queries), 1)
+        self.assertEqual(set(states.values()), set(['R']))
+
+    def test_lock_is_free_during_the_query(self):
+        scheduler = _Scheduler({'1': 'R', '2': 'R'}, 1.0)
+        poller = QstatPoller(scheduler, 60)
+        poller.track('1')
+        poller.track('2')
+        thread = threading.Thread(target=poller.get_state, args=('1',))
+        thread.start()
+        time.sleep(0.2)
+        start = time.time()
+        poller.untrack('2')
+        poller.track('3')
+        self.assertLess(time.time() - start, 0.5)
+        thread.join()
+        # untracked while the query ran
+        self.assertIsNone(poller.get_record('2'))
+
+
+if __name__ == '__main__':
+    unittest.main()
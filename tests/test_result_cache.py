@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the result cache"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+from __future__ import with_statement
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from api.hpc_config import load_hpc_config
+from api.experiment_config import ExperimentConfig
+from api.qstat_parser import JobRecord
+from api.result_cache import ResultCache, META_FILE
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(self.root))
+        self.job_script = helpers.write_job_script(self.root)
+        self.cache = self._cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _cache(self, ttl=3600, max_bytes=1024 * 1024):
+        return ResultCache(os.path.join(self.root, 'cache'), ttl, max_bytes,
+                           os.path.join(self.root, 'manifests'))
+
+    def _experiment(self, name='cached'):
+        return ExperimentConfig(helpers.Workload(name, {
+            'job_script': self.job_script, 'qsub_args': '-l nodes=1'}),
+            self.hpcConfig)
+
+    def _finished(self, exit_status, array_exit_states=(), size=10):
+        experiment = self._experiment()
+        record = JobRecord('1.frontend')
+        record.state = 'C'
+        record.exit_status = exit_status
+        experiment.set_start_time(1000)
+        experiment.set_job_id('1.frontend')
+        experiment.set_job_record(record)
+        array_records = {}
+        for index, sub_exit_status in enumerate(array_exit_states):
+            array_records[index] = JobRecord('1[{}]'.format(index))
+            array_records[index].exit_status = sub_exit_status
+        experiment.set_array_records(array_records)
+        stdout = os.path.join(self.root, 'stdout')
+        with open(stdout, 'w') as log_file:
+            log_file.write('x' * size)
+        experiment.set_result_files({'stdout': stdout})
+        return experiment
+
+    def _store(self, experiment, key='a' * 40):
+        self.cache.store(key, experiment)
+        return key
+
+    def _load(self, key='a' * 40):
+        experiment = self._experiment()
+        return self.cache.load(key, experiment), experiment
+
+    def _set_meta(self, key, created=None, used=None):
+        meta_path = os.path.join(self.cache._get_entry_dir(key), META_FILE)
+        if created is not None:
+            with open(meta_path) as data_file:
+                meta = json.load(data_file)
+            meta['created'] = created
+            with open(meta_path, 'w') as data_file:
+                json.dump(meta, data_file)
+        if used is not None:
+            os.utime(meta_path, (used, used))
+
+    def test_key(self):
+        key = self.cache.get_key(self._experiment(), self.hpcConfig)
+        self.assertEqual(self.cache.get_key(self._experiment('other'), self.hpcConfig),
+                         key)
+        with open(self.job_script, 'a') as script_file:
+            script_file.write('echo changed\n')
+        self.assertNotEqual(self.cache.get_key(self._experiment(), self.hpcConfig), key)
+
+    def test_hit(self):
+        self._store(self._finished(0))
+        hit, experiment = self._load()
+        self.assertTrue(hit)
+        self.assertEqual(experiment.get_job_id(), '1.frontend')
+        self.assertEqual(experiment.get_exit_status(), 0)
+        with open(experiment.get_result_files()['stdout']) as log_file:
+            self.assertEqual(log_file.read(), 'x' * 10)
+
+    def test_miss(self):
+        self.assertFalse(self._load()[0])
+
+    def test_only_successful_jobs(self):
+        for exit_status, array_exit_states in ((1, ()), (None, ()),
+                                               (0, (0, 2)), (0, (0, None))):
+            self._store(self._finished(exit_status, array_exit_states))
+            self.assertFalse(self._load()[0], (exit_status, array_exit_states))
+        self._store(self._finished(0, (0, 0)))
+        self.assertTrue(self._load()[0])
+
+    def test_expired_on_load(self):
+        key = self._store(self._finished(0))
+        # recently used, but stored before the ttl
+        self._set_meta(key, created=time.time() - 7200)
+        self.assertFalse(self._load(key)[0])
+
+    def test_evicted_by_creation_time(self):
+        old = self._store(self._finished(0), 'a' * 40)
+        fresh = self._store(self._finished(0), 'b' * 40)
+        self._set_meta(old, created=time.time() - 7200, used=time.time())
+        self._set_meta(fresh, used=time.time() - 7200)
+        self.cache.evict()
+        self.assertFalse(os.path.isdir(self.cache._get_entry_dir(old)))
+        self.assertTrue(os.path.isdir(self.cache._get_entry_dir(fresh)))
+
+    def test_least_recently_used_beyond_max_bytes(self):
+        self.cache = self._cache(max_bytes=3500)
+        keys = [c * 40 for c in 'abc']
+        for age, key in zip((300, 100, 200), keys):
+            self._store(self._finished(0, size=1000), key)
+            self._set_meta(key, used=time.time() - age)
+        self.cache.evict()
+        self.assertEqual([os.path.isdir(self.cache._get_entry_dir(key)) for key in keys],
+                         [False, True, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the batch system commands"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from api.hpc_config import load_hpc_config
+from api.scheduler import (MAX_IDS_PER_QUERY, TorqueScheduler, SlurmScheduler,
+                           LocalScheduler)
+
+
+class GetStatusCommandsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(self.root))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_torque_chunks(self):
+        job_ids = ['{}'.format(i) for i in range(2 * MAX_IDS_PER_QUERY + 1)]
+        commands = TorqueScheduler(self.hpcConfig, None).get_status_commands(job_ids)
+        self.assertEqual(len(commands), 3)
+        queried = []
+        for program, args in commands:
+            self.assertEqual(program, 'qstat')
+            self.assertEqual(args[0], '-f')
+            self.assertLessEqual(len(args) - 1, MAX_IDS_PER_QUERY)
+            queried.extend(args[1:])
+        self.assertEqual(queried, ["'{}'".format(job_id) for job_id in job_ids])
+
+    def test_torque_expands_arrays(self):
+        commands = TorqueScheduler(self.hpcConfig, None).get_status_commands(
+            ['1', '2[]'])
+        self.assertEqual(commands, [['qstat', ['-f', '-t', "'1'", "'2[]'"]]])
+
+    def test_slurm(self):
+        commands = SlurmScheduler(self.hpcConfig, None).get_status_commands(
+            ['1', '2[]'])
+        self.assertEqual(len(commands), 1)
+        self.assertEqual(commands[0][-2:], ['-j', '1,2'])
+
+    def test_local_has_no_status_command(self):
+        self.assertIsNone(LocalScheduler(self.hpcConfig, None).get_status_commands(
+            ['1', '2']))
+
+
+class _Channel(object):
+    """Channel answering sacct and squeue with fixed output lines."""
+
+    def __init__(self, outputs):
+        self.outputs = outputs
+        self.commands = []
+
+    def __call__(self, *args, **kwargs):
+        program = args[0]
+        self.commands.append(program)
+        return list(self.outputs.get(program, []))
+
+
+class SlurmBatchStatusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(self.root))
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _batch_status(self, job_ids, sacct, squeue=()):
+        channel = _Channel({'sacct': sacct, 'squeue': squeue})
+        records = SlurmScheduler(self.hpcConfig, channel).batch_status(job_ids)
+        return dict((record.job_id, record) for record in records), channel.commands
+
+    def test_all_accounted(self):
+        records, commands = self._batch_status(['1', '2[]'], [
+            '1|COMPLETED|0:0|batch|node1|00:00:01|||00:00:05',
+            '1.batch|COMPLETED|0:0|||00:00:01|1024K|2048K|00:00:05',
+            '2_1|RUNNING|0:0|batch|node2|00:00:01|||00:00:05'])
+        self.assertEqual(commands, ['sacct'])
+        self.assertEqual(records['1'].state, 'C')
+        self.assertEqual(records['1'].exit_status, 0)
+        self.assertEqual(records['1'].resources_used['mem'], '1024K')
+        self.assertEqual(records['2[1]'].state, 'R')
+
+    def test_not_yet_accounted(self):
+        records, commands = self._batch_status(['1', '2', '3[]'], [
+            '1|RUNNING|0:0|batch|node1|00:00:01|||00:00:05'], [
+            '2|PENDING|batch|',
+            '3_[1-4]|PENDING|batch|'])
+        self.assertEqual(commands, ['sacct', 'squeue'])
+        self.assertEqual(records['2'].state, 'Q')
+        self.assertIsNone(records['2'].exit_status)
+        self.assertEqual(records['3[]'].state, 'Q')
+
+    def test_finished_but_not_accounted(self):
+        records, commands = self._batch_status(['1'], [], ['1|COMPLETED|batch|node1'])
+        # not done before its exit code is known
+        self.assertEqual(records['1'].state, 'E')
+
+    def test_unknown_everywhere(self):
+        records, commands = self._batch_status(['1'], [], [])
+        self.assertEqual(records, {})
+        self.assertEqual(commands, ['sacct', 'squeue'])
+
+    def test_torque_has_no_unseen_command(self):
+        self.assertEqual(TorqueScheduler(self.hpcConfig, None)
+                         .get_unseen_status_commands(['1']), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the shared SSH master connection and the local channel"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from sh import ErrorReturnCode_1, ErrorReturnCode_255
+
+import helpers
+from api import ssh_channel
+from api.hpc_config import load_hpc_config
+from api.ssh_channel import SSHChannel, LocalChannel, get_channel
+
+
+class _SSH(object):
+    """Stands in for sh's ssh, a master connection that can be dropped."""
+
+    def __init__(self):
+        self.master = False
+        self.calls = []
+        self.exit_code = 0
+
+    def __call__(self, *args, **kwargs):
+        words = ssh_channel._flatten(args)
+        if '-O' in words:
+            operation = words[words.index('-O') + 1]
+            self.calls.append(operation)
+            if not self.master:
+                raise ErrorReturnCode_255('ssh -O', b'', b'No ControlPath')
+            if operation == 'exit':
+                self.master = False
+            return ''
+        if '-M' in words:
+            self.calls.append('connect')
+            self.master = True
+            return ''
+        command = ' '.join(words[words.index('frontend') + 1:])
+        self.calls.append(command)
+        if not self.master:
+            raise ErrorReturnCode_255('ssh', b'', b'Connection closed')
+        if self.exit_code == 255:
+            raise ErrorReturnCode_255('ssh', b'', b'remote 255')
+        if self.exit_code == 1:
+            raise ErrorReturnCode_1('ssh', b'', b'failed')
+        return 'output of ' + command
+
+
+class SSHChannelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ssh = _SSH()
+        self._ssh = ssh_channel.ssh
+        ssh_channel.ssh = self.ssh
+        self.channel = SSHChannel('frontend', 'user', 22, '/keys/id_rsa')
+
+    def tearDown(self):
+        ssh_channel.ssh = self._ssh
+
+    def test_one_handshake_for_many_commands(self):
+        self.assertEqual(self.channel('qstat'), 'output of qstat')
+        self.assertEqual(self.channel('qsub', 'job.sh'), 'output of qsub job.sh')
+        # no health check within HEALTH_CHECK_INTERVAL
+        self.assertEqual(self.ssh.calls, ['check', 'connect', 'qstat',
+                                          'qsub job.sh'])
+        self.assertEqual(self.channel.get_stats(), {
+            'handshakes': 1, 'reconnects': 0, 'commands': 2})
+
+    def test_options(self):
+        self.assertIn('ControlMaster=auto', self.channel.ssh_options)
+        self.assertIn('BatchMode=yes', self.channel.ssh_options)
+        self.assertLess(len(self.channel.control_path), 100)
+        self.assertEqual(self.channel.rsync_target('~/exec'),
+                         'user@frontend:~/exec')
+        argv, cwd, env = self.channel.get_process_args('qstat', ['-f', 1])
+        self.assertEqual(argv[0], 'ssh')
+        self.assertEqual(argv[-4:], ['frontend', 'qstat', '-f', '1'])
+
+    def test_reconnect_after_lost_master(self):
+        self.channel('qstat')
+        self.ssh.master = False
+        self.assertEqual(self.channel('qstat'), 'output of qstat')
+        self.assertEqual(self.ssh.calls[3:], ['qstat', 'check', 'check',
+                                              'connect', 'qstat'])
+        self.assertEqual(self.channel.get_stats(), {
+            'handshakes': 2, 'reconnects': 1, 'commands': 3})
+
+    def test_no_retry_of_submissions(self):
+        self.channel('qstat')
+        self.ssh.master = False
+        self.assertRaises(ErrorReturnCode_255, self.channel, 'qsub', 'job.sh',
+                          _retry=False)
+        self.assertEqual(self.ssh.calls.count('qsub job.sh'), 1)
+
+    def test_remote_exit_codes(self):
+        self.channel('qstat')
+        # the master is alive, 255 is the command's own
+        self.ssh.exit_code = 255
+        self.assertRaises(ErrorReturnCode_255, self.channel, 'false')
+        self.ssh.exit_code = 1
+        self.assertRaises(ErrorReturnCode_1, self.channel, 'false')
+        self.assertEqual(self.ssh.calls.count('false'), 2)
+        self.assertEqual(self.channel.get_stats()['handshakes'], 1)
+
+    def test_close(self):
+        self.channel('qstat')
+        self.channel.close()
+        self.assertEqual(self.ssh.calls[-2:], ['check', 'exit'])
+        self.assertFalse(self.ssh.master)
+        # nothing to close
+        self.channel.close()
+        self.assertEqual(self.ssh.calls[-1], 'check')
+
+
+class LocalChannelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_runs_in_home(self):
+        env = dict(os.environ, HPCWG_TEST='value')
+        channel = LocalChannel(self.root, env)
+        output = channel('pwd;', 'echo', '$HPCWG_TEST', _retry=False)
+        self.assertEqual(output.split(), [os.path.realpath(self.root), 'value'])
+        self.assertEqual(channel.rsync_target('~/exec'),
+                         os.path.join(self.root, 'exec'))
+        self.assertEqual(channel.get_stats()['commands'], 1)
+
+
+class GetChannelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_one_channel_per_connection(self):
+        configs = []
+        for name, user in (('a', 'alice'), ('b', 'alice'), ('c', 'bob')):
+            os.makedirs(os.path.join(self.root, name))
+            configs.append(load_hpc_config(helpers.write_hpc_config(
+                os.path.join(self.root, name), host='frontend', user_name=user)))
+        try:
+            channels = [get_channel(config) for config in configs]
+            self.assertIsInstance(channels[0], SSHChannel)
+            self.assertIs(channels[0], channels[1])
+            self.assertIsNot(channels[0], channels[2])
+        finally:
+            for user in ('alice', 'bob'):
+                ssh_channel._channels.pop(('frontend', user, '22', 'none'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the incremental stage-in"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from api import stage_manifest
+from api.ssh_channel import LocalChannel
+from api.stage_manifest import IncrementalStager, build_manifest
+
+
+class _CountingHash(object):
+
+    def __init__(self, file_hash):
+        self.file_hash = file_hash
+        self.paths = []
+
+    def __call__(self, path):
+        self.paths.append(os.path.basename(path))
+        return self.file_hash(path)
+
+
+class StageManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.cache_dir = os.path.join(self.root, 'cache')
+        self.home = os.path.join(self.root, 'home')
+        os.makedirs(os.path.join(self.home, 'exec'))
+        self.data = os.path.join(self.root, 'local', 'data')
+        os.makedirs(os.path.join(self.data, 'sub'))
+        self._write('a.dat', 'a')
+        self._write('sub/b.dat', 'bb')
+        self.hashes = _CountingHash(stage_manifest.file_hash)
+        self._file_hash = stage_manifest.file_hash
+        stage_manifest.file_hash = self.hashes
+        channel = LocalChannel(self.home, dict(os.environ, HOME=self.home))
+        self.stager = IncrementalStager(channel, '~/exec', self.cache_dir)
+
+    def tearDown(self):
+        stage_manifest.file_hash = self._file_hash
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write(self, rel_path, content, mtime=None):
+        path = os.path.join(self.data, rel_path)
+        with open(path, 'w') as data_file:
+            data_file.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def _remote(self, rel_path):
+        with open(os.path.join(self.home, 'exec', 'data', rel_path)) as data_file:
+            return data_file.read()
+
+    def test_manifest(self):
+        manifest = build_manifest(self.data, self.cache_dir)
+        self.assertEqual(sorted(manifest), ['data/a.dat', 'data/sub/b.dat'])
+        self.assertEqual(manifest['data/sub/b.dat']['size'], 2)
+        self.assertEqual(manifest['data/a.dat']['sha1'],
+                         '86f7e437faa5a7fce15d1ddcb9eaeaea377667b8')
+        # unchanged files are not hashed again
+        self.assertEqual(build_manifest(self.data, self.cache_dir), manifest)
+        self.assertEqual(sorted(self.hashes.paths), ['a.dat', 'b.dat'])
+
+    def test_incremental_stage_in(self):
+        stats = self.stager.stage(self.data + '/')
+        self.assertEqual((stats['files_sent'], stats['bytes_sent']), (2, 3))
+        self.assertEqual(self._remote('sub/b.dat'), 'bb')
+
+        stats = self.stager.stage(self.data)
+        self.assertEqual(stats['skipped'], 1)
+        self.assertEqual(stats['files_sent'], 0)
+
+        self._write('sub/b.dat', 'cc', mtime=1000)
+        stats = self.stager.stage(self.data)
+        self.assertEqual((stats['files_sent'], stats['bytes_saved']), (1, 1))
+        self.assertEqual(self._remote('sub/b.dat'), 'cc')
+
+    def test_touched_file_not_sent(self):
+        self.stager.stage(self.data)
+        # same content, new mtime: hashed again, but not sent
+        self._write('a.dat', 'a', mtime=1000)
+        stats = self.stager.stage(self.data)
+        self.assertEqual(stats['skipped'], 1)
+        self.assertEqual(self.hashes.paths.count('a.dat'), 2)
+
+    def test_lost_remote_copy(self):
+        self.stager.stage(self.data)
+        shutil.rmtree(os.path.join(self.home, 'exec'))
+        os.makedirs(os.path.join(self.home, 'exec'))
+        stats = self.stager.stage(self.data)
+        self.assertEqual(stats['files_sent'], 2)
+        self.assertEqual(self._remote('a.dat'), 'a')
+
+
+if __name__ == '__main__':
+    unittest.main()
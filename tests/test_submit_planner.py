@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the planning of qsub args by predicted completion"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from api.hpc_config import load_hpc_config
+from api.experiment_config import ExperimentConfig
+from api.submit_planner import SubmitPlanner
+
+
+BATCH = '-q batch -l walltime=00:10:00'
+FAST = '-q fast -l walltime=00:15:00'
+
+
+class _Scheduler(object):
+    """Batch system with fixed queue depths and start estimates."""
+
+    def __init__(self, hpcConfig, queue_stats=None, estimates=None):
+        self.hpcConfig = hpcConfig
+        self.queue_stats = queue_stats
+        self.estimates = estimates or {}
+
+    def get_poll_key(self):
+        return ('stub', id(self))
+
+    def get_queue(self, qsub_args):
+        args = (qsub_args or '').split()
+        return args[args.index('-q') + 1] if '-q' in args else None
+
+    def get_queue_stats(self):
+        if self.queue_stats is None:
+            raise NotImplementedError()
+        return self.queue_stats
+
+    def get_start_estimate(self, qsub_args):
+        return self.estimates.get(qsub_args)
+
+
+class SubmitPlannerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.hpcConfig = load_hpc_config(helpers.write_hpc_config(
+            self.root, planner_queued_job_time=60))
+        self.job_script = helpers.write_job_script(self.root)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _experiment(self):
+        return ExperimentConfig(helpers.Workload('planned', {
+            'job_script': self.job_script, 'qsub_args': BATCH,
+            'alternatives': [FAST]}), self.hpcConfig)
+
+    def _queues(self, batch, fast):
+        return {'batch': {'queued': batch, 'running': 0, 'held': 0},
+                'fast': {'queued': fast, 'running': 0, 'held': 0}}
+
+    def _plan(self, scheduler):
+        experiment = self._experiment()
+        SubmitPlanner(scheduler).plan(experiment)
+        return experiment, experiment.get_plan()
+
+    def test_by_queue_depth(self):
+        scheduler = _Scheduler(self.hpcConfig, self._queues(10, 0))
+        experiment, plan = self._plan(scheduler)
+        # batch: 11 * 60 + 600, fast: 1 * 60 + 900
+        self.assertEqual(plan['qsub_args'], FAST)
+        self.assertEqual([prediction['predicted_completion']
+                          for prediction in plan['alternatives']], [1260, 960])
+        self.assertEqual((plan['source'], plan['queued']), ('queue', 0))
+        self.assertEqual(experiment.get_declared_qsub_args(), BATCH)
+
+        scheduler.queue_stats = self._queues(2, 0)
+        experiment, plan = self._plan(scheduler)
+        self.assertEqual(plan['qsub_args'], BATCH)
+
+    def test_estimate_first(self):
+        scheduler = _Scheduler(self.hpcConfig, self._queues(10, 0),
+                               {BATCH: 30.0})
+        experiment, plan = self._plan(scheduler)
+        self.assertEqual(plan['qsub_args'], BATCH)
+        self.assertEqual((plan['source'], plan['predicted_start']),
+                         ('estimate', 30.0))
+
+    def test_no_prediction(self):
+        experiment, plan = self._plan(_Scheduler(self.hpcConfig))
+        self.assertEqual(plan['qsub_args'], BATCH)
+        self.assertIsNone(plan['predicted_completion'])
+
+    def test_learns_wait_per_queued_job(self):
+        scheduler = _Scheduler(self.hpcConfig, self._queues(3, 0))
+        planner = SubmitPlanner(scheduler)
+        experiment, plan = self._plan(scheduler)
+        self.assertEqual(plan['qsub_args'], BATCH)
+        timer = experiment.get_phase_timer()
+        timer.started['submit'] = 100.0
+        timer.events['running'] = 140.0
+        planner.report(experiment)
+        self.assertEqual(plan['actual_start'], 40.0)
+        # 40s for 4 jobs, thus 10s per queued job in 'batch'
+        experiment, plan = self._plan(scheduler)
+        self.assertEqual(plan['alternatives'][0]['predicted_start'], 40.0)
+        self.assertEqual(plan['alternatives'][1]['predicted_start'], 60.0)
+
+    def test_report_not_running(self):
+        scheduler = _Scheduler(self.hpcConfig, self._queues(0, 3))
+        experiment, plan = self._plan(scheduler)
+        SubmitPlanner(scheduler).report(experiment)
+        self.assertIsNone(plan['actual_start'])
+
+
+if __name__ == '__main__':
+    unittest.main()
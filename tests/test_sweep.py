@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the parameter sweep expansion"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import unittest
+
+import helpers
+from api.sweep import render_point, get_sweep_id, _iter_points
+
+
+class RenderPointTest(unittest.TestCase):
+
+    def test_replaces_existing_resources(self):
+        params = render_point(
+            {'job_script': 'job.sh', 'qsub_args': '-l nodes=1:ppn=4,walltime=00:10:00',
+             'sweep': {'nodes': [1, 2]}},
+            {'nodes': 2, 'walltime': '01:00:00'})
+        self.assertEqual(params['qsub_args'], '-l nodes=2:ppn=4,walltime=01:00:00')
+        self.assertNotIn('sweep', params)
+        self.assertEqual(params['job_script'], 'job.sh')
+
+    def test_appends_missing_resources(self):
+        params = render_point({'qsub_args': '-q batch'}, {'nodes': 4})
+        self.assertEqual(params['qsub_args'], '-q batch -l nodes=4')
+
+    def test_without_qsub_args(self):
+        params = render_point({}, {'walltime': '00:05:00'})
+        self.assertEqual(params['qsub_args'], '-l walltime=00:05:00')
+        self.assertNotIn('vsub_args', params)
+
+    def test_vm_resources(self):
+        params = render_point({'vsub_args': '-vm vcpus=4 -vm ram=8012M'},
+                              {'vcpus': 8, 'ram': '16G'})
+        self.assertEqual(params['vsub_args'], '-vm vcpus=8 -vm ram=16G')
+        self.assertNotIn('qsub_args', params)
+
+    def test_environment(self):
+        params = render_point({'qsub_args': '-l nodes=1'},
+                              {'env.THREADS': 4, 'env.MODE': 'fast'})
+        self.assertEqual(params['qsub_args'],
+                         '-l nodes=1 -v MODE=fast,THREADS=4')
+
+    def test_environment_merged_into_existing_list(self):
+        params = render_point({'qsub_args': '-v MODE=slow,PATH=/opt -l nodes=1'},
+                              {'env.THREADS': 4, 'env.MODE': 'fast'})
+        self.assertEqual(params['qsub_args'],
+                         '-v PATH=/opt,MODE=fast,THREADS=4 -l nodes=1')
+
+    def test_keeps_params_of_caller(self):
+        original = {'qsub_args': '-l nodes=1', 'sweep': {'nodes': [2]}}
+        render_point(original, {'nodes': 2})
+        self.assertEqual(original, {'qsub_args': '-l nodes=1',
+                                    'sweep': {'nodes': [2]}})
+
+    def test_unknown_parameter(self):
+        self.assertRaises(SystemExit, render_point, {}, {'colour': 'red'})
+
+
+class IterPointsTest(unittest.TestCase):
+
+    def test_zip(self):
+        points = list(_iter_points({'mode': 'zip', 'nodes': [1, 2],
+                                    'vcpus': {'range': [2, 4, 2]},
+                                    'walltime': '00:10:00'}))
+        self.assertEqual(points, [
+            {'nodes': 1, 'vcpus': 2, 'walltime': '00:10:00'},
+            {'nodes': 2, 'vcpus': 4, 'walltime': '00:10:00'}])
+
+    def test_zip_unequal_lengths(self):
+        sweepCfg = {'mode': 'zip', 'nodes': [1, 2, 4], 'env': {'A': [1, 2]}}
+        self.assertRaises(ValueError, list, _iter_points(sweepCfg))
+
+
+class SweepIdTest(unittest.TestCase):
+
+    def test_stable_and_distinct(self):
+        self.assertEqual(get_sweep_id({'nodes': 1, 'env.A': 'x'}),
+                         get_sweep_id({'env.A': 'x', 'nodes': 1}))
+        self.assertNotEqual(get_sweep_id({'nodes': 1}), get_sweep_id({'nodes': 2}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the selection of submission targets"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from fake_pbs import FakeCluster, FakeChannel
+from api import ssh_channel
+from api.hpc_config import load_hpc_config
+from api.target_selector import (TargetSelector, get_target_selector,
+                                 select_target, release_target)
+
+
+class _Experiment(object):
+
+    def __init__(self, name, qsub_args=None):
+        self.name = name
+        self.qsub_args = qsub_args
+        self.start_time = None
+        self.end_time = None
+
+    def get_name(self):
+        return self.name
+
+    def get_qsub_args(self):
+        return self.qsub_args
+
+    def get_start_time(self):
+        return self.start_time
+
+    def get_end_time(self):
+        return self.end_time
+
+
+class TargetSelectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.clusters = {}
+        for name in ('a', 'b'):
+            cluster = FakeCluster(os.path.join(self.root, name),
+                                  queue_delay=[600.0, 600.0], qstat_latency=0.0)
+            with open(os.path.join(cluster.home, 'job.sh'), 'w') as job_script:
+                job_script.write('#!/bin/bash\n')
+            self.clusters[name] = cluster
+            # each target reaches its own cluster
+            ssh_channel._channels[('fake-' + name, FakeChannel.user_name,
+                                   '22', 'none')] = FakeChannel(cluster)
+
+    def tearDown(self):
+        for name in self.clusters:
+            ssh_channel._channels.pop(
+                ('fake-' + name, FakeChannel.user_name, '22', 'none'), None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _config(self, **target_b):
+        target_b.update({'name': 'b', 'host': 'fake-b'})
+        return load_hpc_config(helpers.write_hpc_config(
+            self.root, user_name=FakeChannel.user_name, target_load_max_age=0,
+            targets=[{'name': 'a', 'host': 'fake-a'}, target_b]))
+
+    def _queue(self, name, count):
+        channel = ssh_channel._channels[
+            ('fake-' + name, FakeChannel.user_name, '22', 'none')]
+        for i in range(count):
+            channel('qsub', 'job.sh')
+
+    def _select(self, selector, name='job', qsub_args=None):
+        return selector.select(_Experiment(name, qsub_args)).target_name
+
+    def test_least_queued(self):
+        self._queue('a', 3)
+        selector = TargetSelector(self._config())
+        self.assertEqual(self._select(selector), 'b')
+        self.assertEqual(selector.get_stats()['a']['queued'], 3)
+
+    def test_in_flight_counts(self):
+        selector = TargetSelector(self._config())
+        self.assertEqual([self._select(selector) for i in range(4)],
+                         ['a', 'b', 'a', 'b'])
+        self.assertEqual(selector.get_stats()['b']['in_flight'], 2)
+
+    def test_turnaround(self):
+        selector = TargetSelector(self._config())
+        hpcConfig = selector.stats[0].target
+        selector.select(_Experiment('job'), hpcConfig)
+        selector.release(hpcConfig, 100)
+        selector.select(_Experiment('job'), hpcConfig)
+        selector.release(hpcConfig, 200)
+        stats = selector.get_stats()['a']
+        self.assertEqual((stats['in_flight'], stats['finished']), (0, 2))
+        self.assertAlmostEqual(stats['turnaround'], 130.0)
+        # the unmeasured target counts as average, thus equal
+        self.assertEqual(self._select(selector), 'a')
+        target_b = selector.stats[1].target
+        selector.select(_Experiment('job'), target_b)
+        selector.release(target_b, 10)
+        self.assertEqual(self._select(selector), 'b')
+
+    def test_unreachable(self):
+        self._queue('a', 3)
+        selector = TargetSelector(self._config(path_qstat='no-such-qstat'))
+        self.assertEqual(self._select(selector), 'a')
+        self.assertFalse(selector.get_stats()['b']['reachable'])
+
+    def test_release_once(self):
+        hpcConfig = self._config()
+        experiment = _Experiment('job')
+        target = select_target(hpcConfig, experiment)
+        experiment.start_time, experiment.end_time = 1000, 51000
+        release_target(experiment)
+        release_target(experiment)
+        stats = get_target_selector(hpcConfig).get_stats()
+        self.assertEqual(stats[target.target_name]['finished'], 1)
+        self.assertEqual(stats[target.target_name]['turnaround'], 50.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the trace reader and the replay against the simulated cluster"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import helpers
+from fake_pbs import FakeCluster, FakeChannel
+from api import ssh_channel
+from api.trace_replay import (iter_trace_records, render_record, TraceRecord,
+                              TraceReplayer)
+
+
+SWF = '''; Version: 2.2
+; Computer: test
+1 0 5 100 32 -1 1024 32 200 -1 1 1 1 1 1 -1 -1 -1
+2 10 0 -1 16 -1 -1 16 60 -1 1 1 1 1 1 -1 -1 -1
+3 20 0 50 -1 -1 -1 8 60 -1 1 1 1 1 1 -1 -1 -1
+'''
+
+CSV = '''arrival,nodes,runtime,memory
+0,2,30,512
+1.5,1,10,
+'''
+
+
+class TraceReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path, 'w') as trace_file:
+            trace_file.write(content)
+        return path
+
+    def test_swf(self):
+        records = list(iter_trace_records(self._write('t.swf', SWF),
+                                          procs_per_node=16))
+        # job 2 has an unknown runtime
+        self.assertEqual([record.job_id for record in records], ['1', '3'])
+        self.assertEqual((records[0].arrival, records[0].nodes,
+                          records[0].runtime, records[0].walltime,
+                          records[0].memory), (0.0, 2, 100.0, 200.0, 32768.0))
+        # allocated processors if none were requested
+        self.assertEqual(records[1].nodes, 1)
+
+    def test_csv(self):
+        records = list(iter_trace_records(self._write('t.csv', CSV)))
+        self.assertEqual([(record.job_id, record.arrival, record.nodes,
+                           record.runtime, record.memory) for record in records],
+                         [('1', 0.0, 2, 30.0, 512 * 1024.0),
+                          ('2', 1.5, 1, 10.0, None)])
+
+    def test_unknown_format(self):
+        path = self._write('t.txt', CSV)
+        self.assertRaises(SystemExit, list, iter_trace_records(path))
+
+    def test_render_torque(self):
+        params = render_record({'qsub_args': '-q batch', 'trace': {}},
+                               TraceRecord('7', 0, 2, 120, memory=1024), 60,
+                               'torque')
+        self.assertEqual(params, {'qsub_args':
+                                  '-q batch -l nodes=2 -l walltime=00:01:02 '
+                                  '-l mem=1024kb -v HPCWG_TRACE_JOB=7,'
+                                  'HPCWG_RUNTIME=2.000'})
+
+    def test_render_slurm(self):
+        params = render_record({}, TraceRecord('7', 0, 2, 120), 1, 'slurm')
+        self.assertEqual(params['qsub_args'],
+                         '--nodes=2 --time=3 --export=ALL,HPCWG_TRACE_JOB=7,'
+                         'HPCWG_RUNTIME=120.000')
+
+
+class TraceReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='hpcwg-test-')
+        self.cluster = FakeCluster(os.path.join(self.root, 'cluster'),
+                                   queue_delay=[0.0, 0.1], run_time=[0.1, 0.2],
+                                   qstat_latency=0.0)
+        os.makedirs(os.path.join(self.cluster.home, 'exec'))
+        self.hpc_config = helpers.write_hpc_config(
+            self.root, host=FakeChannel.host, user_name=FakeChannel.user_name,
+            domain=self.cluster.settings['domain'],
+            poll_time_min=0.1, poll_time_max=0.5, poll_fast_period=5)
+        # the back-ends of the replay use the fake cluster's channel
+        self.channel_key = (FakeChannel.host, FakeChannel.user_name, '22', 'none')
+        ssh_channel._channels[self.channel_key] = FakeChannel(self.cluster)
+        self.trace = os.path.join(self.root, 'trace.csv')
+        with open(self.trace, 'w') as trace_file:
+            trace_file.write('arrival,nodes,runtime\n0,1,1\n10,1,1\n20,1,1\n')
+        self.output = os.path.join(self.root, 'replay.jsonl')
+
+    def tearDown(self):
+        ssh_channel._channels.pop(self.channel_key, None)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _replay(self):
+        return TraceReplayer(helpers.Workload('trace', {
+            'hpc_config': self.hpc_config,
+            'trace': {'path': self.trace, 'time_scale': 100,
+                      'output': self.output}})).run()
+
+    def _outcomes(self):
+        with open(self.output) as output_file:
+            return [json.loads(line) for line in output_file]
+
+    def test_replay(self):
+        stats = self._replay()
+        self.assertEqual((stats['submitted'], stats['submit_failed'],
+                          stats['succeeded'], stats['failed']), (3, 0, 3, 0))
+        outcomes = self._outcomes()
+        self.assertEqual(sorted(outcome['trace_job'] for outcome in outcomes),
+                         ['1', '2', '3'])
+        for outcome in outcomes:
+            self.assertIn('lag', outcome)
+            self.assertIsNotNone(outcome['job_id'])
+        self.assertEqual(len(self.cluster.get_jobs()), 3)
+
+    def test_failed_submissions(self):
+        self.cluster.settings['submit_failure_rate'] = 1.0
+        FakeCluster(self.cluster.root, **self.cluster.settings)
+        stats = self._replay()
+        self.assertEqual((stats['submitted'], stats['submit_failed'],
+                          stats['succeeded'], stats['failed']), (0, 3, 0, 0))
+        self.assertEqual(stats['max_lag'], 0.0)
+        for outcome in self._outcomes():
+            self.assertIn('error', outcome)
+            self.assertNotIn('lag', outcome)
+
+
+if __name__ == '__main__':
+    unittest.main()
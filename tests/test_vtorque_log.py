@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+#
+# Copyright 2018 HLRS, University of Stuttgart
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+
+"""Tests of the vTorque debug log parser"""
+
+# @Author: Uwe Schilling, schilling@hlrs.de
+# @Author: Nico Struckmann, struckmann@hlrs.de
+# @COMPANY: HLRS, University of Stuttgart
+# @Date: 2018-01-31
+
+import unittest
+
+import helpers
+from api.vtorque_log import get_log_format, get_vm_timings
+
+
+LOG = '''[2018-01-31T12:00:00] node001 Staging VM image debian.img
+[2018-01-31T12:00:00] node002 Staging VM image debian.img
+vsub: some unrelated output
+[2018-01-31T12:00:10] node001 Booting VMs
+[2018-01-31T12:00:12] node002 Booting VMs
+[2018-01-31T12:00:30] node001 VMs ready
+[2018-01-31T12:00:40] node002 VMs ready
+[2018-01-31T12:00:41] node001 Executing job script
+[2018-01-31T12:00:41] node001 Booting VMs
+[2018-01-31T12:01:41] node001 Job script finished
+[2018-01-31T12:01:42.5] node001 Tearing down VMs
+[2018-01-31T12:01:45] node001 VMs destroyed
+[2018-01-31T12:01:44] node002 Tearing down VMs
+[2018-01-31T12:01:50] node002 VMs destroyed
+'''
+
+
+class GetVMTimingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timings = get_vm_timings(LOG.splitlines())
+
+    def test_phases_per_node(self):
+        self.assertEqual(self.timings['nodes']['node001'], {
+            'image_staging': 10.0, 'vm_boot': 20.0, 'guest_ready': 11.0,
+            'job_run': 60.0, 'teardown': 2.5})
+        self.assertEqual(self.timings['nodes']['node002'], {
+            'image_staging': 12.0, 'vm_boot': 28.0, 'teardown': 6.0})
+
+    def test_slowest_node(self):
+        self.assertEqual(self.timings['image_staging'], 12.0)
+        self.assertEqual(self.timings['vm_boot'], 28.0)
+        self.assertEqual(self.timings['guest_ready'], 11.0)
+        self.assertEqual(self.timings['teardown'], 6.0)
+
+    def test_total_and_overhead(self):
+        self.assertEqual(self.timings['total'], 110.0)
+        self.assertEqual(self.timings['overhead'], 50.0)
+
+    def test_incomplete_log(self):
+        timings = get_vm_timings(LOG.splitlines()[:5])
+        self.assertEqual(timings['nodes']['node001'], {'image_staging': 10.0})
+        self.assertIsNone(timings['job_run'])
+        self.assertIsNone(timings['total'])
+        self.assertIsNone(timings['overhead'])
+
+    def test_no_phases(self):
+        self.assertIsNone(get_vm_timings([]))
+        self.assertIsNone(get_vm_timings(['vsub: no vm events']))
+
+
+class _Config(object):
+
+    def __init__(self, vtorque_log_line=None, vtorque_log_events=None):
+        self.vtorque_log_line = vtorque_log_line
+        self.vtorque_log_events = vtorque_log_events
+
+
+class LogFormatTest(unittest.TestCase):
+
+    LINE = (r'^(?P<date>\d{4}-\d{2}-\d{2}) (?P<time>\d{2}:\d{2}:\d{2})'
+            r'(?P<fraction>,\d+)? \[(?P<node>[^]]+)\] (?P<message>.*)$')
+
+    def test_default_format(self):
+        line_pattern, events = get_log_format(_Config())
+        self.assertEqual(get_vm_timings(LOG.splitlines(), line_pattern, events),
+                         get_vm_timings(LOG.splitlines()))
+
+    def test_custom_format(self):
+        line_pattern, events = get_log_format(_Config(self.LINE, {
+            'vm_boot': 'starting domain', 'vms_ready': r'domain \S+ is up'}))
+        timings = get_vm_timings([
+            '2018-01-31 12:00:00 [node001] staging image debian.img',
+            '2018-01-31 12:00:05,500 [node001] starting domain vm1',
+            '2018-01-31 12:00:20 [node001] domain vm1 is up',
+            '2018-01-31 12:00:21 [node001] ready'], line_pattern, events)
+        self.assertEqual(timings['nodes']['node001'], {
+            'image_staging': 5.5, 'vm_boot': 14.5})
+
+    def test_format_without_node(self):
+        line_pattern, events = get_log_format(_Config(
+            r'^(?P<date>\S+) (?P<time>\S+) (?P<message>.*)$'))
+        timings = get_vm_timings(['2018-01-31 12:00:00 Staging VM image',
+                                  '2018-01-31 12:00:03 Booting VMs'],
+                                 line_pattern, events)
+        self.assertEqual(timings['nodes'], {'vm': {'image_staging': 3.0}})
+
+    def test_invalid_format(self):
+        for config in (_Config('(?P<date>'),
+                       _Config(r'^(?P<date>\S+) (?P<message>.*)$'),
+                       _Config(vtorque_log_events={'booting': 'boot'})):
+            with self.assertRaises(SystemExit):
+                get_log_format(config)
+
+
+if __name__ == '__main__':
+    unittest.main()
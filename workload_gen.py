@@ -26,6 +26,14 @@ from scotty import utils
 
 from api.experiment_config import ExperimentConfig
 from api.hpc_backend import HPCBackend
+from api.executor import WorkloadExecutor
+from api.dag import DAGExecutor, has_dependencies
+from api.packing import PackExecutor
+from api.sweep import is_sweep, iter_experiment_configs
+from api.trace_replay import is_trace, TraceReplayer
+from api.load_generator import is_load, LoadGenerator
+from api.ssh_channel import close_all
+from api.job_cleanup import cancel_outstanding, SignalExit
 
 
 logger = logging.getLogger(__name__)
@@ -40,6 +48,17 @@ def run(context):
     logger.info("HPC workload generator '{}' starting.".format(workloadDef.name))
     # get the helper
     exp_helper = utils.ExperimentHelper(context)
+    # parameter sweep ?
+    if is_sweep(workloadDef):
+        return run_sweep(workloadDef)
+    # trace replay ?
+    if is_trace(workloadDef):
+        return run_trace(workloadDef)
+    # open-loop load ?
+    if is_load(workloadDef):
+        return run_load(workloadDef)
+    # kept for clean up
+    global hpcBackend, jobID
     # initialize experiment configuration
     experimentCfg = ExperimentConfig(workloadDef)
     # initialize HPC back-end connection handler
@@ -48,7 +67,11 @@ def run(context):
     # execute the experiment
     try:
         hpcBackend.run_experiment(experimentCfg)
-    except Exception as e:
+    except SignalExit:
+        # the jobs are cancelled, the process ends
+        raise
+    except (Exception, SystemExit) as e:
+        # sys.exit() on errors only fails this workload
         logger.error(e)
         # downwards compatibility, thus try/catch if not implemented
         try:
@@ -56,29 +79,92 @@ def run(context):
         except Exception as ex:
             pass
         return None;
-    # cache jobID for clean up
-    jobID = experimentCfg.get_job_id();
-    # construct result paths
-    stdoutPath = hpcConfig.get_value('execution_dir') + experimentCfg.get_job_script() + 'o' + experimentCfg.get_stripped_job_id()
-    stdErrPath = hpcConfig.get_value('execution_dir') + experimentCfg.get_job_script() + 'e' + experimentCfg.get_stripped_job_id()
-    vtorque_log = hpcConfig.get_value('path_vtorque_log') + "/" + experimentCfg.get_job_id() + "debug.log"
+    finally:
+        # cache jobID for clean up
+        jobID = experimentCfg.get_job_id();
     # return results
+    return hpcBackend.get_result(experimentCfg)
+
+
+def run_async(context):
+    """
+    Awaitable variant of run(), one event loop can supervise thousands of
+    workloads without a thread each. Requires Python 3.5+.
+    """
+    # imported here, the synchronous API keeps working on Python 2
+    from api.async_backend import run_async as _run_async
+    logger.info("HPC workload generator '{}' starting.".format(
+        context.v1.workload.name))
+    return _run_async(context.v1.workload)
+
+
+def run_workloads_async(workloadDefs):
+    """Awaitable variant of run_workloads(), without dependencies."""
+    from api.async_backend import run_workloads_async as _run_workloads_async
+    return _run_workloads_async(workloadDefs)
+
+
+def run_workloads(workloadDefs):
+    """Run several workloads concurrently, one result per workload."""
+    logger.info("HPC workload generator starting {} workload(s).".format(
+        len(workloadDefs)))
+    experiments = [ExperimentConfig(workloadDef)
+                   for workloadDef in workloadDefs]
+    if has_dependencies(experiments):
+        # submitted at once, the batch system runs them in order
+        results = DAGExecutor().run(experiments)
+    elif any(experiment.is_packable() for experiment in experiments):
+        # small workloads share jobs
+        results = PackExecutor().run(experiments)
+    else:
+        results = WorkloadExecutor().run_experiments(experiments)
+    for workloadDef, result in zip(workloadDefs, results):
+        if result is None:
+            # downwards compatibility, thus try/catch if not implemented
+            try:
+                workloadDef.failed()
+            except Exception as ex:
+                pass
+    return results
+
+
+def run_sweep(workloadDef):
+    """Run all points of a sweep, expanded lazily."""
+    results = WorkloadExecutor().run_experiments(
+        iter_experiment_configs(workloadDef))
+    if None in results:
+        # downwards compatibility, thus try/catch if not implemented
+        try:
+            workloadDef.failed()
+        except Exception as ex:
+            pass
+    return {
+            "backend" : "HPC",
+            "sweep" : results
+        }
+
+
+def run_trace(workloadDef):
+    """Replay the workload's trace, returns the replay statistics."""
+    return {
+            "backend" : "HPC",
+            "trace" : TraceReplayer(workloadDef).run()
+        }
+
+
+def run_load(workloadDef):
+    """Generate open-loop load, returns the measured distributions."""
     return {
-            "endpoint" : {
-               "identifier": "submission host",
-               "host" : hpcConfig.get_value('host')
-            },
-            "data" : {
-                "stdout" : stdoutPath,
-                "stderr" : stdErrPath,
-                "vtorque_log" : vtorque_log
-            },
-            "config" : experimentCfg,
-            "backend" : "HPC"
+            "backend" : "HPC",
+            "load" : LoadGenerator(workloadDef).run()
         }
 
 
 def clean(context):
-    if hpcBackend is not None:
+    # jobs of failed or interrupted workloads, in one call per batch system
+    cancel_outstanding('clean up')
+    if hpcBackend is not None and jobID is not None:
         hpcBackend.cleanUp(jobID)
+    # terminate the shared SSH master connections
+    close_all()
 